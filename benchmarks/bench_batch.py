@@ -0,0 +1,78 @@
+"""Compare batch counting with a Python loop over count_tokens_in_string.
+
+Usage:
+    uv run python benchmarks/bench_batch.py [--texts N] [--threads T]
+"""
+
+import argparse
+import random
+import time
+
+from count_tokens import count_tokens_in_string, count_tokens_in_strings
+
+WORDS = [
+    "the",
+    "quick",
+    "brown",
+    "fox",
+    "jumps",
+    "over",
+    "lazy",
+    "dog",
+    "prompt",
+    "model",
+    "token",
+    "count",
+    "chat",
+    "message",
+    "system",
+    "user",
+    "assistant",
+    "reply",
+    "context",
+    "window",
+    "budget",
+]
+
+
+def make_texts(n: int, seed: int = 0) -> list[str]:
+    """Generate ``n`` short prompt-like strings."""
+    rng = random.Random(seed)
+    return [
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 80))) for _ in range(n)
+    ]
+
+
+def timed(func, *args, **kwargs):
+    """Return (result, seconds) for a single call."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--texts", type=int, default=100_000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--encoding", default="cl100k_base")
+    args = parser.parse_args()
+
+    texts = make_texts(args.texts)
+    count_tokens_in_string("warm up", args.encoding)
+
+    loop, loop_s = timed(
+        lambda: [count_tokens_in_string(t, args.encoding) for t in texts]
+    )
+    batch, batch_s = timed(
+        count_tokens_in_strings, texts, args.encoding, num_threads=args.threads
+    )
+    assert loop == batch, "batch counts differ from per-string counts"
+
+    print(f"texts:   {len(texts)} ({sum(batch)} tokens)")
+    print(f"loop:    {loop_s:.3f}s ({len(texts) / loop_s:,.0f} texts/s)")
+    print(f"batch:   {batch_s:.3f}s ({len(texts) / batch_s:,.0f} texts/s)")
+    print(f"speedup: {loop_s / batch_s:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Measure CLI startup: import time and time to first result.
+
+Each scenario runs in a fresh interpreter. Use --max-import-ms to fail when
+importing the package gets slower than a budget (e.g. in CI), and --baseline
+to compare the import time with the package at another git revision, failing
+when it regressed by more than --max-regression-ms.
+
+Usage:
+    uv run python benchmarks/bench_startup.py [--runs N] [--max-import-ms MS]
+        [--baseline REV [--max-regression-ms MS]]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CLI = "import sys; from count_tokens.count import main; sys.argv[0] = 'count-tokens'; main()"
+
+
+def median_ms(args: list[str], runs: int, env: dict | None = None) -> float:
+    """Return the median wall time of running ``python args`` in milliseconds."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, *args],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            env=env,
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def baseline_import_ms(revision: str, runs: int) -> float:
+    """Return the median time of importing the package as of a git revision."""
+    with tempfile.TemporaryDirectory() as checkout:
+        archive = subprocess.run(
+            ["git", "archive", revision, "src"],
+            cwd=ROOT,
+            check=True,
+            capture_output=True,
+        ).stdout
+        subprocess.run(["tar", "-x", "-C", checkout], input=archive, check=True)
+        env = {**os.environ, "PYTHONPATH": str(Path(checkout) / "src")}
+        return median_ms(["-c", "import count_tokens"], runs, env)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    parser.add_argument("--baseline", help="git revision to compare import time to")
+    parser.add_argument("--max-regression-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile("w", suffix=".txt") as sample:
+        sample.write("A short prompt used to measure time to first result.\n")
+        sample.flush()
+
+        scenarios = {
+            "python (baseline)": ["-c", "pass"],
+            "import count_tokens": ["-c", "import count_tokens"],
+            "import tiktoken": ["-c", "import tiktoken"],
+            "count-tokens --help": ["-c", CLI, "--help"],
+            "count-tokens --approx w": ["-c", CLI, sample.name, "--approx", "w", "-q"],
+            "count-tokens (exact)": ["-c", CLI, sample.name, "-q"],
+        }
+        results = {name: median_ms(cmd, args.runs) for name, cmd in scenarios.items()}
+
+    baseline = results["python (baseline)"]
+    for name, ms in results.items():
+        print(f"{name:<26} {ms:8.1f} ms  (+{ms - baseline:.1f} ms)")
+
+    import_ms = results["import count_tokens"] - baseline
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        sys.exit(
+            f"import count_tokens took {import_ms:.1f} ms > {args.max_import_ms} ms"
+        )
+
+    if args.baseline:
+        # Same conditions as the current tree: sources on PYTHONPATH
+        env = {**os.environ, "PYTHONPATH": str(ROOT / "src")}
+        current = median_ms(["-c", "import count_tokens"], args.runs, env)
+        before = baseline_import_ms(args.baseline, args.runs)
+        print(
+            f"import count_tokens at {args.baseline}: {before:.1f} ms, "
+            f"now {current:.1f} ms ({current - before:+.1f} ms)"
+        )
+        if current - before > args.max_regression_ms:
+            sys.exit(
+                f"import count_tokens is {current - before:.1f} ms slower than at "
+                f"{args.baseline} (> {args.max_regression_ms} ms)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,16 @@
-from .count import count, count_tokens_in_file, count_tokens_in_string
+from .cache import CountCache
+from .count import (
+    count,
+    count_tokens_in_file,
+    count_tokens_in_string,
+    count_tokens_in_strings,
+)
 
 __version__ = "0.8.2"
-__all__ = ["count", "count_tokens_in_file", "count_tokens_in_string"]
+__all__ = [
+    "CountCache",
+    "count",
+    "count_tokens_in_file",
+    "count_tokens_in_string",
+    "count_tokens_in_strings",
+]
@@ -0,0 +1,435 @@
+"""asyncio API that counts tokens without blocking the event loop."""
+
+import asyncio
+import concurrent.futures
+import functools
+import itertools
+import os
+import threading
+from collections.abc import Iterable, Iterator, Sequence
+
+from .count import (
+    CHARACTERS_PER_TOKEN,
+    TOKENS_PER_WORD,
+    _by_encoding,
+    _check_limit,
+    _count_encodings,
+    _file_counter,
+    _get_encoding,
+    _iter_decoded_chunks,
+    _profile_ratios,
+    _read_text,
+    _resolve_profile,
+    count_tokens_in_file,
+    count_tokens_in_large_file,
+)
+from .walk import DEFAULT_EXCLUDES, walk_files
+
+# Default number of files counted at the same time by acount_directory
+CONCURRENCY = 8
+# Number of files taken from the directory walk per executor call
+_WALK_WINDOW = 256
+
+_default_executor: concurrent.futures.ThreadPoolExecutor | None = None
+_default_executor_lock = threading.Lock()
+
+
+def _get_executor(
+    executor: concurrent.futures.Executor | None,
+) -> concurrent.futures.Executor:
+    """Return ``executor``, or the shared thread pool with one thread per CPU."""
+    global _default_executor
+    if executor is not None:
+        return executor
+    with _default_executor_lock:
+        if _default_executor is None:
+            _default_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=os.cpu_count() or 1, thread_name_prefix="count_tokens"
+            )
+        return _default_executor
+
+
+async def _run(executor: concurrent.futures.Executor, func, *args, **kwargs):
+    """Run a blocking call on the executor; cancelling cancels it if not started."""
+    return await asyncio.wrap_future(
+        executor.submit(functools.partial(func, *args, **kwargs))
+    )
+
+
+def _count_next_chunk(chunks: Iterator[tuple[str, bool]], encoding) -> int | None:
+    """Read, decode and tokenize the next chunk, or return None at the end."""
+    chunk = next(chunks, None)
+    return None if chunk is None else len(encoding.encode(chunk[0]))
+
+
+async def _count_chunks(
+    file_path: str,
+    encoding_name: str,
+    chunk_size: int,
+    decode_errors: str,
+    executor: concurrent.futures.Executor,
+) -> int:
+    """Count a file chunk by chunk, one executor call per chunk.
+
+    Other requests get executor threads between chunks, and cancellation
+    takes effect at the next chunk boundary.
+    """
+    encoding = await _run(executor, _get_encoding, encoding_name)
+    chunks = _iter_decoded_chunks(file_path, chunk_size, decode_errors=decode_errors)
+    future = None
+    total = 0
+    try:
+        while True:
+            future = executor.submit(_count_next_chunk, chunks, encoding)
+            tokens = await asyncio.wrap_future(future)
+            if tokens is None:
+                return total
+            total += tokens
+    finally:
+        # Close the file once the chunk being read (if any) is done
+        if future is None:
+            chunks.close()
+        else:
+            future.add_done_callback(lambda _: chunks.close())
+
+
+async def acount_file(
+    file_path: str,
+    encoding_name: str | Sequence[str] = "cl100k_base",
+    approximate: str | None = None,
+    tokens_per_word: float = TOKENS_PER_WORD,
+    characters_per_token: float = CHARACTERS_PER_TOKEN,
+    use_streaming: bool = False,
+    chunk_size: int = 1024 * 1024,
+    decode_errors: str | None = None,
+    executor: concurrent.futures.Executor | None = None,
+) -> int | dict[str, int]:
+    """Return the number of tokens in a text file without blocking the event loop.
+
+    Reading and tokenizing run on ``executor``. Without streaming the file is
+    read and tokenized in two calls, as in ``count_tokens_in_file``; with
+    ``use_streaming`` each newline-aligned chunk is one call, as in
+    ``count_tokens_in_large_file``, so a cancelled count stops at the next
+    chunk and large files do not hold a thread for long. Compressed files and
+    ``archive::member`` paths are read as by the sync functions.
+
+    Args:
+        file_path: The path to the text file to count the tokens in.
+        encoding_name: The name of the encoding to use, or a list of names. Default: cl100k_base
+        approximate: Approximate the number of tokens without tokenizing all of the text. Base on: w - words, c - characters, s - sampling
+        tokens_per_word: The number of tokens per word for word-based approximation. Default: 4/3
+        characters_per_token: The number of characters per token for character-based approximation. Default: 4
+        use_streaming: Count the file in chunks
+        chunk_size: Size of chunks to read in bytes (for streaming)
+        decode_errors: Policy for bytes that are not valid utf-8 (see
+            ``DECODE_ERRORS``); by default ``latin-1`` when streaming, and the
+            locale encoding otherwise, as in the sync functions
+        executor: Executor for the blocking work (default: a shared thread pool
+            with one thread per CPU)
+
+    Returns:
+        The number of tokens in the text file, or a dict of counts by encoding.
+    """
+    executor = _get_executor(executor)
+    if approximate is not None or (
+        use_streaming and not isinstance(encoding_name, str)
+    ):
+        if use_streaming:
+            return await _run(
+                executor,
+                count_tokens_in_large_file,
+                file_path,
+                encoding_name,
+                chunk_size=chunk_size,
+                approximate=approximate,
+                tokens_per_word=tokens_per_word,
+                characters_per_token=characters_per_token,
+                decode_errors=decode_errors or "latin-1",
+            )
+        return await _run(
+            executor,
+            count_tokens_in_file,
+            file_path,
+            encoding_name,
+            approximate=approximate,
+            tokens_per_word=tokens_per_word,
+            characters_per_token=characters_per_token,
+            decode_errors=decode_errors,
+        )
+    if use_streaming:
+        return await _count_chunks(
+            file_path, encoding_name, chunk_size, decode_errors or "latin-1", executor
+        )
+    text = await _run(executor, _read_text, file_path, decode_errors)
+    if not isinstance(encoding_name, str):
+        return await _run(executor, _count_encodings, text, list(encoding_name))
+    encoding = await _run(executor, _get_encoding, encoding_name)
+    return len(await _run(executor, encoding.encode, text))
+
+
+def _flatten(results: dict, encoding_names: list[str] | None) -> dict:
+    """Return the results with archives replaced by their members, by encoding."""
+    counts: dict = {}
+    for file_path, result in results.items():
+        # An archive gives a list of its members and their results
+        counts.update(result if isinstance(result, list) else [(file_path, result)])
+    if encoding_names is None:
+        return counts
+    return _by_encoding(counts, encoding_names)
+
+
+async def acount_directory(
+    directory_path: str,
+    file_patterns: list[str] | None = None,
+    recursive: bool = False,
+    encoding_name: str | Sequence[str] = "cl100k_base",
+    use_streaming: bool = False,
+    chunk_size: int = 1024 * 1024,
+    approximate: str | None = None,
+    tokens_per_word: float = TOKENS_PER_WORD,
+    characters_per_token: float = CHARACTERS_PER_TOKEN,
+    decode_errors: str = "latin-1",
+    profile: dict | str | None = None,
+    max_tokens: int | None = None,
+    exclude: Iterable[str] | None = None,
+    use_ignore_files: bool = True,
+    archives: bool = False,
+    skip_binary: bool = True,
+    max_file_size: int | None = None,
+    max_line_length: int | None = None,
+    concurrency: int = CONCURRENCY,
+    executor: concurrent.futures.Executor | None = None,
+) -> dict:
+    """Count tokens in files matching patterns in a directory, asynchronously.
+
+    Each file is counted by the same worker as ``count_tokens_in_directory``,
+    with the same defaults, so both give the same results for the same tree.
+    The directory walk also runs on the executor. At most ``concurrency``
+    files are counted at the same time; cancelling cancels those not started.
+
+    Args:
+        directory_path: Path to directory to scan
+        file_patterns: List of glob patterns to match files (default: ["*.txt", "*.py", "*.md"])
+        recursive: Whether to search subdirectories
+        encoding_name: The name of the encoding to use, or a list of names
+        use_streaming: Whether to use streaming for large files
+        chunk_size: Size of chunks to read in bytes (for streaming)
+        approximate: Approximate the number of tokens without tokenizing
+        tokens_per_word: The number of tokens per word for approximation
+        characters_per_token: The number of characters per token for approximation
+        decode_errors: Policy for chunks that are not valid utf-8 when streaming
+        profile: Calibration profile (or path of a profile file) with the
+            approximation ratios per file extension for ``approximate``
+        max_tokens: Stop counting a file once it exceeds this limit
+        exclude: gitignore-style rules for paths to skip (default: VCS,
+            virtualenv and cache directories)
+        use_ignore_files: Whether to apply ``.gitignore`` files found in the tree
+        archives: Also count compressed files and the members of archives
+        skip_binary: Skip files whose first few KB look binary
+        max_file_size: Skip files larger than this many bytes
+        max_line_length: Skip files with a line longer than this many bytes in
+            their first few KB
+        concurrency: Maximum number of files counted at the same time
+        executor: Executor for the blocking work
+
+    Returns:
+        Dict mapping filenames to token counts (or ``"Error: ..."`` and
+        ``"Skipped: ..."``), in the order files were found. With several
+        encodings, a dict of these keyed by encoding.
+    """
+    if file_patterns is None:
+        file_patterns = ["*.txt", "*.py", "*.md"]
+    if exclude is None:
+        exclude = DEFAULT_EXCLUDES
+    encoding_names = None if isinstance(encoding_name, str) else list(encoding_name)
+    count_file, walk_patterns = _file_counter(
+        file_patterns,
+        archives,
+        encoding_name=encoding_name if encoding_names is None else encoding_names,
+        use_streaming=use_streaming,
+        chunk_size=chunk_size,
+        approximate=approximate,
+        tokens_per_word=tokens_per_word,
+        characters_per_token=characters_per_token,
+        decode_errors=decode_errors,
+        profile=_resolve_profile(
+            profile, encoding_name if encoding_names is None else encoding_names[0]
+        ),
+        max_tokens=max_tokens,
+        skip_binary=skip_binary,
+        max_file_size=max_file_size,
+        max_line_length=max_line_length,
+    )
+    executor = _get_executor(executor)
+    walk = walk_files(
+        directory_path, walk_patterns, recursive, exclude, use_ignore_files
+    )
+    semaphore = asyncio.Semaphore(concurrency)
+    results: dict = {}
+    tasks: set[asyncio.Task] = set()
+
+    async def count_one(file_path: str) -> None:
+        try:
+            results[file_path] = await _run(executor, count_file, file_path)
+        except Exception as e:
+            results[file_path] = f"Error: {e!s}"
+        finally:
+            semaphore.release()
+
+    try:
+        while window := await _run(
+            executor, lambda: list(itertools.islice(walk, _WALK_WINDOW))
+        ):
+            for file_path in window:
+                results[file_path] = None
+                await semaphore.acquire()
+                task = asyncio.create_task(count_one(file_path))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+    return _flatten(results, encoding_names)
+
+
+async def acount(
+    text: str | None = None,
+    file: str | None = None,
+    directory: str | None = None,
+    encoding: str | Sequence[str] = "cl100k_base",
+    file_patterns: list[str] | None = None,
+    recursive: bool = False,
+    use_streaming: bool = False,
+    chunk_size: int = 1024 * 1024,
+    approximate: str | None = None,
+    tokens_per_word: float = TOKENS_PER_WORD,
+    characters_per_token: float = CHARACTERS_PER_TOKEN,
+    max_tokens: int | None = None,
+    decode_errors: str = "latin-1",
+    profile: dict | str | None = None,
+    stop_at_limit: bool = False,
+    exclude: Iterable[str] | None = None,
+    use_ignore_files: bool = True,
+    archives: bool = False,
+    skip_binary: bool = True,
+    max_file_size: int | None = None,
+    max_line_length: int | None = None,
+    concurrency: int = CONCURRENCY,
+    executor: concurrent.futures.Executor | None = None,
+):
+    """Count tokens with the simplified API of ``count``, without blocking the event loop.
+
+    The options and results are those of ``count``.
+
+    Args:
+        text: Text string to count (optional)
+        file: File path to count (optional)
+        directory: Directory path to count (optional)
+        encoding: Encoding to use, or a list of encodings to count in one pass
+        file_patterns: List of glob patterns when using directory mode (default: ["*.txt", "*.py", "*.md"])
+        recursive: Whether to search subdirectories
+        use_streaming: Whether to use streaming for large files
+        chunk_size: Size of chunks to read in bytes (for streaming)
+        approximate: Approximate the number of tokens without tokenizing
+        tokens_per_word: The number of tokens per word for approximation
+        characters_per_token: The number of characters per token for approximation
+        max_tokens: Optional maximum token limit to check against
+        decode_errors: Policy for chunks that are not valid utf-8 when streaming
+        profile: Calibration profile (or path of a profile file) with the
+            approximation ratios per file extension for ``approximate``
+        stop_at_limit: Stream files and stop counting each one as soon as it
+            exceeds ``max_tokens``
+        exclude: gitignore-style rules for paths to skip in directory mode
+        use_ignore_files: Whether to apply ``.gitignore`` files in directory mode
+        archives: Also count compressed files and members of archives in
+            directory mode
+        skip_binary: Skip binary files in directory mode
+        max_file_size: Skip files larger than this many bytes in directory mode
+        max_line_length: Skip files with longer lines (minified or generated)
+            in directory mode
+        concurrency: Maximum number of files counted at the same time in directory mode
+        executor: Executor for the blocking work
+
+    Returns:
+        Token count or dictionary of counts for directory mode, flagged as in
+        ``count`` when over ``max_tokens``. With a list of encodings, a dict of
+        these results keyed by encoding.
+    """
+    executor = _get_executor(executor)
+    limit = max_tokens if stop_at_limit else None
+    encodings = None if isinstance(encoding, str) else list(encoding)
+    if text is not None:
+        if encodings is not None:
+            result = await _run(executor, _count_encodings, text, encodings)
+        else:
+            tokenizer = await _run(executor, _get_encoding, encoding)
+            result = len(await _run(executor, tokenizer.encode, text))
+    elif file is not None:
+        tokens_per_word, characters_per_token = _profile_ratios(
+            _resolve_profile(profile, encoding if encodings is None else encodings[0]),
+            file,
+            tokens_per_word,
+            characters_per_token,
+        )
+        if limit is not None:
+            result = await _run(
+                executor,
+                count_tokens_in_large_file,
+                file,
+                encoding,
+                chunk_size=chunk_size,
+                approximate=approximate,
+                tokens_per_word=tokens_per_word,
+                characters_per_token=characters_per_token,
+                decode_errors=decode_errors,
+                max_tokens=limit,
+            )
+            if isinstance(result, dict) and encodings is None:
+                return result
+        else:
+            result = await acount_file(
+                file,
+                encoding,
+                approximate=approximate,
+                tokens_per_word=tokens_per_word,
+                characters_per_token=characters_per_token,
+                use_streaming=use_streaming,
+                chunk_size=chunk_size,
+                # As in count, the policy applies to streamed files
+                decode_errors=decode_errors if use_streaming else None,
+                executor=executor,
+            )
+    elif directory is not None:
+        result = await acount_directory(
+            directory,
+            file_patterns=file_patterns,
+            recursive=recursive,
+            encoding_name=encoding,
+            use_streaming=use_streaming,
+            chunk_size=chunk_size,
+            approximate=approximate,
+            tokens_per_word=tokens_per_word,
+            characters_per_token=characters_per_token,
+            decode_errors=decode_errors,
+            profile=profile,
+            max_tokens=limit,
+            exclude=exclude,
+            use_ignore_files=use_ignore_files,
+            archives=archives,
+            skip_binary=skip_binary,
+            max_file_size=max_file_size,
+            max_line_length=max_line_length,
+            concurrency=concurrency,
+            executor=executor,
+        )
+    else:
+        raise ValueError("Either text, file, or directory must be provided")
+
+    if encodings is not None and directory is not None and file is None:
+        # Counts of a directory, one result per encoding
+        return {
+            name: _check_limit(counts, max_tokens) for name, counts in result.items()
+        }
+    return _check_limit(result, max_tokens)
@@ -0,0 +1,340 @@
+"""Read compressed files and archive members without extracting them to disk.
+
+Files compressed with gzip (``.gz``), bzip2 (``.bz2``), xz (``.xz``) or
+Zstandard (``.zst``, with the optional ``zstandard`` package) are decompressed
+while they are read. Members of tar archives (plain or compressed) and zip
+archives are read in place and named ``archive.tar.gz::path/inside``.
+
+Decompression runs on a reader thread that stays a few blocks ahead of the
+consumer. The decompressors release the GIL, as does the tokenizer, so
+decompressing the next block overlaps with tokenizing the current one.
+"""
+
+import contextlib
+import importlib
+import io
+import os
+import queue
+import threading
+from collections.abc import Callable, Iterator
+from typing import TYPE_CHECKING, BinaryIO
+
+from .walk import _pattern_matcher
+
+if TYPE_CHECKING:
+    import tarfile
+
+# Separator between the path of an archive and the path of a member inside it
+MEMBER_SEPARATOR = "::"
+
+# Size of the blocks read ahead, and the number of blocks buffered
+_PREFETCH_BLOCK = 256 * 1024
+_PREFETCH_BLOCKS = 4
+
+# Short forms of compressed tar archives
+_TAR_SUFFIXES = {".tgz": ".gz", ".tbz2": ".bz2", ".txz": ".xz", ".tzst": ".zst"}
+
+
+def _open_zstd(path: str) -> BinaryIO:
+    """Open a Zstandard file with ``compression.zstd`` (Python 3.14+) or ``zstandard``."""
+    try:
+        from compression import zstd
+
+        return zstd.open(path, "rb")
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError(
+            "Reading .zst files requires the zstandard package: "
+            "pip install 'count-tokens[zstd]'"
+        ) from e
+    return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+
+
+def _opener(module: str) -> Callable[[str], BinaryIO]:
+    """Return a function that opens files with ``module.open``, imported on first use.
+
+    Plain files are checked against this module on every count, so the
+    compression modules are only loaded once a compressed file is read.
+    """
+
+    def open_compressed(path: str) -> BinaryIO:
+        return importlib.import_module(module).open(path, "rb")
+
+    return open_compressed
+
+
+_DECOMPRESSORS: dict[str, Callable[[str], BinaryIO]] = {
+    ".gz": _opener("gzip"),
+    ".bz2": _opener("bz2"),
+    ".xz": _opener("lzma"),
+    ".zst": _open_zstd,
+}
+
+
+def _compression(path: str) -> str | None:
+    """Return the compression suffix of a path, or None if it is not compressed."""
+    lower = path.lower()
+    for suffix, compression in _TAR_SUFFIXES.items():
+        if lower.endswith(suffix):
+            return compression
+    return next((suffix for suffix in _DECOMPRESSORS if lower.endswith(suffix)), None)
+
+
+def is_archive(path: str) -> bool:
+    """Return whether a path is a tar or zip archive, compressed or not."""
+    lower = path.lower()
+    if lower.endswith((".zip", ".tar", *_TAR_SUFFIXES)):
+        return True
+    compression = _compression(lower)
+    return compression is not None and lower[: -len(compression)].endswith(".tar")
+
+
+def split_member(path: str) -> tuple[str, str]:
+    """Split an ``archive::member`` path into the archive and the member path.
+
+    The member is empty unless the part before the first ``::`` is an archive
+    file on disk, so other paths that contain ``::`` stay plain paths.
+    """
+    archive_path, _, member = path.partition(MEMBER_SEPARATOR)
+    if member and is_archive(archive_path) and os.path.isfile(archive_path):
+        return archive_path, member
+    return path, ""
+
+
+def is_packed(path: str) -> bool:
+    """Return whether a path is compressed, an archive or a member of an archive."""
+    return (
+        _compression(path) is not None
+        or is_archive(path)
+        or bool(split_member(path)[1])
+    )
+
+
+def packed_patterns(file_patterns: list[str]) -> list[str]:
+    """Extend file patterns to compressed variants of the files and to archives."""
+    return [
+        *file_patterns,
+        *(pattern + suffix for pattern in file_patterns for suffix in _DECOMPRESSORS),
+        "*.zip",
+        "*.tar",
+        *(f"*.tar{suffix}" for suffix in _DECOMPRESSORS),
+        *(f"*{suffix}" for suffix in _TAR_SUFFIXES),
+    ]
+
+
+class _Prefetcher(io.RawIOBase):
+    """Read a stream ahead on a thread, so decompression overlaps consumption.
+
+    Args:
+        stream: The stream to read; only the reader thread touches it
+        name: Name reported by the ``name`` attribute
+    """
+
+    def __init__(self, stream: BinaryIO, name: str) -> None:
+        super().__init__()
+        self.name = name
+        self._stream = stream
+        self._blocks: queue.Queue = queue.Queue(maxsize=_PREFETCH_BLOCKS)
+        self._block = memoryview(b"")
+        self._eof = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._fill, daemon=True)
+        self._thread.start()
+
+    def _put(self, item) -> None:
+        while not self._stop.is_set():
+            try:
+                self._blocks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _fill(self) -> None:
+        try:
+            while not self._stop.is_set():
+                block = self._stream.read(_PREFETCH_BLOCK)
+                self._put(block)
+                if not block:
+                    return
+        except BaseException as e:
+            # Raised again in the consumer
+            self._put(e)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if not self._block:
+            if self._eof:
+                return 0
+            item = self._blocks.get()
+            if isinstance(item, BaseException):
+                self._eof = True
+                raise item
+            if not item:
+                self._eof = True
+                return 0
+            self._block = memoryview(item)
+        size = min(len(buffer), len(self._block))
+        buffer[:size] = self._block[:size]
+        self._block = self._block[size:]
+        return size
+
+    def close(self) -> None:
+        if not self.closed:
+            self._stop.set()
+            self._thread.join()
+            self._stream.close()
+        super().close()
+
+
+def _prefetched(stream: BinaryIO, name: str) -> io.BufferedReader:
+    return io.BufferedReader(_Prefetcher(stream, name), _PREFETCH_BLOCK)
+
+
+class _Member(io.RawIOBase):
+    """A member stream of a tar archive, named ``archive::member``."""
+
+    def __init__(self, stream: BinaryIO, name: str) -> None:
+        super().__init__()
+        self.name = name
+        self._stream = stream
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        return self._stream.readinto(buffer)
+
+
+def _open_decompressed(path: str) -> io.BufferedReader:
+    """Open a file, decompressing it on a reader thread if it is compressed."""
+    compression = _compression(path)
+    if compression is None:
+        return _prefetched(open(path, "rb"), path)
+    return _prefetched(_DECOMPRESSORS[compression](path), path)
+
+
+@contextlib.contextmanager
+def _open_tar(path: str) -> Iterator["tarfile.TarFile"]:
+    """Open a tar archive as a stream, reading its members in a single pass."""
+    import tarfile
+
+    with (
+        _open_decompressed(path) as stream,
+        tarfile.open(fileobj=stream, mode="r|") as tar,
+    ):
+        yield tar
+
+
+@contextlib.contextmanager
+def open_packed(file_path: str) -> Iterator[BinaryIO]:
+    """Open a compressed file or an ``archive::member`` path for binary reading.
+
+    Args:
+        file_path: Path of a compressed file, or of a member of an archive
+
+    Yields:
+        The decompressed content as a binary file
+
+    Raises:
+        FileNotFoundError: If an archive has no such member
+        ValueError: If the path is an archive rather than a member of one
+    """
+    archive_path, member = split_member(file_path)
+    if not member:
+        if is_archive(file_path):
+            raise ValueError(
+                f"{file_path} is an archive; count its members with a directory "
+                f"or as {file_path}{MEMBER_SEPARATOR}<member>"
+            )
+        with _open_decompressed(file_path) as stream:
+            yield stream
+    elif archive_path.lower().endswith(".zip"):
+        import zipfile
+
+        with zipfile.ZipFile(archive_path) as archive:
+            try:
+                info = archive.getinfo(member)
+            except KeyError:
+                raise FileNotFoundError(
+                    f"No member {member} in {archive_path}"
+                ) from None
+            with _prefetched(archive.open(info), file_path) as stream:
+                yield stream
+    else:
+        with _open_tar(archive_path) as tar:
+            for info in tar:
+                if info.isfile() and info.name == member:
+                    with io.BufferedReader(
+                        _Member(tar.extractfile(info), file_path)
+                    ) as stream:
+                        yield stream
+                    return
+        raise FileNotFoundError(f"No member {member} in {archive_path}")
+
+
+def iter_members(
+    archive_path: str, file_patterns: list[str]
+) -> Iterator[tuple[str, BinaryIO]]:
+    """Yield the members of an archive matching the patterns, in archive order.
+
+    Tar archives are read as a stream in a single pass, so each member must
+    be read before the next one is taken.
+
+    Args:
+        archive_path: Path of a tar or zip archive
+        file_patterns: Glob patterns; patterns without ``/`` match member names,
+            patterns with ``/`` match paths inside the archive
+
+    Yields:
+        The ``archive::member`` path and a binary stream of each member
+    """
+    matches = _pattern_matcher(file_patterns, recursive=True)
+    prefix = archive_path + MEMBER_SEPARATOR
+    if archive_path.lower().endswith(".zip"):
+        import zipfile
+
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                name = info.filename
+                if not info.is_dir() and matches(name.rsplit("/", 1)[-1], name):
+                    with _prefetched(archive.open(info), prefix + name) as stream:
+                        yield prefix + name, stream
+        return
+    with _open_tar(archive_path) as tar:
+        for info in tar:
+            name = info.name
+            if info.isfile() and matches(name.rsplit("/", 1)[-1], name):
+                with io.BufferedReader(
+                    _Member(tar.extractfile(info), prefix + name)
+                ) as stream:
+                    yield prefix + name, stream
+
+
+def count_packed(count_file, file_patterns: list[str], file_path: str):
+    """Count a file, or each member of an archive that matches the patterns.
+
+    Args:
+        count_file: Function counting a path or a binary stream, returning
+            its result
+        file_patterns: Glob patterns for the members of archives
+        file_path: Path of a file or an archive
+
+    Returns:
+        The result of ``count_file`` for a file. For an archive, a list of
+        ``(archive::member, result)`` pairs, or ``[(archive, "Error: ...")]``
+        if the archive could not be read.
+    """
+    if not is_archive(file_path):
+        return count_file(file_path)
+    results = []
+    try:
+        for member_path, stream in iter_members(file_path, file_patterns):
+            results.append((member_path, count_file(stream)))
+    except Exception as e:
+        results.append((file_path, f"Error: {e!s}"))
+    return results
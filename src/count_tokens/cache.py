@@ -0,0 +1,270 @@
+"""Persistent on-disk cache of per-file token counts."""
+
+import json
+import os
+import pathlib
+import time
+
+# Default maximum number of cached entries (not bytes) before the least recently
+# used are evicted; an entry takes roughly 200 bytes plus its path
+DEFAULT_MAX_ENTRIES = 1_000_000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT NOT NULL,
+    params TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    tokens TEXT NOT NULL,
+    used REAL NOT NULL,
+    PRIMARY KEY (path, params)
+);
+CREATE INDEX IF NOT EXISTS files_digest ON files (digest, params);
+CREATE INDEX IF NOT EXISTS files_used ON files (used);
+CREATE TABLE IF NOT EXISTS chunks (
+    digest TEXT NOT NULL,
+    params TEXT NOT NULL,
+    tokens INTEGER NOT NULL,
+    fallback INTEGER NOT NULL,
+    used REAL NOT NULL,
+    PRIMARY KEY (digest, params)
+);
+CREATE INDEX IF NOT EXISTS chunks_used ON chunks (used);
+"""
+_EVICT_QUERIES = (
+    (
+        "SELECT COUNT(*) FROM files",
+        "DELETE FROM files WHERE rowid IN "
+        "(SELECT rowid FROM files ORDER BY used, rowid LIMIT ?)",
+    ),
+    (
+        "SELECT COUNT(*) FROM chunks",
+        "DELETE FROM chunks WHERE rowid IN "
+        "(SELECT rowid FROM chunks ORDER BY used, rowid LIMIT ?)",
+    ),
+)
+
+
+def default_cache_dir() -> pathlib.Path:
+    """Return the cache directory (``$XDG_CACHE_HOME/count_tokens`` or ``~/.cache/count_tokens``)."""
+    base = os.environ.get("XDG_CACHE_HOME") or pathlib.Path.home() / ".cache"
+    return pathlib.Path(base) / "count_tokens"
+
+
+def file_digest(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """Return the BLAKE2b hex digest of a file's content."""
+    import hashlib
+
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, "rb") as file:
+        while block := file.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_params(**params) -> str:
+    """Return the cache key for the counting parameters (encoding, approximation, ...)."""
+    return json.dumps(params, sort_keys=True)
+
+
+class CountCache:
+    """SQLite-backed cache of token counts keyed by file path and counting parameters.
+
+    A lookup first compares the file's size and mtime with the cached entry. If
+    they differ, the file content is hashed and looked up by digest, so touched
+    files with unchanged content are still hits. A path without an entry is a
+    miss without reading the file: its digest is passed to :meth:`put` by
+    whoever counted it (a worker process, in a parallel directory scan). A
+    directory scan also leaves the hashing of touched files to the workers:
+    each compares the file's digest with :meth:`stored_digest`, and an
+    unchanged file takes its count back with :meth:`reuse`. When
+    the cache holds more than ``max_entries`` entries, the least recently used
+    are evicted on :meth:`close`. The limit is a number of entries, not a
+    size on disk.
+
+    The same database also holds the counts of file chunks keyed by the chunk's
+    content digest (see :mod:`count_tokens.incremental`).
+
+    Args:
+        path: Path of the SQLite database (default: ``counts.sqlite3`` in :func:`default_cache_dir`)
+        max_entries: Maximum number of file entries, and separately of chunk
+            entries, kept after eviction
+    """
+
+    def __init__(
+        self, path: str | None = None, max_entries: int = DEFAULT_MAX_ENTRIES
+    ) -> None:
+        db_path = pathlib.Path(path) if path else default_cache_dir() / "counts.sqlite3"
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = str(db_path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.chunk_hits = 0
+        self.chunk_misses = 0
+        self._pending: dict[tuple[str, str], tuple[int, int, str | None]] = {}
+        # Digests of entries whose file changed size or mtime, not hashed yet
+        self._stale: dict[tuple[str, str], str] = {}
+        # Imported here so that importing the package stays fast
+        import sqlite3
+
+        self._conn = sqlite3.connect(self.path)
+        self._conn.executescript(_SCHEMA)
+
+    def __enter__(self) -> "CountCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def get(self, file_path: str, params: str, hash_changed: bool = True):
+        """Return the cached count for a file, or None on a miss.
+
+        Args:
+            file_path: Path of the file
+            params: Cache key of the counting parameters
+            hash_changed: Hash a file whose size or mtime differs from its
+                entry, and look its content up. If False, such a file is a miss
+                without being read, and :meth:`stored_digest` gives the digest
+                to compare it with where it is counted.
+        """
+        key = (os.path.abspath(file_path), params)
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            self.misses += 1
+            return None
+
+        row = self._conn.execute(
+            "SELECT size, mtime_ns, tokens, digest FROM files "
+            "WHERE path = ? AND params = ?",
+            key,
+        ).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            self._conn.execute(
+                "UPDATE files SET used = ? WHERE path = ? AND params = ?",
+                (time.time(), *key),
+            )
+            self.hits += 1
+            return json.loads(row[2])
+        if row is None or not hash_changed:
+            self._pending[key] = (stat.st_size, stat.st_mtime_ns, None)
+            if row is not None:
+                self._stale[key] = row[3]
+            self.misses += 1
+            return None
+
+        digest = file_digest(file_path)
+        row = self._conn.execute(
+            "SELECT tokens FROM files WHERE digest = ? AND params = ? LIMIT 1",
+            (digest, params),
+        ).fetchone()
+        if row:
+            self._store(key, stat.st_size, stat.st_mtime_ns, digest, row[0])
+            self.hits += 1
+            return json.loads(row[0])
+
+        self._pending[key] = (stat.st_size, stat.st_mtime_ns, digest)
+        self.misses += 1
+        return None
+
+    def put(
+        self, file_path: str, params: str, tokens, digest: str | None = None
+    ) -> None:
+        """Store the count for a file looked up with :meth:`get`.
+
+        Args:
+            file_path: Path of the counted file
+            params: Cache key of the counting parameters
+            tokens: The count
+            digest: The file's :func:`file_digest`, if the caller already has
+                it; otherwise the file is hashed here
+        """
+        key = (os.path.abspath(file_path), params)
+        self._stale.pop(key, None)
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            stat = os.stat(file_path)
+            pending = (stat.st_size, stat.st_mtime_ns, None)
+        size, mtime_ns, looked_up = pending
+        digest = looked_up or digest or file_digest(file_path)
+        self._store(key, size, mtime_ns, digest, json.dumps(tokens))
+
+    def stored_digest(self, file_path: str, params: str) -> str | None:
+        """Return the digest of the entry of a file missed as changed, or None.
+
+        Set by ``get(..., hash_changed=False)`` when the file's size or mtime
+        differs from its entry; if the file still has this digest, its count
+        is taken back with :meth:`reuse` instead of counting it again.
+        """
+        return self._stale.get((os.path.abspath(file_path), params))
+
+    def reuse(self, file_path: str, params: str):
+        """Return the count of a file found unchanged by :meth:`stored_digest`.
+
+        The entry is updated with the file's new size and mtime, and the miss
+        of :meth:`get` becomes a hit.
+        """
+        key = (os.path.abspath(file_path), params)
+        size, mtime_ns, _ = self._pending.pop(key)
+        digest = self._stale.pop(key)
+        (tokens,) = self._conn.execute(
+            "SELECT tokens FROM files WHERE path = ? AND params = ?", key
+        ).fetchone()
+        self._store(key, size, mtime_ns, digest, tokens)
+        self.misses -= 1
+        self.hits += 1
+        return json.loads(tokens)
+
+    def _store(self, key, size: int, mtime_ns: int, digest: str, tokens: str) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (*key, size, mtime_ns, digest, tokens, time.time()),
+        )
+
+    def get_chunk(self, digest: str, params: str) -> tuple[int, bool] | None:
+        """Return the cached count and decode fallback flag of a chunk, or None."""
+        row = self._conn.execute(
+            "SELECT tokens, fallback FROM chunks WHERE digest = ? AND params = ?",
+            (digest, params),
+        ).fetchone()
+        if row is None:
+            self.chunk_misses += 1
+            return None
+        self._conn.execute(
+            "UPDATE chunks SET used = ? WHERE digest = ? AND params = ?",
+            (time.time(), digest, params),
+        )
+        self.chunk_hits += 1
+        return row[0], bool(row[1])
+
+    def put_chunk(self, digest: str, params: str, tokens: int, fallback: bool) -> None:
+        """Store the count of a chunk by its content digest."""
+        self._conn.execute(
+            "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?)",
+            (digest, params, tokens, int(fallback), time.time()),
+        )
+
+    def evict(self) -> int:
+        """Remove the least recently used entries above ``max_entries``.
+
+        File and chunk entries are limited separately.
+
+        Returns:
+            Number of removed entries
+        """
+        removed = 0
+        for count_query, delete_query in _EVICT_QUERIES:
+            (entries,) = self._conn.execute(count_query).fetchone()
+            excess = entries - self.max_entries
+            if excess > 0:
+                self._conn.execute(delete_query, (excess,))
+                removed += excess
+        return removed
+
+    def close(self) -> None:
+        """Evict old entries, commit and close the database."""
+        self.evict()
+        self._conn.commit()
+        self._conn.close()
@@ -0,0 +1,151 @@
+"""Calibration of the word and character approximation ratios per file type."""
+
+import json
+import pathlib
+import random
+from collections.abc import Iterable
+
+from .count import count_tokens_in_string
+from .walk import DEFAULT_EXCLUDES, walk_files
+
+# Version of the profile file format
+PROFILE_VERSION = 1
+# Default maximum number of files tokenized per extension
+SAMPLE_FILES = 200
+
+
+def _fit(samples: list[tuple[int, int, int]]) -> dict:
+    """Fit the ratios to (tokens, words, characters) samples and measure their error.
+
+    Errors are the total absolute error of the per-file approximations,
+    relative to the total number of tokens.
+    """
+    tokens = sum(t for t, _, _ in samples)
+    words = sum(w for _, w, _ in samples)
+    characters = sum(c for _, _, c in samples)
+    tokens_per_word = tokens / words if words else 0.0
+    characters_per_token = characters / tokens if tokens else 0.0
+    word_error = sum(abs(w * tokens_per_word - t) for t, w, _ in samples)
+    char_error = sum(
+        abs(c / characters_per_token - t) if characters_per_token else t
+        for t, _, c in samples
+    )
+    return {
+        "files": len(samples),
+        "tokens": tokens,
+        "tokens_per_word": tokens_per_word,
+        "characters_per_token": characters_per_token,
+        "word_error": word_error / tokens if tokens else 0.0,
+        "char_error": char_error / tokens if tokens else 0.0,
+    }
+
+
+def calibrate(
+    directory_path: str,
+    file_patterns: list[str] | None = None,
+    recursive: bool = False,
+    encoding_name: str = "cl100k_base",
+    sample_files: int = SAMPLE_FILES,
+    seed: int | None = None,
+    exclude: Iterable[str] = DEFAULT_EXCLUDES,
+    use_ignore_files: bool = True,
+) -> dict:
+    """Fit the approximation ratios per file extension on a sample of a directory.
+
+    Up to ``sample_files`` files per extension are tokenized exactly. For each
+    extension the tokens per word and characters per token are fitted as the
+    ratio of the totals, and the error of both approximations on the sampled
+    files is reported.
+
+    Args:
+        directory_path: Path to directory to scan
+        file_patterns: List of glob patterns to match files (default: ["*.txt", "*.py", "*.md"])
+        recursive: Whether to search subdirectories
+        encoding_name: The name of the encoding to use
+        sample_files: Maximum number of files tokenized per extension
+        seed: Seed for the random sample of files
+        exclude: gitignore-style rules for paths to skip
+        use_ignore_files: Whether to apply ``.gitignore`` files found in the tree
+
+    Returns:
+        Calibration for the encoding: fitted ``default`` ratios over all sampled
+        files and ``extensions`` mapping each extension to its ratios and errors
+    """
+    if file_patterns is None:
+        file_patterns = ["*.txt", "*.py", "*.md"]
+    by_extension: dict[str, list[str]] = {}
+    for file_path in walk_files(
+        directory_path, file_patterns, recursive, exclude, use_ignore_files
+    ):
+        by_extension.setdefault(pathlib.Path(file_path).suffix.lower(), []).append(
+            file_path
+        )
+
+    rng = random.Random(seed)
+    samples: dict[str, list[tuple[int, int, int]]] = {}
+    for extension, files in sorted(by_extension.items()):
+        for file_path in rng.sample(files, min(len(files), sample_files)):
+            try:
+                text = pathlib.Path(file_path).read_text()
+            except (OSError, UnicodeDecodeError):
+                continue
+            tokens = count_tokens_in_string(text, encoding_name)
+            samples.setdefault(extension, []).append(
+                (tokens, len(text.split()), len(text))
+            )
+
+    return {
+        "default": _fit([s for group in samples.values() for s in group]),
+        "extensions": {ext: _fit(group) for ext, group in samples.items()},
+    }
+
+
+def save_profile(calibration: dict, profile_path: str, encoding_name: str) -> None:
+    """Save a calibration to a profile file, keeping other encodings already in it."""
+    path = pathlib.Path(profile_path)
+    profile = {"version": PROFILE_VERSION, "encodings": {}}
+    if path.exists():
+        profile = json.loads(path.read_text())
+    profile["encodings"][encoding_name] = calibration
+    path.write_text(json.dumps(profile, indent=2) + "\n")
+
+
+def load_profile(profile_path: str, encoding_name: str) -> dict:
+    """Load the calibration for an encoding from a profile file.
+
+    Raises:
+        ValueError: If the profile has no calibration for the encoding
+    """
+    profile = json.loads(pathlib.Path(profile_path).read_text())
+    try:
+        return profile["encodings"][encoding_name]
+    except KeyError:
+        raise ValueError(
+            f"Profile {profile_path} has no calibration for encoding {encoding_name}"
+        ) from None
+
+
+def format_calibration(calibration: dict) -> str:
+    """Format a calibration as a table of ratios and errors per extension."""
+    rows = [
+        ("Extension", "Files", "Tokens/word", "Word err", "Chars/token", "Char err")
+    ]
+    entries = [*calibration["extensions"].items(), ("all", calibration["default"])]
+    for extension, fit in entries:
+        rows.append(
+            (
+                extension or "(none)",
+                str(fit["files"]),
+                f"{fit['tokens_per_word']:.3f}",
+                f"{fit['word_error']:.1%}",
+                f"{fit['characters_per_token']:.3f}",
+                f"{fit['char_error']:.1%}",
+            )
+        )
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return "\n".join(
+        "  ".join(
+            cell.ljust(width) for cell, width in zip(row, widths, strict=True)
+        ).rstrip()
+        for row in rows
+    )
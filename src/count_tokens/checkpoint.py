@@ -0,0 +1,119 @@
+"""Append-only checkpoint log of a directory scan, to resume it after a kill.
+
+The log is NDJSON: a header with the directory and the counting parameters,
+then a ``[file, result]`` row per counted file (for an archive, the list of
+its members and their results). Rows are written and synced to disk every
+``interval`` seconds and when the checkpoint is closed. A scan given an
+existing log with the same parameters takes the recorded results instead of
+counting those files again, so its output is that of an uninterrupted scan.
+"""
+
+import json
+import os
+import time
+
+# Seconds between writes of completed results to the log
+CHECKPOINT_INTERVAL = 5.0
+
+
+def _open_log(path: str, end: int):
+    """Open the log to append after ``end``, or to write a new one if it is 0."""
+    return open(path, "r+b" if end else "wb")
+
+
+class Checkpoint:
+    """Results of a directory scan recorded in an append-only log.
+
+    Args:
+        path: Path of the log, created if it does not exist
+        directory_path: The directory being scanned
+        params: Counting parameters of the scan; a log written with other
+            parameters cannot be resumed
+        interval: Seconds between writes of completed results
+
+    Raises:
+        ValueError: If the log belongs to another directory or parameters
+    """
+
+    def __init__(
+        self,
+        path: str,
+        directory_path: str,
+        params: dict,
+        interval: float = CHECKPOINT_INTERVAL,
+    ) -> None:
+        self.path = path
+        self.interval = interval
+        self.results: dict[str, int | dict | str | list] = {}
+        header = {"directory": directory_path, "params": params}
+        # Compare as JSON, where tuples are lists
+        header = json.loads(json.dumps(header))
+        end = self._load(header) if os.path.exists(path) else 0
+        self.resumed = len(self.results)
+        self._file = _open_log(path, end)
+        if end:
+            # Drop a row cut off when the previous scan was killed
+            self._file.seek(end)
+            self._file.truncate()
+        else:
+            self._file.write(json.dumps(header).encode() + b"\n")
+            self._sync()
+        self._rows: list[bytes] = []
+        self._written = time.monotonic()
+
+    def _load(self, header: dict) -> int:
+        """Read the recorded results; return the end of the last complete row."""
+        with open(self.path, "rb") as file:
+            first = file.readline()
+            if not first:
+                return 0
+            try:
+                recorded = json.loads(first)
+            except ValueError:
+                raise ValueError(f"{self.path} is not a checkpoint log") from None
+            if recorded != header:
+                raise ValueError(
+                    f"Checkpoint {self.path} was written by a scan of another "
+                    "directory or with other options; remove it to start over"
+                )
+            end = file.tell()
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    file_path, result = json.loads(line)
+                except ValueError:
+                    break
+                self.results[file_path] = result
+                end += len(line)
+        return end
+
+    def record(self, file_path: str, result) -> None:
+        """Record the result of a file, writing the log if the interval passed."""
+        self._rows.append(json.dumps([file_path, result]).encode() + b"\n")
+        if time.monotonic() - self._written >= self.interval:
+            self.write()
+
+    def write(self) -> None:
+        """Append the results recorded since the last write and sync the log."""
+        if self._rows:
+            self._file.writelines(self._rows)
+            self._rows.clear()
+            self._sync()
+        self._written = time.monotonic()
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        """Write the remaining results and close the log."""
+        if not self._file.closed:
+            self.write()
+            self._file.close()
+
+    def __enter__(self) -> "Checkpoint":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -1,18 +1,95 @@
 #!/usr/bin/env python3
 import argparse
+import contextlib
 import csv
+import functools
 import io
+import itertools
 import json
+import mmap
+import os
 import pathlib
+import sys
 from _csv import Writer
 from argparse import Namespace
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from typing import TYPE_CHECKING, BinaryIO
 
-import tiktoken
+if TYPE_CHECKING:
+    import concurrent.futures
+
+    import tiktoken
+
+    from .cache import CountCache
+    from .checkpoint import Checkpoint
 
 # Default values for token estimation
 TOKENS_PER_WORD = 4.0 / 3.0
 CHARACTERS_PER_TOKEN = 4.0
 
+# Policies for chunks that are not valid utf-8 in streaming mode
+DECODE_ERRORS = ("strict", "replace", "surrogateescape", "latin-1")
+
+# Whitespace recognised by str.split(), as raw utf-8 bytes
+_ASCII_WHITESPACE = b"\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f "
+_UNICODE_WHITESPACE = tuple(
+    chr(code_point).encode()
+    for code_point in (
+        *(0x85, 0xA0, 0x1680),
+        *range(0x2000, 0x200B),
+        *(0x2028, 0x2029, 0x202F, 0x205F, 0x3000),
+    )
+)
+# Maps whitespace bytes to b" " and all other bytes to b"x"
+_WORD_TABLE = bytes(0x20 if b in _ASCII_WHITESPACE else 0x78 for b in range(256))
+_CONTINUATION_BYTES = bytes(range(0x80, 0xC0))
+
+
+def _get_encoding(encoding_name: str) -> "tiktoken.Encoding":
+    """Return a tiktoken encoding, importing tiktoken on first use.
+
+    tiktoken is imported lazily so that approximation-only runs and ``--help``
+    do not pay for loading it.
+    """
+    import tiktoken
+
+    return tiktoken.get_encoding(encoding_name)
+
+
+# Texts shorter than this are tokenized with each encoding in turn, not on threads
+_PARALLEL_ENCODE_CHARS = 64 * 1024
+
+
+@functools.cache
+def _encoder_pool() -> "concurrent.futures.ThreadPoolExecutor":
+    """Return the thread pool that runs several encoders on the same text."""
+    import concurrent.futures
+
+    return concurrent.futures.ThreadPoolExecutor(thread_name_prefix="count_tokens")
+
+
+# A forked worker process must not reuse the parent's pool threads
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_encoder_pool.cache_clear)
+
+
+def _count_encodings(text: str, encoding_names: Sequence[str]) -> dict[str, int]:
+    """Return the number of tokens in a text for each of several encodings.
+
+    The tokenizer releases the GIL, so long texts are encoded with all the
+    encodings in parallel on a shared thread pool.
+    """
+    encodings = {name: _get_encoding(name) for name in encoding_names}
+    if len(encodings) == 1 or len(text) < _PARALLEL_ENCODE_CHARS:
+        return {
+            name: len(encoding.encode(text)) for name, encoding in encodings.items()
+        }
+    futures = {
+        name: _encoder_pool().submit(encoding.encode, text)
+        for name, encoding in encodings.items()
+    }
+    return {name: len(future.result()) for name, future in futures.items()}
+
 
 def count_tokens_in_string(string: str, encoding_name: str = "cl100k_base") -> int:
     """Return the number of tokens in a text string.
@@ -24,171 +101,1305 @@ def count_tokens_in_string(string: str, encoding_name: str = "cl100k_base") -> i
     Returns:
         The number of tokens in the text string.
     """
-    encoding = tiktoken.get_encoding(encoding_name)
+    encoding = _get_encoding(encoding_name)
     return len(encoding.encode(string))
 
 
-def count_tokens_in_file(
-    file_path: str,
+def count_tokens_in_strings(
+    texts: list[str],
     encoding_name: str = "cl100k_base",
+    num_threads: int = 8,
+) -> list[int]:
+    """Return the number of tokens in each of a list of text strings.
+
+    The whole list is passed to the encoding's batch encoder in one call. The
+    tokenizer releases the GIL, so the strings are encoded in parallel on
+    ``num_threads`` threads.
+
+    Args:
+        texts: The text strings to count the tokens in.
+        encoding_name: The name of the encoding to use. Default: cl100k_base
+        num_threads: Number of threads used by the batch encoder. Default: 8
+
+    Returns:
+        The number of tokens in each string, in the same order as ``texts``.
+    """
+    if not texts:
+        return []
+    encoding = _get_encoding(encoding_name)
+    return [
+        len(tokens) for tokens in encoding.encode_batch(texts, num_threads=num_threads)
+    ]
+
+
+def _is_plain(file_path: str | BinaryIO) -> bool:
+    """Return whether a file is a path on disk that is read as it is."""
+    if not isinstance(file_path, str):
+        return False
+    from .archives import is_packed
+
+    return not is_packed(file_path)
+
+
+def _open_binary(file_path: str | BinaryIO):
+    """Open a file for binary reading, decompressing compressed files and members.
+
+    An open binary file is returned as it is, without being closed on exit.
+    """
+    if not isinstance(file_path, str):
+        return contextlib.nullcontext(file_path)
+    if _is_plain(file_path):
+        return open(file_path, "rb")
+    from .archives import open_packed
+
+    return open_packed(file_path)
+
+
+def _read_text(file_path: str | BinaryIO, decode_errors: str | None = None) -> str:
+    """Read a whole file as text, like ``Path.read_text()``.
+
+    With ``decode_errors`` (one of ``DECODE_ERRORS``) the file is decoded as
+    utf-8 with that policy, as streamed chunks are, instead of in the locale
+    encoding.
+    """
+    if decode_errors is not None:
+        with _open_binary(file_path) as file:
+            return _decode_chunk(file.read(), decode_errors)[0]
+    if _is_plain(file_path):
+        return pathlib.Path(file_path).read_text()
+    with _open_binary(file_path) as file:
+        text = io.TextIOWrapper(file)
+        try:
+            return text.read()
+        finally:
+            text.detach()
+
+
+def count_tokens_in_file(
+    file_path: str | BinaryIO,
+    encoding_name: str | Sequence[str] = "cl100k_base",
     approximate: str | None = None,
     tokens_per_word: float = TOKENS_PER_WORD,
     characters_per_token: float = CHARACTERS_PER_TOKEN,
-) -> int:
+    decode_errors: str | None = None,
+) -> int | dict[str, int]:
     """Return the number of tokens in a text file.
 
+    With a list of encodings the file is read once and the counts are
+    returned in a dict keyed by encoding.
+
+    Compressed files (``.gz``, ``.bz2``, ``.xz``, ``.zst``) and members of
+    archives (``archive.tar.gz::path/inside``) are decompressed while read,
+    see ``count_tokens.archives``.
+
     Args:
-        file_path: The path to the text file to count the tokens in.
-        encoding_name: The name of the encoding to use. Default: cl100k_base
-        approximate: Approximate the number of tokens without tokenizing. Base on: w - words, c - characters
+        file_path: The path to the text file to count the tokens in, or an open
+            binary file.
+        encoding_name: The name of the encoding to use, or a list of names. Default: cl100k_base
+        approximate: Approximate the number of tokens without tokenizing all of the text. Base on: w - words, c - characters, s - sampling
         tokens_per_word: The number of tokens per word for word-based approximation. Default: 4/3
         characters_per_token: The number of characters per token for character-based approximation. Default: 4
+        decode_errors: Policy for bytes that are not valid utf-8 (see
+            ``DECODE_ERRORS``); by default the file is read in the locale
+            encoding, like ``Path.read_text()``
 
     Returns:
-        The number of tokens in the text file.
+        The number of tokens in the text file, or a dict of counts by encoding.
     """
-    text = pathlib.Path(file_path).read_text()
-    if approximate is None:
-        return count_tokens_in_string(text, encoding_name)
-    elif approximate == "w":
-        return int(len(text.split()) * tokens_per_word)
+    if approximate == "s":
+        from .sampling import estimate_tokens
+
+        if not _is_plain(file_path):
+            raise ValueError("Sampling estimates need an uncompressed file")
+        if isinstance(encoding_name, str):
+            return estimate_tokens([file_path], encoding_name)["tokens"]
+        return {
+            name: estimate_tokens([file_path], name)["tokens"] for name in encoding_name
+        }
+    text = _read_text(file_path, decode_errors)
+    if approximate == "w":
+        tokens = int(len(text.split()) * tokens_per_word)
     elif approximate == "c":
-        return int(len(text) / characters_per_token)
-    return count_tokens_in_string(text, encoding_name)
+        tokens = int(len(text) / characters_per_token)
+    elif isinstance(encoding_name, str):
+        return count_tokens_in_string(text, encoding_name)
+    else:
+        return _count_encodings(text, encoding_name)
+    # The approximations do not depend on the encoding
+    if isinstance(encoding_name, str):
+        return tokens
+    return dict.fromkeys(encoding_name, tokens)
 
 
-def _read_chunk_to_boundary(file, chunk_size: int) -> str:
+def _read_chunk_to_boundary(file, chunk_size: int) -> str | bytes:
     """Read a chunk from file, extending to the next newline to avoid splitting tokens.
 
     Args:
-        file: Open file object
+        file: Open file object (text or binary)
         chunk_size: Approximate size of chunk to read in bytes
 
     Returns:
-        Text chunk ending at a newline boundary (or EOF)
+        Chunk ending at a newline boundary (or EOF), of the file's type
     """
     chunk = file.read(chunk_size)
     if not chunk:
-        return ""
+        return chunk
 
     # If we're not at EOF, read until the next newline to avoid splitting tokens
-    if not chunk.endswith("\n"):
+    if not chunk.endswith(b"\n" if isinstance(chunk, bytes) else "\n"):
         remainder = file.readline()
         chunk += remainder
 
     return chunk
 
 
-def count_tokens_in_large_file(
+def _decode_chunk(
+    chunk: bytes | memoryview, errors: str = "strict"
+) -> tuple[str, bool]:
+    """Decode a newline-aligned utf-8 chunk like a text-mode file (universal newlines).
+
+    Args:
+        chunk: Raw bytes of the chunk
+        errors: Policy for invalid utf-8, one of ``DECODE_ERRORS``
+
+    Returns:
+        Decoded text and whether the error policy was needed for this chunk
+    """
+    try:
+        text = str(chunk, "utf-8")
+        fallback = False
+    except UnicodeDecodeError:
+        if errors == "strict":
+            raise
+        if errors == "latin-1":
+            text = str(chunk, "latin-1")
+        else:
+            text = str(chunk, "utf-8", errors)
+        fallback = True
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text, fallback
+
+
+def _utf8_tail_start(block: bytes) -> int:
+    """Return where an incomplete utf-8 sequence at the end of ``block`` starts."""
+    size = len(block)
+    for i in range(size - 1, max(size - 5, -1), -1):
+        byte = block[i]
+        if byte < 0x80:
+            return size
+        if byte >= 0xC0:
+            length = 2 if byte < 0xE0 else 3 if byte < 0xF0 else 4
+            return i if size - i < length else size
+    return size
+
+
+def _iter_utf8_blocks(file, block_size: int) -> Iterator[bytes]:
+    """Yield fixed-size blocks of a binary file that never end inside a utf-8 character."""
+    carry = b""
+    while block := file.read(block_size):
+        if carry:
+            block = carry + block
+        cut = _utf8_tail_start(block)
+        carry = block[cut:]
+        if cut:
+            yield block if cut == len(block) else block[:cut]
+    if carry:
+        yield carry
+
+
+def _count_units_in_stream(
+    file_path: str | BinaryIO, approximate: str, block_size: int
+) -> int:
+    """Count words (``w``) or characters (``c``) of a file in constant memory.
+
+    Works on raw bytes, without decoding or building a list of words. The
+    results match ``len(text.split())`` and ``len(text)`` of the file read
+    with ``read_text()`` (utf-8, universal newlines): words spanning block
+    boundaries are counted once, multibyte characters count as one character
+    and ``\\r\\n`` counts as one.
+    """
+    units = 0
+    in_word = prev_cr = False
+    with _open_binary(file_path) as file:
+        for block in _iter_utf8_blocks(file, block_size):
+            if approximate == "w":
+                if not block.isascii():
+                    for whitespace in _UNICODE_WHITESPACE:
+                        block = block.replace(whitespace, b" ")
+                mapped = block.translate(_WORD_TABLE)
+                units += mapped.count(b" x")
+                if mapped[0] == 0x78 and not in_word:
+                    units += 1
+                in_word = mapped[-1] == 0x78
+            else:
+                units += len(block) - block.count(b"\r\n")
+                if not block.isascii():
+                    units -= len(block) - len(
+                        block.translate(None, _CONTINUATION_BYTES)
+                    )
+                if prev_cr and block[0] == 0x0A:
+                    units -= 1
+                prev_cr = block[-1] == 0x0D
+    return units
+
+
+def _chunk_ranges(file_path: str, chunk_size: int) -> list[tuple[int, int]]:
+    """Return the byte ranges of the chunks ``_read_chunk_to_boundary`` would read.
+
+    Only the byte before each nominal boundary and the rest of its line are
+    read, so planning is cheap even for very large files.
+    """
+    ranges: list[tuple[int, int]] = []
+    size = os.path.getsize(file_path)
+    with open(file_path, "rb") as file:
+        start = 0
+        while start < size:
+            end = start + chunk_size
+            if end >= size:
+                end = size
+            else:
+                file.seek(end - 1)
+                if file.read(1) != b"\n":
+                    file.readline()
+                    end = file.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+@contextlib.contextmanager
+def _mapped_file(file_path: str) -> Iterator[memoryview]:
+    """Memory-map a file read-only and yield a view of its bytes."""
+    with open(file_path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            yield memoryview(b"")
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if hasattr(mapped, "madvise"):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            with memoryview(mapped) as view:
+                yield view
+
+
+_NEWLINE = ord("\n")
+
+
+def _mapped_chunk_ranges(
+    view: memoryview, chunk_size: int
+) -> Iterator[tuple[int, int]]:
+    """Yield newline-aligned chunk ranges of a mapped file.
+
+    Uses the same rule as ``_read_chunk_to_boundary``, but searches the raw
+    bytes for the newline instead of reading and concatenating the remainder.
+    """
+    data = view.obj
+    size = len(view)
+    start = 0
+    while start < size:
+        end = start + chunk_size
+        if end >= size:
+            end = size
+        elif view[end - 1] != _NEWLINE:
+            newline = data.find(b"\n", end)
+            end = size if newline == -1 else newline + 1
+        yield start, end
+        start = end
+
+
+def _iter_decoded_chunks(
+    file_path: str | BinaryIO,
+    chunk_size: int,
+    use_mmap: bool = False,
+    decode_errors: str = "latin-1",
+) -> Iterator[tuple[str, bool]]:
+    """Yield the decoded newline-aligned chunks of a file in a single pass.
+
+    Yields:
+        Chunk text and whether the decode error policy was needed for it
+    """
+    if use_mmap and _is_plain(file_path):
+        with _mapped_file(file_path) as view:
+            for start, end in _mapped_chunk_ranges(view, chunk_size):
+                yield _decode_chunk(view[start:end], decode_errors)
+    else:
+        with _open_binary(file_path) as file:
+            while chunk := _read_chunk_to_boundary(file, chunk_size):
+                yield _decode_chunk(chunk, decode_errors)
+
+
+def _count_range(
+    file_path: str, encoding, byte_range: tuple[int, int], decode_errors: str
+) -> tuple[int, bool]:
+    start, end = byte_range
+    with open(file_path, "rb") as file:
+        file.seek(start)
+        chunk = file.read(end - start)
+    text, fallback = _decode_chunk(chunk, decode_errors)
+    return len(encoding.encode(text)), fallback
+
+
+def _count_view_range(
+    view: memoryview, encoding, byte_range: tuple[int, int], decode_errors: str
+) -> tuple[int, bool]:
+    start, end = byte_range
+    text, fallback = _decode_chunk(view[start:end], decode_errors)
+    return len(encoding.encode(text)), fallback
+
+
+def _count_large_file_parallel(
     file_path: str,
-    encoding_name: str = "cl100k_base",
+    encoding,
+    chunk_size: int,
+    workers: int,
+    use_mmap: bool = False,
+    decode_errors: str = "latin-1",
+) -> Iterator[tuple[int, bool]]:
+    """Count newline-aligned byte ranges of a file on a thread pool.
+
+    The tokenizer releases the GIL, so threads encode chunks in parallel
+    without the cost of shipping chunks to other processes. With ``use_mmap``
+    all threads decode their ranges straight from one shared mapping.
+
+    Yields:
+        Token count of each chunk and whether the decode error policy was needed
+    """
+    import concurrent.futures
+
+    with contextlib.ExitStack() as stack:
+        if use_mmap:
+            view = stack.enter_context(_mapped_file(file_path))
+            ranges = list(_mapped_chunk_ranges(view, chunk_size))
+            count_range = functools.partial(_count_view_range, view, encoding)
+        else:
+            ranges = _chunk_ranges(file_path, chunk_size)
+            count_range = functools.partial(_count_range, file_path, encoding)
+        executor = stack.enter_context(
+            concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        )
+        yield from executor.map(
+            functools.partial(count_range, decode_errors=decode_errors), ranges
+        )
+
+
+def _limit_exceeded(tokens: int, max_tokens: int) -> dict:
+    """Return the result of a limit check stopped once ``max_tokens`` was exceeded."""
+    return {"limit_exceeded": True, "tokens_at_least": tokens, "max_tokens": max_tokens}
+
+
+def _result_tokens(result) -> int:
+    """Return the token count of a per-file result (0 for errors and skipped files)."""
+    if isinstance(result, dict):
+        return result.get("tokens", result.get("tokens_at_least", 0))
+    return result if isinstance(result, int) else 0
+
+
+def _chunk_counts(
+    file_path: str | BinaryIO,
+    encoding_name: str,
+    chunk_size: int,
+    workers: int,
+    use_mmap: bool,
+    decode_errors: str,
+    cache: "CountCache | None",
+) -> Iterator[tuple[int, bool]]:
+    """Return the generator of chunk counts for the streaming mode in use."""
+    if cache is not None:
+        from .incremental import iter_chunk_counts
+
+        return iter_chunk_counts(
+            file_path, cache, encoding_name, chunk_size, decode_errors
+        )
+    encoding = _get_encoding(encoding_name)
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    # Compressed files and archive members can only be read sequentially
+    if workers > 1 and _is_plain(file_path):
+        return _count_large_file_parallel(
+            file_path, encoding, chunk_size, workers, use_mmap, decode_errors
+        )
+    return (
+        (len(encoding.encode(text)), fallback)
+        for text, fallback in _iter_decoded_chunks(
+            file_path, chunk_size, use_mmap, decode_errors
+        )
+    )
+
+
+def _count_large_file_encodings(
+    file_path: str | BinaryIO,
+    encoding_names: Sequence[str],
+    chunk_size: int,
+    use_mmap: bool,
+    decode_errors: str,
+    details: bool,
+    max_tokens: int | None,
+) -> dict:
+    """Count a large file with several encodings, decoding each chunk once.
+
+    Counting stops early only once every encoding is over ``max_tokens``.
+    """
+    totals = dict.fromkeys(encoding_names, 0)
+    chunks = fallback_chunks = 0
+    stopped = False
+    with contextlib.closing(
+        _iter_decoded_chunks(file_path, chunk_size, use_mmap, decode_errors)
+    ) as decoded:
+        for text, fallback in decoded:
+            for name, tokens in _count_encodings(text, encoding_names).items():
+                totals[name] += tokens
+            chunks += 1
+            fallback_chunks += fallback
+            if max_tokens is not None and min(totals.values()) > max_tokens:
+                stopped = True
+                break
+
+    results: dict = dict(totals)
+    if max_tokens is not None:
+        for name, tokens in totals.items():
+            if stopped:
+                results[name] = _limit_exceeded(tokens, max_tokens)
+            elif tokens > max_tokens:
+                results[name] = _check_limit(tokens, max_tokens)
+    if details:
+        return {
+            "tokens": results,
+            "chunks": chunks,
+            "fallback_chunks": fallback_chunks,
+        }
+    return results
+
+
+def count_tokens_in_large_file(
+    file_path: str | BinaryIO,
+    encoding_name: str | Sequence[str] = "cl100k_base",
     chunk_size: int = 1024 * 1024,  # 1MB chunks
     approximate: str | None = None,
     tokens_per_word: float = TOKENS_PER_WORD,
     characters_per_token: float = CHARACTERS_PER_TOKEN,
-) -> int:
+    workers: int = 1,
+    use_mmap: bool = False,
+    decode_errors: str = "latin-1",
+    details: bool = False,
+    max_tokens: int | None = None,
+    cache: "CountCache | None" = None,
+):
     """Count tokens in a large file by streaming in chunks.
 
     Reads chunks aligned to newline boundaries to avoid splitting tokens
     at arbitrary positions, which would cause inaccurate token counts.
+    With ``workers`` > 1 the file is split into the same newline-aligned byte
+    ranges up front and the ranges are tokenized in parallel; the total is
+    identical to the sequential count. With ``use_mmap`` the file is
+    memory-mapped and each chunk is decoded once, straight from the mapped
+    bytes, keeping peak memory flat.
+
+    The file is read in a single pass. Chunks that are not valid utf-8 are
+    decoded according to ``decode_errors``: ``strict`` raises, ``replace`` and
+    ``surrogateescape`` are passed to the utf-8 codec, and ``latin-1`` decodes
+    just that chunk as latin-1.
+
+    The ``w`` and ``c`` approximations also stream the file, in fixed-size
+    blocks of raw bytes, so memory use stays constant even for files without
+    newlines.
+
+    With ``max_tokens`` the count stops at the first chunk that takes the
+    running total over the limit, so a limit check of a huge file only
+    tokenizes the chunks up to that point.
+
+    With a list of encodings each chunk is read and decoded once and passed
+    to every encoder, in parallel for large chunks; the result is a dict of
+    counts by encoding, and ``workers`` and ``cache`` do not apply.
+
+    With ``cache`` the count is incremental: the file is split into
+    content-defined chunks and the count of each chunk is cached by the hash
+    of its bytes, so after an append or a small edit only the changed chunks
+    are tokenized (see ``count_tokens.incremental``). The chunks are counted
+    sequentially and ``workers`` and ``use_mmap`` do not apply.
+
+    Compressed files and archive members are decompressed on a reader thread
+    while the chunks are tokenized; they are read sequentially, so
+    ``workers`` and ``use_mmap`` do not apply to them either.
 
     Args:
-        file_path: Path to the file
-        encoding_name: Encoding to use
+        file_path: Path to the file, or an open binary file
+        encoding_name: Encoding to use, or a list of encodings
         chunk_size: Size of chunks to read in bytes
-        approximate: Approximate the number of tokens without tokenizing. Base on: w - words, c - characters
+        approximate: Approximate the number of tokens without tokenizing all of the text. Base on: w - words, c - characters, s - sampling
         tokens_per_word: The number of tokens per word for word-based approximation. Default: 4/3
         characters_per_token: The number of characters per token for character-based approximation. Default: 4
+        workers: Number of threads tokenizing chunks (1: sequential, 0: one per CPU)
+        use_mmap: Read the file through a memory-mapped, byte-level reader
+        decode_errors: Policy for chunks that are not valid utf-8. Default: latin-1
+        details: Return a dict with ``tokens``, ``chunks`` and ``fallback_chunks``
+            (and ``cached_chunks`` with ``cache``)
+        max_tokens: Stop counting once the total exceeds this limit
+        cache: Cache of chunk counts for incremental counting
 
     Returns:
-        Total token count
+        Total token count, or a dict of counts if ``details`` is set. If
+        ``max_tokens`` was exceeded, a dict with ``limit_exceeded``,
+        ``tokens_at_least`` (the count when counting stopped) and ``max_tokens``.
+        With several encodings, a dict of these results keyed by encoding
+        (under ``tokens`` if ``details`` is set).
     """
     if approximate is not None:
-        # For approximation methods, we can just read the whole file and count
+        if approximate == "w":
+            units = _count_units_in_stream(file_path, "w", chunk_size)
+            tokens = int(units * tokens_per_word)
+        elif approximate == "c":
+            units = _count_units_in_stream(file_path, "c", chunk_size)
+            tokens = int(units / characters_per_token)
+        else:
+            tokens = count_tokens_in_file(
+                file_path,
+                encoding_name,
+                approximate,
+                tokens_per_word,
+                characters_per_token,
+            )
+        if isinstance(tokens, int) and not isinstance(encoding_name, str):
+            # The approximations do not depend on the encoding
+            tokens = dict.fromkeys(encoding_name, tokens)
+        if isinstance(tokens, dict):
+            return {
+                name: _limit_exceeded(count, max_tokens)
+                if max_tokens is not None and count > max_tokens
+                else count
+                for name, count in tokens.items()
+            }
+        if max_tokens is not None and tokens > max_tokens:
+            return _limit_exceeded(tokens, max_tokens)
+        return tokens
+    if decode_errors not in DECODE_ERRORS:
+        raise ValueError(
+            f"decode_errors must be one of {', '.join(DECODE_ERRORS)}, "
+            f"got {decode_errors!r}"
+        )
+    if not isinstance(encoding_name, str):
+        if cache is not None:
+            raise ValueError("Incremental counting supports a single encoding")
+        return _count_large_file_encodings(
+            file_path,
+            encoding_name,
+            chunk_size,
+            use_mmap,
+            decode_errors,
+            details,
+            max_tokens,
+        )
+
+    hits = cache.chunk_hits if cache is not None else 0
+    chunk_counts = _chunk_counts(
+        file_path, encoding_name, chunk_size, workers, use_mmap, decode_errors, cache
+    )
+
+    total_tokens = chunks = fallback_chunks = 0
+    # Closing the generator stops reading, and cancels pending chunks in parallel mode
+    with contextlib.closing(chunk_counts):
+        for tokens, fallback in chunk_counts:
+            total_tokens += tokens
+            chunks += 1
+            fallback_chunks += fallback
+            if max_tokens is not None and total_tokens > max_tokens:
+                break
+
+    exceeded = max_tokens is not None and total_tokens > max_tokens
+    if details:
+        result = (
+            _limit_exceeded(total_tokens, max_tokens)
+            if exceeded
+            else {"tokens": total_tokens}
+        )
+        result.update(chunks=chunks, fallback_chunks=fallback_chunks)
+        if cache is not None:
+            result["cached_chunks"] = cache.chunk_hits - hits
+        return result
+    if exceeded:
+        return _limit_exceeded(total_tokens, max_tokens)
+    return total_tokens
+
+
+def _resolve_profile(profile: dict | str | None, encoding_name: str) -> dict | None:
+    """Return the calibration for an encoding, loading it if ``profile`` is a path."""
+    if isinstance(profile, str):
+        from .calibration import load_profile
+
+        return load_profile(profile, encoding_name)
+    return profile
+
+
+def _profile_ratios(
+    profile: dict | None,
+    file_path: str,
+    tokens_per_word: float,
+    characters_per_token: float,
+) -> tuple[float, float]:
+    """Return the calibrated ratios for a file's extension, or the given ratios."""
+    if not profile:
+        return tokens_per_word, characters_per_token
+    fit = profile["extensions"].get(
+        pathlib.Path(file_path).suffix.lower(), profile["default"]
+    )
+    return (
+        fit["tokens_per_word"] or tokens_per_word,
+        fit["characters_per_token"] or characters_per_token,
+    )
+
+
+def _count_file_safe(
+    file_path: str | BinaryIO,
+    encoding_name: str | Sequence[str] = "cl100k_base",
+    use_streaming: bool = False,
+    chunk_size: int = 1024 * 1024,
+    approximate: str | None = None,
+    tokens_per_word: float = TOKENS_PER_WORD,
+    characters_per_token: float = CHARACTERS_PER_TOKEN,
+    use_mmap: bool = False,
+    decode_errors: str = "latin-1",
+    profile: dict | None = None,
+    max_tokens: int | None = None,
+    skip_binary: bool = True,
+    max_file_size: int | None = None,
+    max_line_length: int | None = None,
+) -> int | dict | str:
+    """Count tokens in one file of a directory scan.
+
+    ``file_path`` can also be an open member of an archive, whose ``name`` is
+    its ``archive::member`` path. Archives themselves are skipped, and binary,
+    oversized and minified files are rejected by ``sniff.sniff`` before they
+    are read in full.
+
+    Returns:
+        Token count, a limit check result if ``max_tokens`` was exceeded (a
+        dict of these by encoding with several encodings), a ``"Skipped: ..."``
+        string if the file was rejected, or an ``"Error: ..."`` string if it
+        could not be counted
+    """
+    tokens_per_word, characters_per_token = _profile_ratios(
+        profile,
+        getattr(file_path, "name", file_path),
+        tokens_per_word,
+        characters_per_token,
+    )
+    try:
+        if isinstance(file_path, str):
+            from .archives import is_archive
+
+            if is_archive(file_path):
+                # Members are counted with archives on, see archives.count_packed
+                return "Skipped: archive (count its members with --archives)"
+        if skip_binary or max_file_size is not None or max_line_length is not None:
+            from .sniff import sniff
+
+            reason = sniff(file_path, skip_binary, max_file_size, max_line_length)
+            if reason is not None:
+                return reason
+        if use_streaming or max_tokens is not None:
+            return count_tokens_in_large_file(
+                file_path,
+                encoding_name=encoding_name,
+                chunk_size=chunk_size,
+                approximate=approximate,
+                tokens_per_word=tokens_per_word,
+                characters_per_token=characters_per_token,
+                use_mmap=use_mmap,
+                decode_errors=decode_errors,
+                max_tokens=max_tokens,
+            )
         return count_tokens_in_file(
-            file_path, encoding_name, approximate, tokens_per_word, characters_per_token
+            file_path,
+            encoding_name=encoding_name,
+            approximate=approximate,
+            tokens_per_word=tokens_per_word,
+            characters_per_token=characters_per_token,
         )
+    except Exception as e:
+        return f"Error: {e!s}"
 
-    encoding = tiktoken.get_encoding(encoding_name)
-    total_tokens = 0
 
+def _file_size(file_path: str) -> int:
     try:
-        with open(file_path, encoding="utf-8") as file:
-            while True:
-                chunk = _read_chunk_to_boundary(file, chunk_size)
-                if not chunk:
-                    break
-                total_tokens += len(encoding.encode(chunk))
-    except UnicodeDecodeError:
-        # Try with a different encoding if utf-8 fails
-        with open(file_path, encoding="latin-1") as file:
-            while True:
-                chunk = _read_chunk_to_boundary(file, chunk_size)
-                if not chunk:
-                    break
-                total_tokens += len(encoding.encode(chunk))
+        return os.path.getsize(file_path)
+    except OSError:
+        return 0
 
-    return total_tokens
 
+# Upper bound on files sent to a worker in a single task
+_MAX_BATCH_FILES = 256
+# Number of files taken from the walk before their batches are planned
+_WINDOW_FILES = 4096
+# Batches submitted to the pool but not finished, per worker
+_IN_FLIGHT_PER_WORKER = 4
 
-def count_tokens_in_directory(
+
+def _plan_batches(files: list[str], workers: int) -> list[list[str]]:
+    """Group files into batches for the worker pool, largest files first.
+
+    Files are sorted by size (longest-processing-time-first), so a huge file
+    starts early instead of leaving the other workers idle at the end. Files
+    larger than the per-batch byte target get a batch of their own; small
+    files are grouped to reduce inter-process overhead.
+    """
+    sized = sorted(((_file_size(f), f) for f in files), key=lambda x: -x[0])
+    total = sum(size for size, _ in sized)
+    target = max(total // (workers * 8), 1)
+    batches: list[list[str]] = []
+    batch: list[str] = []
+    batch_bytes = 0
+    for size, file_path in sized:
+        batch.append(file_path)
+        batch_bytes += size
+        if batch_bytes >= target or len(batch) >= _MAX_BATCH_FILES:
+            batches.append(batch)
+            batch, batch_bytes = [], 0
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _init_worker(encoding_name: str | Sequence[str], approximate: str | None) -> None:
+    """Load the encodings once per worker process."""
+    if approximate is None:
+        names = [encoding_name] if isinstance(encoding_name, str) else encoding_name
+        for name in names:
+            _get_encoding(name)
+
+
+def _file_counter(
+    file_patterns: list[str], archives: bool, **options
+) -> tuple[Callable, list[str]]:
+    """Return the counter of one file of a directory scan and the patterns to walk.
+
+    With ``archives`` the counter gives a list of ``(member, result)`` for an
+    archive, and the patterns also match compressed files and archives.
+
+    Args:
+        file_patterns: Glob patterns of the files to count
+        archives: Also count compressed files and the members of archives
+        **options: Keyword arguments of ``_count_file_safe``
+    """
+    count_file = functools.partial(_count_file_safe, **options)
+    if not archives:
+        return count_file, file_patterns
+    from .archives import count_packed, packed_patterns
+
+    return (
+        functools.partial(count_packed, count_file, file_patterns),
+        packed_patterns(file_patterns),
+    )
+
+
+def _count_batch(
+    count_file, batch: list[str], expected: list[str | None] | None = None
+) -> list[int | dict | str]:
+    if expected is None:
+        return [count_file(file_path) for file_path in batch]
+    return [
+        count_file(file_path, digest)
+        for file_path, digest in zip(batch, expected, strict=True)
+    ]
+
+
+def _count_with_digest(
+    count_file, file_path: str, expected: str | None = None
+) -> tuple:
+    """Count a file and hash its content for the cache, in the same worker.
+
+    Args:
+        count_file: Counter of one file
+        file_path: Path of the file
+        expected: Digest of the file's cache entry, if the file's size or
+            mtime changed since; the file is only counted if its digest differs
+
+    Returns:
+        The result and the file's digest (None if the result is not a count),
+        or ``(None, digest)`` if the file still has the ``expected`` digest
+    """
+    from .cache import file_digest
+
+    digest = None
+    if expected is not None:
+        with contextlib.suppress(OSError):
+            digest = file_digest(file_path)
+        if digest == expected:
+            return None, digest
+    tokens = count_file(file_path)
+    if not isinstance(tokens, int | dict):
+        return tokens, None
+    if digest is None:
+        try:
+            digest = file_digest(file_path)
+        except OSError:
+            return tokens, None
+    return tokens, digest
+
+
+def _count_files_parallel(
+    files: Iterable[str],
+    count_file,
+    workers: int,
+    encoding_name: str | Sequence[str],
+    approximate,
+    expected: dict[str, str] | None = None,
+) -> Iterator[tuple[str, int | dict | str]]:
+    """Count files on a process pool while they are still being found.
+
+    Files are taken from ``files`` in windows, and each window is planned
+    into batches. At most ``_IN_FLIGHT_PER_WORKER`` batches per worker are
+    submitted at a time; the next batch, or the next window once a window is
+    used up, is only taken when a batch finishes. Memory use therefore does
+    not grow with the number of files, and a consumer that stops reading
+    (such as ``max_total_tokens``) stops the walk too. Closing the generator
+    cancels the batches that have not started yet.
+
+    With ``expected``, the digests found in it for the files of a batch are
+    passed to ``count_file`` as a second argument, see ``_count_with_digest``.
+
+    Yields:
+        File path and result, batch by batch in order of completion
+    """
+    import concurrent.futures
+
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(encoding_name, approximate),
+    )
+    try:
+        worker = functools.partial(_count_batch, count_file)
+        batches: dict[concurrent.futures.Future, list[str]] = {}
+        # Planned batches not submitted yet, the next one last
+        planned: list[list[str]] = []
+        files = iter(files)
+        while True:
+            while len(batches) < workers * _IN_FLIGHT_PER_WORKER:
+                if not planned:
+                    window = list(itertools.islice(files, _WINDOW_FILES))
+                    if not window:
+                        break
+                    planned = _plan_batches(window, workers)[::-1]
+                batch = planned.pop()
+                if expected is None:
+                    future = executor.submit(worker, batch)
+                else:
+                    digests = [expected.pop(file_path, None) for file_path in batch]
+                    future = executor.submit(worker, batch, digests)
+                batches[future] = batch
+            if not batches:
+                break
+            done, _ = concurrent.futures.wait(
+                batches, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                yield from zip(batches.pop(future), future.result(), strict=True)
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+# Result of files not counted because the total token limit was exceeded
+_SKIPPED_OVER_TOTAL = "Skipped: total token limit exceeded"
+# Options of ``iter_token_counts`` that do not change the results
+_RUN_OPTIONS = ("workers", "cache", "use_mmap", "checkpoint")
+
+
+def _largest_result_tokens(result) -> int:
+    """Return the largest count of a per-file result keyed by encoding."""
+    if isinstance(result, dict) and "max_tokens" not in result:
+        return max(map(_result_tokens, result.values()), default=0)
+    return _result_tokens(result)
+
+
+def _by_file(results: dict, encoding_names: Sequence[str]) -> dict:
+    """Turn per-encoding results by file into per-file results keyed by encoding.
+
+    This is the inverse of ``_by_encoding``; errors and skipped files, which
+    are the same for every encoding, stay plain strings.
+    """
+    return {
+        file_path: tokens
+        if isinstance(tokens, str)
+        else {name: results[name][file_path] for name in encoding_names}
+        for file_path, tokens in results[encoding_names[0]].items()
+    }
+
+
+def _by_encoding(results: dict, encoding_names: Sequence[str]) -> dict:
+    """Turn per-file results keyed by encoding into per-encoding results by file."""
+    return {
+        name: {
+            file_path: tokens[name] if isinstance(tokens, dict) else tokens
+            for file_path, tokens in results.items()
+        }
+        for name in encoding_names
+    }
+
+
+def iter_token_counts(
     directory_path: str,
     file_patterns: list[str] | None = None,
     recursive: bool = False,
-    encoding_name: str = "cl100k_base",
+    encoding_name: str | Sequence[str] = "cl100k_base",
     use_streaming: bool = False,
     chunk_size: int = 1024 * 1024,
     approximate: str | None = None,
     tokens_per_word: float = TOKENS_PER_WORD,
     characters_per_token: float = CHARACTERS_PER_TOKEN,
-) -> dict[str, int | str]:
-    """Count tokens in multiple files matching patterns in a directory.
+    workers: int = 1,
+    cache: "CountCache | None" = None,
+    use_mmap: bool = False,
+    decode_errors: str = "latin-1",
+    profile: dict | str | None = None,
+    max_tokens: int | None = None,
+    max_total_tokens: int | None = None,
+    exclude: Iterable[str] | None = None,
+    use_ignore_files: bool = True,
+    archives: bool = False,
+    skip_binary: bool = True,
+    max_file_size: int | None = None,
+    max_line_length: int | None = None,
+    shard: tuple[int, int] | None = None,
+    checkpoint: "Checkpoint | None" = None,
+    found: list[str] | None = None,
+    positions: dict[str, int] | None = None,
+) -> Iterator[tuple[str, int | dict | str]]:
+    """Yield the token count of each file in a directory as soon as it is counted.
+
+    This is the streaming form of ``count_tokens_in_directory``: nothing is
+    kept per file, so memory use does not grow with the number of files.
+    Counting in this process yields files in the order they are found; with
+    ``workers`` they are yielded in the order they finish. Once the total
+    exceeds ``max_total_tokens`` the walk stops: files already found (such
+    as those being counted by workers) come last, reported as skipped, and
+    files not found yet are not reported.
 
     Args:
         directory_path: Path to directory to scan
         file_patterns: List of glob patterns to match files (default: ["*.txt", "*.py", "*.md"])
         recursive: Whether to search subdirectories
-        encoding_name: The name of the encoding to use
+        encoding_name: The name of the encoding to use, or a list of names
         use_streaming: Whether to use streaming for large files
         chunk_size: Size of chunks to read in bytes (for streaming)
         approximate: Approximate the number of tokens without tokenizing
         tokens_per_word: The number of tokens per word for approximation
         characters_per_token: The number of characters per token for approximation
+        workers: Number of worker processes (1: count in this process, 0: one per CPU)
+        cache: Persistent cache to reuse counts of unchanged files from earlier runs
+        use_mmap: Use the memory-mapped reader when streaming
+        decode_errors: Policy for chunks that are not valid utf-8 when streaming
+        profile: Calibration profile (or path of a profile file) with the
+            approximation ratios per file extension, see ``calibration.calibrate``
+        max_tokens: Stop counting a file once it exceeds this limit
+        max_total_tokens: Stop the scan once the total of all files exceeds this limit
+        exclude: gitignore-style rules for paths to skip (default: VCS,
+            virtualenv and cache directories)
+        use_ignore_files: Whether to apply ``.gitignore`` files found in the tree
+        archives: Also count compressed variants of the matching files (such as
+            ``notes.txt.gz``) and the matching members of tar and zip archives,
+            reported as ``archive.tar.gz::path/inside``
+        skip_binary: Skip files whose first few KB look binary
+        max_file_size: Skip files larger than this many bytes
+        max_line_length: Skip files with a line longer than this many bytes in
+            their first few KB, such as minified bundles
+        shard: Only count the files of shard ``i`` of ``n`` (``(i, n)``, from
+            1), chosen by a stable hash of their path, see ``shard.shard_of``
+        checkpoint: Log of a scan to resume: files it recorded are not counted
+            again, and the results of counted files are recorded in it
+        found: If given, every file found is appended to it, in the order found
+        positions: If given, the position of every file found in the walk of
+            the whole directory (counting the files of other shards) is
+            stored in it
 
-    Returns:
-        Dict mapping filenames to token counts
+    Yields:
+        File path and its result as in ``count_tokens_in_directory``; with
+        several encodings, a dict of results keyed by encoding
     """
+    from .walk import DEFAULT_EXCLUDES, walk_files
+
     if file_patterns is None:
         file_patterns = ["*.txt", "*.py", "*.md"]
-    results: dict[str, int | str] = {}
-    base_path = pathlib.Path(directory_path)
+    if exclude is None:
+        exclude = DEFAULT_EXCLUDES
+    if isinstance(encoding_name, str):
+        encoding_names = None
+        result_tokens = _result_tokens
+    else:
+        encoding_name = encoding_names = list(encoding_name)
+        result_tokens = _largest_result_tokens
+    profile = _resolve_profile(
+        profile, encoding_name if encoding_names is None else encoding_names[0]
+    )
+    count_file, walk_patterns = _file_counter(
+        file_patterns,
+        archives,
+        encoding_name=encoding_name,
+        use_streaming=use_streaming,
+        chunk_size=chunk_size,
+        approximate=approximate,
+        tokens_per_word=tokens_per_word,
+        characters_per_token=characters_per_token,
+        use_mmap=use_mmap,
+        decode_errors=decode_errors,
+        profile=profile,
+        max_tokens=max_tokens,
+        skip_binary=skip_binary,
+        max_file_size=max_file_size,
+        max_line_length=max_line_length,
+    )
 
-    for pattern in file_patterns:
-        glob_pattern: str = f"**/{pattern}" if recursive else pattern
+    # Digests of cached files whose size or mtime changed, compared with the
+    # file where it is counted
+    expected: dict[str, str] | None = None
+    if cache is not None:
+        from .cache import cache_params
 
-        for file_path in base_path.glob(glob_pattern):
-            try:
-                if use_streaming:
-                    results[str(file_path)] = count_tokens_in_large_file(
-                        str(file_path),
-                        encoding_name=encoding_name,
-                        chunk_size=chunk_size,
-                        approximate=approximate,
-                        tokens_per_word=tokens_per_word,
-                        characters_per_token=characters_per_token,
-                    )
-                else:
-                    results[str(file_path)] = count_tokens_in_file(
-                        str(file_path),
-                        encoding_name=encoding_name,
-                        approximate=approximate,
-                        tokens_per_word=tokens_per_word,
-                        characters_per_token=characters_per_token,
+        # Misses are hashed where they are counted, not in this process
+        count_file = functools.partial(_count_with_digest, count_file)
+        expected = {}
+        params = cache_params(
+            encoding=encoding_name,
+            approximate=approximate,
+            tokens_per_word=tokens_per_word,
+            characters_per_token=characters_per_token,
+            chunk_size=chunk_size if use_streaming else None,
+            decode_errors=decode_errors if use_streaming else None,
+            profile=profile if approximate in ("w", "c") else None,
+            # Only set when sniffing differs from the default, keeping the
+            # keys of earlier entries
+            **(
+                {"sniff": [skip_binary, max_file_size, max_line_length]}
+                if not skip_binary
+                or max_file_size is not None
+                or max_line_length is not None
+                else {}
+            ),
+        )
+
+    # Cached or recorded results not yielded yet, and files being counted
+    cached: list[tuple[str, int | dict | str]] = []
+    outstanding: dict[str, None] = {}
+    total = 0
+
+    if shard is not None:
+        from .shard import shard_of
+
+    def pending() -> Iterator[str]:
+        """Walk the directory, yielding the files that are not cached."""
+        nonlocal total
+        for position, file_path in enumerate(
+            walk_files(
+                directory_path, walk_patterns, recursive, exclude, use_ignore_files
+            )
+        ):
+            if shard is not None and shard[0] != shard_of(
+                os.path.relpath(file_path, directory_path), shard[1]
+            ):
+                continue
+            if positions is not None:
+                positions[file_path] = position
+            if max_total_tokens is not None and total > max_total_tokens:
+                # Cached files exceeded the limit: stop the walk
+                return
+            if found is not None:
+                found.append(file_path)
+            if checkpoint is not None and file_path in checkpoint.results:
+                tokens = checkpoint.results[file_path]
+            elif cache is not None:
+                tokens = cache.get(file_path, params, hash_changed=False)
+                digest = cache.stored_digest(file_path, params)
+                if digest is not None:
+                    expected[file_path] = digest
+            else:
+                tokens = None
+            if tokens is None:
+                outstanding[file_path] = None
+                yield file_path
+                continue
+            # An archive recorded in a checkpoint has a list of its members
+            members = tokens if isinstance(tokens, list) else [(file_path, tokens)]
+            for member_path, member_tokens in members:
+                cached.append((member_path, member_tokens))
+                total += result_tokens(member_tokens)
+
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    walk = pending()
+    if workers > 1:
+        results = _count_files_parallel(
+            walk, count_file, workers, encoding_name, approximate, expected
+        )
+    elif expected is not None:
+        results = (
+            (file_path, count_file(file_path, expected.pop(file_path, None)))
+            for file_path in walk
+        )
+    else:
+        results = ((file_path, count_file(file_path)) for file_path in walk)
+
+    with contextlib.closing(results):
+        for file_path, tokens in results:
+            # Cached files found while this one was pending come first
+            yield from cached
+            cached.clear()
+            del outstanding[file_path]
+            if cache is not None:
+                tokens, digest = tokens
+                if tokens is None:
+                    # Unchanged content: the cached count is still valid
+                    tokens, digest = cache.reuse(file_path, params), None
+            if checkpoint is not None:
+                checkpoint.record(file_path, tokens)
+            if (
+                cache is not None
+                and digest is not None
+                and (
+                    isinstance(tokens, int)
+                    or (
+                        isinstance(tokens, dict)
+                        and encoding_names is not None
+                        and all(isinstance(count, int) for count in tokens.values())
                     )
-            except Exception as e:
-                results[str(file_path)] = f"Error: {e!s}"
+                )
+            ):
+                cache.put(file_path, params, tokens, digest)
+            # An archive gives a list of its members and their results
+            members = tokens if isinstance(tokens, list) else [(file_path, tokens)]
+            for member_path, member_tokens in members:
+                total += result_tokens(member_tokens)
+                yield member_path, member_tokens
+            if max_total_tokens is not None and total > max_total_tokens:
+                break
+    # Stop the walk; files found but not counted are reported as skipped
+    walk.close()
+    yield from cached
+    for file_path in outstanding:
+        yield file_path, _SKIPPED_OVER_TOTAL
+
+
+def count_tokens_in_directory(
+    directory_path: str,
+    file_patterns: list[str] | None = None,
+    recursive: bool = False,
+    encoding_name: str | Sequence[str] = "cl100k_base",
+    use_streaming: bool = False,
+    chunk_size: int = 1024 * 1024,
+    approximate: str | None = None,
+    tokens_per_word: float = TOKENS_PER_WORD,
+    characters_per_token: float = CHARACTERS_PER_TOKEN,
+    workers: int = 1,
+    cache: "CountCache | None" = None,
+    use_mmap: bool = False,
+    decode_errors: str = "latin-1",
+    profile: dict | str | None = None,
+    max_tokens: int | None = None,
+    max_total_tokens: int | None = None,
+    exclude: Iterable[str] | None = None,
+    use_ignore_files: bool = True,
+    archives: bool = False,
+    skip_binary: bool = True,
+    max_file_size: int | None = None,
+    max_line_length: int | None = None,
+    shard: tuple[int, int] | None = None,
+    checkpoint: "Checkpoint | None" = None,
+) -> dict[str, int | dict | str]:
+    """Count tokens in multiple files matching patterns in a directory.
+
+    The directory is traversed once for all patterns (see ``walk.walk_files``)
+    and files are counted while the walk is still running. To get each result
+    as soon as it is ready instead, use :func:`iter_token_counts`.
+
+    With a list of encodings every file is read once and counted with each
+    encoding. The total of ``max_total_tokens`` then uses the largest count of
+    each file, and the calibration ``profile`` of the first encoding applies.
+
+    Args:
+        directory_path: Path to directory to scan
+        file_patterns: List of glob patterns to match files (default: ["*.txt", "*.py", "*.md"])
+        recursive: Whether to search subdirectories
+        encoding_name: The name of the encoding to use, or a list of names
+        use_streaming: Whether to use streaming for large files
+        chunk_size: Size of chunks to read in bytes (for streaming)
+        approximate: Approximate the number of tokens without tokenizing
+        tokens_per_word: The number of tokens per word for approximation
+        characters_per_token: The number of characters per token for approximation
+        workers: Number of worker processes (1: count in this process, 0: one per CPU)
+        cache: Persistent cache to reuse counts of unchanged files from earlier runs
+        use_mmap: Use the memory-mapped reader when streaming
+        decode_errors: Policy for chunks that are not valid utf-8 when streaming
+        profile: Calibration profile (or path of a profile file) with the
+            approximation ratios per file extension, see ``calibration.calibrate``
+        max_tokens: Stop counting a file once it exceeds this limit; its result
+            is then a dict with ``limit_exceeded`` and ``tokens_at_least``
+        max_total_tokens: Stop the scan once the total of all files exceeds
+            this limit; files found but not counted are reported as skipped
+        exclude: gitignore-style rules for paths to skip (default: VCS,
+            virtualenv and cache directories)
+        use_ignore_files: Whether to apply ``.gitignore`` files found in the tree
+        archives: Also count compressed files and the members of archives, see
+            :func:`iter_token_counts`
+        skip_binary: Skip files whose first few KB look binary; their result
+            is ``"Skipped: binary file"``
+        max_file_size: Skip files larger than this many bytes
+        max_line_length: Skip files with a line longer than this many bytes in
+            their first few KB, such as minified bundles
+        shard: Only count the files of shard ``i`` of ``n`` (``(i, n)``), see
+            :func:`iter_token_counts`
+        checkpoint: Log of an interrupted scan with the same parameters to
+            resume, see ``checkpoint.Checkpoint``; the results are those of an
+            uninterrupted scan
 
-    return results
+    Returns:
+        Dict mapping filenames to token counts, in the order files were found.
+        With several encodings, a dict of these keyed by encoding.
+    """
+    files: list[str] = []
+    counts = dict(
+        iter_token_counts(
+            directory_path,
+            file_patterns,
+            recursive,
+            encoding_name,
+            use_streaming=use_streaming,
+            chunk_size=chunk_size,
+            approximate=approximate,
+            tokens_per_word=tokens_per_word,
+            characters_per_token=characters_per_token,
+            workers=workers,
+            cache=cache,
+            use_mmap=use_mmap,
+            decode_errors=decode_errors,
+            profile=profile,
+            max_tokens=max_tokens,
+            max_total_tokens=max_total_tokens,
+            exclude=exclude,
+            use_ignore_files=use_ignore_files,
+            archives=archives,
+            skip_binary=skip_binary,
+            max_file_size=max_file_size,
+            max_line_length=max_line_length,
+            shard=shard,
+            checkpoint=checkpoint,
+            found=files,
+        )
+    )
+    if archives:
+        from .archives import MEMBER_SEPARATOR
+
+        # Members of an archive take its place, in archive order
+        position = {file_path: i for i, file_path in enumerate(files)}
+        results = dict(
+            sorted(
+                counts.items(),
+                key=lambda item: position.get(
+                    item[0], position.get(item[0].partition(MEMBER_SEPARATOR)[0])
+                ),
+            )
+        )
+    else:
+        results = {file_path: counts[file_path] for file_path in files}
+    if isinstance(encoding_name, str):
+        return results
+    return _by_encoding(results, list(encoding_name))
 
 
 # Simple API for common use cases
@@ -196,7 +1407,7 @@ def count(
     text: str | None = None,
     file: str | None = None,
     directory: str | None = None,
-    encoding: str = "cl100k_base",
+    encoding: str | Sequence[str] = "cl100k_base",
     file_patterns: list[str] | None = None,
     recursive: bool = False,
     use_streaming: bool = False,
@@ -205,6 +1416,23 @@ def count(
     tokens_per_word: float = TOKENS_PER_WORD,
     characters_per_token: float = CHARACTERS_PER_TOKEN,
     max_tokens: int | None = None,
+    texts: list[str] | None = None,
+    num_threads: int = 8,
+    workers: int = 1,
+    cache: "CountCache | None" = None,
+    use_mmap: bool = False,
+    decode_errors: str = "latin-1",
+    target_relative_error: float = 0.01,
+    seed: int | None = None,
+    profile: dict | str | None = None,
+    stop_at_limit: bool = False,
+    max_total_tokens: int | None = None,
+    exclude: Iterable[str] | None = None,
+    use_ignore_files: bool = True,
+    archives: bool = False,
+    skip_binary: bool = True,
+    max_file_size: int | None = None,
+    max_line_length: int | None = None,
 ):
     """Count tokens with a simplified API.
 
@@ -212,7 +1440,7 @@ def count(
         text: Text string to count (optional)
         file: File path to count (optional)
         directory: Directory path to count (optional)
-        encoding: Encoding to use
+        encoding: Encoding to use, or a list of encodings to count in one pass
         file_patterns: List of glob patterns when using directory mode (default: ["*.txt", "*.py", "*.md"])
         recursive: Whether to search subdirectories
         use_streaming: Whether to use streaming for large files
@@ -221,18 +1449,93 @@ def count(
         tokens_per_word: The number of tokens per word for approximation
         characters_per_token: The number of characters per token for approximation
         max_tokens: Optional maximum token limit to check against
+        texts: List of text strings to count in one batch (optional)
+        num_threads: Number of threads for batch encoding of ``texts``
+        workers: Number of worker processes for directory mode, or threads for a
+            streamed file (0: one per CPU)
+        cache: Persistent count cache for directory mode, or of chunk counts for
+            an incremental count of a file with ``use_streaming``
+        use_mmap: Use the memory-mapped reader when streaming
+        decode_errors: Policy for chunks that are not valid utf-8 when streaming
+        target_relative_error: Target relative error of the sampling estimate (``approximate="s"``)
+        seed: Seed for the sampling estimate, for reproducible results
+        profile: Calibration profile (or path of a profile file) with the
+            approximation ratios per file extension for ``approximate``
+        stop_at_limit: Stream files and stop counting each one as soon as it
+            exceeds ``max_tokens``
+        max_total_tokens: Stop a directory scan once the total exceeds this limit
+        exclude: gitignore-style rules for paths to skip in directory mode
+        use_ignore_files: Whether to apply ``.gitignore`` files in directory mode
+        archives: Also count compressed files and members of archives in
+            directory mode
+        skip_binary: Skip binary files in directory mode
+        max_file_size: Skip files larger than this many bytes in directory mode
+        max_line_length: Skip files with longer lines (minified or generated)
+            in directory mode
 
     Returns:
-        Token count or dictionary of counts for directory mode
+        Token count, list of counts for ``texts`` or dictionary of counts for
+        directory mode. With ``approximate="s"`` a file or directory gives one
+        estimate dict with a confidence interval (see ``estimate_tokens``).
+        With ``stop_at_limit``, a file over ``max_tokens`` gives
+        ``{"limit_exceeded": True, "tokens_at_least": ..., "max_tokens": ...}``.
+        With a list of encodings, a dict of these results keyed by encoding.
     """
+    limit = max_tokens if stop_at_limit else None
     if file_patterns is None:
         file_patterns: list[str] = ["*.txt", "*.py", "*.md"]
+    encodings = None if isinstance(encoding, str) else list(encoding)
     result = None
 
     if text is not None:
-        result: int = count_tokens_in_string(text, encoding)
+        if encodings is None:
+            result: int = count_tokens_in_string(text, encoding)
+        else:
+            result = _count_encodings(text, encodings)
+    elif texts is not None:
+        if encodings is None:
+            result = count_tokens_in_strings(texts, encoding, num_threads=num_threads)
+        else:
+            result = {
+                name: count_tokens_in_strings(texts, name, num_threads=num_threads)
+                for name in encodings
+            }
+    elif approximate == "s" and (file is not None or directory is not None):
+        if encodings is not None:
+            raise ValueError("Sampling estimates support a single encoding")
+        from .sampling import estimate_tokens
+        from .walk import DEFAULT_EXCLUDES, walk_files
+
+        if file is not None:
+            paths = [file]
+        else:
+            paths = list(
+                walk_files(
+                    directory,
+                    file_patterns,
+                    recursive,
+                    DEFAULT_EXCLUDES if exclude is None else exclude,
+                    use_ignore_files,
+                )
+            )
+        result = estimate_tokens(
+            paths,
+            encoding,
+            target_relative_error=target_relative_error,
+            seed=seed,
+            decode_errors=decode_errors,
+        )
+        if max_tokens is not None and result["tokens"] > max_tokens:
+            result.update(limit_exceeded=True, max_tokens=max_tokens)
+        return result
     elif file is not None:
-        if use_streaming:
+        tokens_per_word, characters_per_token = _profile_ratios(
+            _resolve_profile(profile, encoding if encodings is None else encodings[0]),
+            file,
+            tokens_per_word,
+            characters_per_token,
+        )
+        if use_streaming or limit is not None:
             result = count_tokens_in_large_file(
                 file,
                 encoding_name=encoding,
@@ -240,7 +1543,14 @@ def count(
                 approximate=approximate,
                 tokens_per_word=tokens_per_word,
                 characters_per_token=characters_per_token,
+                workers=workers,
+                use_mmap=use_mmap,
+                decode_errors=decode_errors,
+                max_tokens=limit,
+                cache=cache if approximate is None else None,
             )
+            if isinstance(result, dict) and encodings is None:
+                return result
         else:
             result = count_tokens_in_file(
                 file,
@@ -260,14 +1570,44 @@ def count(
             approximate=approximate,
             tokens_per_word=tokens_per_word,
             characters_per_token=characters_per_token,
+            workers=workers,
+            cache=cache,
+            use_mmap=use_mmap,
+            decode_errors=decode_errors,
+            profile=profile,
+            max_tokens=limit,
+            max_total_tokens=max_total_tokens,
+            exclude=exclude,
+            use_ignore_files=use_ignore_files,
+            archives=archives,
+            skip_binary=skip_binary,
+            max_file_size=max_file_size,
+            max_line_length=max_line_length,
         )
     else:
         raise ValueError("Either text, file, or directory must be provided")
 
-    # Check if result exceeds max_tokens if specified
+    if encodings is not None and text is None and file is None:
+        # Counts of texts or of a directory, one result per encoding
+        return {
+            name: _check_limit(counts, max_tokens) for name, counts in result.items()
+        }
+    return _check_limit(result, max_tokens)
+
+
+def _check_limit(result, max_tokens: int | None):
+    """Flag a count, or the counts in a list or dict, that exceed ``max_tokens``."""
     if max_tokens is not None:
         if isinstance(result, int) and result > max_tokens:
             return {"tokens": result, "limit_exceeded": True, "max_tokens": max_tokens}
+        elif isinstance(result, list):
+            # Replace counts over the limit with a limit_exceeded record
+            result = [
+                {"tokens": count, "limit_exceeded": True, "max_tokens": max_tokens}
+                if count > max_tokens
+                else count
+                for count in result
+            ]
         elif isinstance(result, dict):
             # Add limit_exceeded flag to each file that exceeds the limit
             for file_path, count in list(result.items()):
@@ -277,54 +1617,293 @@ def count(
                         "limit_exceeded": True,
                         "max_tokens": max_tokens,
                     }
-
     return result
 
 
-def _format_output(results, output_format="text"):
+def _to_json(results, output_format: str) -> str:
+    """Serialize results, indented for ``json`` and on a single line for ``ndjson``."""
+    return json.dumps(results, indent=2 if output_format == "json" else None)
+
+
+def _format_by_encoding(results: dict, output_format: str) -> str:
+    """Format the results of a count with several encodings, keyed by encoding."""
+    names = list(results)
+    if output_format in ("json", "ndjson"):
+        return _to_json(results, output_format)
+    per_file = all(
+        isinstance(counts, dict) and "max_tokens" not in counts
+        for counts in results.values()
+    )
+    if output_format == "csv":
+        output = io.StringIO(newline="")
+        writer: Writer = csv.writer(output, lineterminator="\n")
+        if per_file:
+            # One row per file, one column per encoding
+            writer.writerow(["file", *names])
+            for file_path in results[names[0]]:
+                writer.writerow(
+                    [
+                        file_path,
+                        *(
+                            _result_tokens(count) if isinstance(count, dict) else count
+                            for count in (results[name][file_path] for name in names)
+                        ),
+                    ]
+                )
+        else:
+            writer.writerow(names)
+            writer.writerow([_result_tokens(results[name]) for name in names])
+        return output.getvalue().rstrip("\n")
+    if per_file:
+        return "\n\n".join(
+            f"Encoding: {name}\n{_format_output(results[name])}" for name in names
+        )
+    lines = []
+    for name, count in results.items():
+        if isinstance(count, dict):
+            bound = "" if "tokens" in count else "at least "
+            lines.append(
+                f"{name}: {bound}{_result_tokens(count)} tokens "
+                f"⚠️ Token limit exceeded (> {count['max_tokens']})"
+            )
+        else:
+            lines.append(f"{name}: {count} tokens")
+    return "\n".join(lines)
+
+
+def _format_output(results, output_format="text", by_encoding=False):
     """Format output based on format type.
 
     Args:
         results: Results to format (int or dict)
-        output_format: Format type (text, json, csv)
+        output_format: Format type (text, json, ndjson, csv)
+        by_encoding: Whether the results are keyed by encoding (a count with
+            several encodings)
 
     Returns:
         Formatted output string
     """
-    if output_format == "json":
-        return json.dumps(results, indent=2)
+    if by_encoding:
+        return _format_by_encoding(results, output_format)
+    if output_format in ("json", "ndjson"):
+        return _to_json(results, output_format)
     elif output_format == "csv":
         if isinstance(results, dict):
             output = io.StringIO(newline="")
             writer: Writer = csv.writer(output, lineterminator="\n")
             writer.writerow(["file", "tokens"])
             for file_path, count in results.items():
+                if isinstance(count, dict):
+                    count = _result_tokens(count)
                 writer.writerow([file_path, count])
             return output.getvalue().rstrip("\n")
         return f"tokens\n{results}"
     else:  # text format (default)
         if isinstance(results, dict):
             output: list[str] = []
-            total = 0
+            total = files = 0
             for file_path, count in results.items():
                 if isinstance(count, int):
                     output.append(f"{file_path}: {count} tokens")
-                    total += count
+                elif isinstance(count, dict):
+                    bound = "" if "tokens" in count else "at least "
+                    output.append(
+                        f"{file_path}: {bound}{_result_tokens(count)} tokens "
+                        f"⚠️ Token limit exceeded (> {count['max_tokens']})"
+                    )
                 else:
                     output.append(f"{file_path}: {count}")
-            output.append(
-                f"\nTotal: {total} tokens across {len([c for c in results.values() if isinstance(c, int)])} files"
-            )
+                    continue
+                total += _result_tokens(count)
+                files += 1
+            output.append(f"\nTotal: {total} tokens across {files} files")
             return "\n".join(output)
         return str(results)
 
 
+def _format_estimate(estimate: dict, output_format: str = "text") -> str:
+    """Format a sampling estimate based on format type.
+
+    Args:
+        estimate: Estimate returned by ``estimate_tokens``
+        output_format: Format type (text, json, ndjson, csv)
+
+    Returns:
+        Formatted output string
+    """
+    if output_format in ("json", "ndjson"):
+        return _to_json(estimate, output_format)
+    elif output_format == "csv":
+        output = io.StringIO(newline="")
+        writer: Writer = csv.writer(output, lineterminator="\n")
+        writer.writerow(estimate.keys())
+        writer.writerow(estimate.values())
+        return output.getvalue().rstrip("\n")
+    return (
+        f"Estimated tokens: {estimate['tokens']} "
+        f"({estimate['confidence']:.0%} CI: {estimate['ci_low']}-{estimate['ci_high']}, "
+        f"±{estimate['relative_error']:.1%}, "
+        f"{estimate['samples']} of {estimate['segments']} segments sampled)"
+    )
+
+
+def _record(file_path: str, result) -> dict:
+    """Return the NDJSON record of one file's result."""
+    if isinstance(result, str):
+        if result.startswith("Skipped: "):
+            return {"file": file_path, "skipped": result.removeprefix("Skipped: ")}
+        return {"file": file_path, "error": result.removeprefix("Error: ")}
+    if isinstance(result, dict) and "max_tokens" in result:
+        return {"file": file_path, **result}
+    return {"file": file_path, "tokens": result}
+
+
+def _write_records(
+    records: Iterable[tuple[str, int | dict | str]],
+    encoding_names: list[str] | None = None,
+    max_tokens: int | None = None,
+    file=None,
+    scan: dict | None = None,
+    output_format: str = "ndjson",
+) -> dict:
+    """Write per-file results as NDJSON records or CSV rows as they arrive.
+
+    Each file is written and flushed as soon as its result is yielded, so
+    nothing is held per file. A summary comes last: a ``{"summary": ...}``
+    record in NDJSON, a row with an empty file name and the totals in CSV.
+
+    Args:
+        records: File paths and results, as yielded by ``iter_token_counts``
+        encoding_names: The encodings, if results are keyed by encoding
+        max_tokens: Flag counts that exceed this limit
+        file: Output stream (default: stdout)
+        scan: State of the scan set by ``_track_scan`` while the records are
+            written, if ``max_total_tokens`` applies
+        output_format: ``ndjson`` or ``csv``
+
+    Returns:
+        The summary: number of ``files`` counted, total ``tokens`` (a dict by
+        encoding with several encodings), and numbers of ``errors`` and
+        ``skipped`` files; with ``scan``, whether the total limit stopped the
+        scan (``scan_stopped``), leaving files of the tree unreported
+    """
+    file = file or sys.stdout
+    totals = dict.fromkeys(encoding_names or ["tokens"], 0)
+    summary = {"files": 0, "tokens": 0, "errors": 0, "skipped": 0}
+    writer: Writer = csv.writer(file, lineterminator="\n")
+    if output_format == "csv":
+        writer.writerow(["file", *totals])
+    for file_path, result in records:
+        if isinstance(result, str):
+            summary["skipped" if result.startswith("Skipped: ") else "errors"] += 1
+            row = [result] * len(totals)
+        else:
+            counts = result if encoding_names else {"tokens": result}
+            counts = {
+                name: _check_limit(count, max_tokens)
+                if isinstance(count, int)
+                else count
+                for name, count in counts.items()
+            }
+            for name, count in counts.items():
+                totals[name] += _result_tokens(count)
+            summary["files"] += 1
+            result = counts if encoding_names else counts["tokens"]
+            row = [_result_tokens(count) for count in counts.values()]
+        if output_format == "csv":
+            writer.writerow([file_path, *row])
+        else:
+            file.write(json.dumps(_record(file_path, result)) + "\n")
+        file.flush()
+    summary["tokens"] = totals if encoding_names else totals["tokens"]
+    if scan is not None:
+        summary["scan_stopped"] = scan["stopped"]
+    if output_format == "csv":
+        writer.writerow(["", *totals.values()])
+    else:
+        file.write(json.dumps({"summary": summary}) + "\n")
+    file.flush()
+    return summary
+
+
+def _track_scan(
+    records: Iterable[tuple[str, int | dict | str]],
+    scan: dict,
+    max_total_tokens: int | None,
+) -> Iterator[tuple[str, int | dict | str]]:
+    """Pass results through, setting ``scan["stopped"]`` once their total
+    exceeds ``max_total_tokens``, where ``iter_token_counts`` stops the walk."""
+    total = 0
+    scan["stopped"] = False
+    for file_path, result in records:
+        total += _largest_result_tokens(result)
+        if max_total_tokens is not None and total > max_total_tokens:
+            scan["stopped"] = True
+        yield file_path, result
+
+
+def _count_with_server(args: Namespace, **request):
+    """Count with the daemon given by ``--server-address``.
+
+    Paths are sent as absolute paths, and the files of a directory result are
+    mapped back to paths under the directory as given on the command line.
+
+    Returns:
+        The result, or None if no daemon is running
+
+    Exits with an ``Error:`` message if the daemon rejects the request.
+    """
+    from .server import ServerError, request_count
+
+    for key in ("file", "directory", "profile"):
+        if request.get(key) is not None:
+            request[key] = os.path.abspath(request[key])
+    try:
+        result = request_count(args.server_address, **request)
+    except ServerError as e:
+        # Only the first line, without the details of the daemon's error
+        message = str(e).partition("\n")[0]
+        sys.exit(f"Error: {message}")
+    if result is None or "directory" not in request:
+        return result
+    base = str(pathlib.Path(args.directory))
+
+    def local_paths(results: dict) -> dict:
+        relative = {
+            os.path.relpath(file_path, request["directory"]): tokens
+            for file_path, tokens in results.items()
+        }
+        return {
+            (path if base == "." else os.path.join(base, path)): tokens
+            for path, tokens in relative.items()
+        }
+
+    if isinstance(request.get("encoding"), list):
+        return {name: local_paths(counts) for name, counts in result.items()}
+    return local_paths(result)
+
+
 def main() -> None:
     """Run the command line interface.
 
+    ``count-tokens serve`` runs the counting daemon (see ``count_tokens.server``),
+    and ``count-tokens merge`` merges the partial results of shards (see
+    ``count_tokens.shard``).
+
     Returns:
         None
     """
+    if sys.argv[1:2] == ["serve"]:
+        from .server import main as serve
+
+        serve(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["merge"]:
+        from .shard import main as merge
+
+        merge(sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(
         description="Count the number of tokens in text files."
     )
@@ -338,13 +1917,13 @@ def main() -> None:
         "-e",
         "--encoding",
         default="cl100k_base",
-        help="Encoding to use (default: cl100k_base)",
+        help="Encoding to use, or several comma-separated encodings counted in one pass (default: cl100k_base)",
     )
     parser.add_argument(
         "-a",
         "--approx",
         default=None,
-        help="Approximate the number of tokens without tokenizing. Base on: w - words, c - characters",
+        help="Approximate the number of tokens without tokenizing all of the text. Base on: w - words, c - characters, s - sampling",
     )
 
     # Directory processing options
@@ -360,19 +1939,103 @@ def main() -> None:
         default="*.txt",
         help="File pattern when using directory mode (comma-separated)",
     )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        default=[],
+        help="gitignore-style pattern of paths to skip in directory mode (comma-separated, repeatable)",
+    )
+    parser.add_argument(
+        "--no-ignore",
+        action="store_true",
+        help="Do not apply .gitignore files or skip VCS, virtualenv and cache directories",
+    )
+    parser.add_argument(
+        "--archives",
+        action="store_true",
+        help="Also count compressed files (.gz, .bz2, .xz, .zst) and the members of "
+        "tar and zip archives in directory mode",
+    )
+    parser.add_argument(
+        "--include-binary",
+        action="store_true",
+        help="Count files that look binary instead of skipping them in directory mode",
+    )
+    parser.add_argument(
+        "--max-file-size",
+        type=int,
+        metavar="BYTES",
+        help="Skip files larger than BYTES in directory mode",
+    )
+    parser.add_argument(
+        "--max-line-length",
+        type=int,
+        metavar="BYTES",
+        help="Skip files with a line longer than BYTES in their first KB, such as "
+        "minified or generated files, in directory mode",
+    )
+    parser.add_argument(
+        "--shard",
+        metavar="I/N",
+        help="Count only shard I of N of the directory's files and write a partial "
+        "result file; combine the partials with 'count-tokens merge'",
+    )
+    parser.add_argument(
+        "--partial",
+        metavar="PATH",
+        help="Partial result file of --shard (.gz to compress, "
+        "default: shard-I-of-N.ndjson)",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        metavar="PATH",
+        help="Record counted files in the log PATH every few seconds in directory "
+        "mode, and resume a killed scan from it",
+    )
+
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes for directory mode, or threads with --stream (0: one per CPU)",
+    )
+
+    parser.add_argument(
+        "--cache",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Reuse counts of unchanged files from a persistent on-disk cache in directory mode, or of unchanged chunks of a file with --stream",
+    )
+    parser.add_argument(
+        "--cache-path",
+        help="Path of the cache database (default: ~/.cache/count_tokens/counts.sqlite3)",
+    )
 
     # Output format options
     parser.add_argument(
         "--format",
-        choices=["text", "json", "csv"],
+        choices=["text", "json", "ndjson", "csv", "csv-stream"],
         default="text",
-        help="Output format",
+        help="Output format (ndjson and csv-stream write each file of a directory "
+        "as soon as it is counted)",
     )
 
     # Large file handling
     parser.add_argument(
         "--stream", action="store_true", help="Use streaming mode for large files"
     )
+    parser.add_argument(
+        "--mmap",
+        action="store_true",
+        help="Read files through a memory-mapped, byte-level reader in streaming mode",
+    )
+    parser.add_argument(
+        "--decode-errors",
+        choices=DECODE_ERRORS,
+        default="latin-1",
+        help="How to decode chunks that are not valid utf-8 in streaming mode (default: latin-1)",
+    )
     parser.add_argument(
         "--chunk-size",
         type=int,
@@ -384,6 +2047,16 @@ def main() -> None:
     parser.add_argument(
         "--max-tokens", type=int, help="Check if tokens exceed this limit"
     )
+    parser.add_argument(
+        "--stop-at-limit",
+        action="store_true",
+        help="Stream files and stop counting each one as soon as it exceeds --max-tokens",
+    )
+    parser.add_argument(
+        "--max-total-tokens",
+        type=int,
+        help="Stop a directory scan once the total exceeds this limit",
+    )
 
     # Approximation options
     parser.add_argument(
@@ -399,10 +2072,106 @@ def main() -> None:
         help=f"Number of characters per token for character-based approximation (default: {CHARACTERS_PER_TOKEN})",
     )
 
+    # Sampling options
+    parser.add_argument(
+        "--target-error",
+        type=float,
+        default=0.01,
+        help="Target relative error of the sampling estimate (default: 0.01)",
+    )
+    parser.add_argument(
+        "--seed", type=int, help="Random seed for a reproducible sampling estimate"
+    )
+
+    # Calibration options
+    parser.add_argument(
+        "--calibrate",
+        metavar="PROFILE",
+        help="Fit approximation ratios per file extension on a sample of the directory and save them to PROFILE",
+    )
+    parser.add_argument(
+        "--profile",
+        help="Apply the approximation ratios per file extension from a calibration profile",
+    )
+    parser.add_argument(
+        "--sample-files",
+        type=int,
+        default=200,
+        help="Maximum number of files tokenized per extension when calibrating (default: 200)",
+    )
+
+    # Splitting
+    parser.add_argument(
+        "--split",
+        type=int,
+        metavar="N",
+        help="Split the file into chunks of at most N tokens and print them as JSONL",
+    )
+    parser.add_argument(
+        "--overlap",
+        type=int,
+        default=0,
+        help="Number of tokens shared by consecutive chunks with --split (default: 0)",
+    )
+
+    # Datasets
+    parser.add_argument(
+        "--fields",
+        help="Count the records of a JSONL, CSV or Parquet file, tokenizing only "
+        "these comma-separated field paths (e.g. text,messages[].content)",
+    )
+    parser.add_argument(
+        "--record-counts",
+        metavar="PATH",
+        help="With --fields, write the per-record counts to PATH as little-endian "
+        "uint32",
+    )
+
+    # Distribution statistics
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print percentiles, a histogram and the largest files (or records "
+        "with --fields) instead of per-file counts",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=100,
+        help="Number of largest files or records listed by --stats (default: 100)",
+    )
+
+    # Watch mode
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep counting the directory and report changed files until interrupted (json: NDJSON events)",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=0.2,
+        help="Seconds without changes before --watch recounts (default: 0.2)",
+    )
+
+    # Counting daemon
+    parser.add_argument(
+        "--server",
+        action="store_true",
+        help="Count with a running 'count-tokens serve' daemon, in this process if none is running",
+    )
+    parser.add_argument(
+        "--server-address",
+        help="Unix socket path or host:port of the daemon (default: per-user socket)",
+    )
+
     args: Namespace = parser.parse_args()
 
     # Common parameters
     encoding_name = args.encoding
+    if "," in encoding_name:
+        encoding_name = [e.strip() for e in encoding_name.split(",") if e.strip()]
+    by_encoding = isinstance(encoding_name, list)
     approximate = args.approx
     tokens_per_word = args.tokens_per_word
     characters_per_token = args.characters_per_token
@@ -410,44 +2179,482 @@ def main() -> None:
     use_streaming = args.stream
     chunk_size = args.chunk_size
 
+    file_patterns = [p.strip() for p in args.pattern.split(",")]
+    exclude = [p.strip() for value in args.exclude for p in value.split(",")]
+    if not args.no_ignore:
+        from .walk import DEFAULT_EXCLUDES
+
+        exclude = [*DEFAULT_EXCLUDES, *exclude]
+    use_ignore_files = not args.no_ignore
+
+    if by_encoding and (
+        args.calibrate
+        or args.watch
+        or args.split is not None
+        or args.fields
+        or args.stats
+        or approximate == "s"
+    ):
+        parser.error(
+            "several encodings cannot be used with --calibrate, --watch, --split, "
+            "--fields, --stats or sampling"
+        )
+    if args.stats and not (args.directory or args.fields):
+        parser.error("--stats requires -d/--directory or --fields")
+    if output_format == "csv-stream" and (not args.directory or args.stats):
+        parser.error("--format csv-stream requires -d/--directory, without --stats")
+    shard = None
+    if args.shard:
+        if not args.directory or args.watch or args.calibrate or approximate == "s":
+            parser.error("--shard requires -d/--directory and exact or ratio counts")
+        if args.max_total_tokens is not None or args.stats or args.server:
+            parser.error(
+                "--shard cannot be used with --max-total-tokens, --stats or --server; "
+                "use --stats with 'count-tokens merge'"
+            )
+        from .shard import parse_shard
+
+        try:
+            shard = parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+
     # Determine operation mode and get results
     results = None
 
-    # Directory mode
-    if args.directory:
-        patterns = args.pattern.split(",")
-        results = count_tokens_in_directory(
-            directory_path=args.directory,
-            file_patterns=[p.strip() for p in patterns],
-            recursive=args.recursive,
-            encoding_name=encoding_name,
+    # Calibration of the approximation ratios
+    if args.calibrate:
+        if not args.directory:
+            parser.error("--calibrate requires -d/--directory")
+        from .calibration import calibrate, format_calibration, save_profile
+
+        calibration = calibrate(
+            args.directory,
+            file_patterns,
+            args.recursive,
+            encoding_name,
+            sample_files=args.sample_files,
+            seed=args.seed,
+            exclude=exclude,
+            use_ignore_files=use_ignore_files,
+        )
+        save_profile(calibration, args.calibrate, encoding_name)
+        if output_format in ("json", "ndjson"):
+            print(_to_json(calibration, output_format))
+        elif not args.quiet:
+            print(format_calibration(calibration))
+        return
+    profile = _resolve_profile(
+        args.profile, encoding_name[0] if by_encoding else encoding_name
+    )
+    limit = args.max_tokens if args.stop_at_limit else None
+
+    # Sampling estimate of a file or of a whole directory
+    if approximate == "s" and (args.directory or args.file):
+        from .sampling import estimate_tokens
+        from .walk import walk_files
+
+        if args.directory:
+            paths = list(
+                walk_files(
+                    args.directory,
+                    file_patterns,
+                    args.recursive,
+                    exclude,
+                    use_ignore_files,
+                )
+            )
+        else:
+            paths = [args.file]
+        estimate = estimate_tokens(
+            paths,
+            encoding_name,
+            target_relative_error=args.target_error,
+            seed=args.seed,
+            decode_errors=args.decode_errors,
+        )
+        if args.quiet:
+            print(estimate["tokens"])
+        else:
+            print(_format_estimate(estimate, output_format))
+        return
+
+    if args.file and not _is_plain(args.file):
+        from .archives import MEMBER_SEPARATOR, is_archive
+
+        if is_archive(args.file) and MEMBER_SEPARATOR not in args.file:
+            parser.error(
+                f"{args.file} is an archive: count its directory with --archives, "
+                f"or a member as {args.file}{MEMBER_SEPARATOR}<member>"
+            )
+
+    # Split a file into chunks of at most N tokens
+    if args.split is not None:
+        if not args.file:
+            parser.error("--split requires a file")
+        from .split import split_file
+
+        chunks = split_file(
+            args.file,
+            args.split,
+            encoding_name,
+            overlap=args.overlap,
+            chunk_size=chunk_size,
+            decode_errors="strict" if args.decode_errors == "strict" else "replace",
+        )
+        try:
+            for chunk in chunks:
+                print(json.dumps(chunk, ensure_ascii=False))
+        except ValueError as e:
+            parser.error(str(e))
+        return
+
+    # Per-record counts of a dataset
+    if args.fields:
+        if not args.file:
+            parser.error("--fields requires a file")
+        if approximate is not None:
+            parser.error("--fields counts tokens exactly and cannot be approximated")
+        from .datasets import iter_record_counts, write_record_counts
+
+        counts = iter_record_counts(
+            args.file,
+            [f.strip() for f in args.fields.split(",") if f.strip()],
+            encoding_name,
+            workers=args.jobs,
+        )
+        stats = None
+        if args.stats:
+            from .stats import TokenStats
+
+            stats = TokenStats(args.top)
+            counts = stats.track(counts)
+        with contextlib.ExitStack() as stack:
+            binary_file = (
+                stack.enter_context(open(args.record_counts, "wb"))
+                if args.record_counts
+                else None
+            )
+            try:
+                summary = write_record_counts(
+                    counts,
+                    "text" if args.quiet or stats else output_format,
+                    binary_file=binary_file,
+                )
+            except ValueError as e:
+                parser.error(str(e))
+        if args.quiet:
+            print(summary["tokens"])
+        elif stats is not None:
+            from .stats import format_stats
+
+            print(format_stats(stats, output_format, "records"))
+        elif output_format == "json":
+            print(json.dumps({"file": args.file, **summary}, indent=2))
+        elif output_format == "text":
+            print(f"File: {args.file}")
+            print(f"Encoding: {encoding_name}")
+            print(f"Records: {summary['records']}")
+            print(f"Number of tokens: {summary['tokens']}")
+        return
+
+    # Watch a directory
+    if args.watch:
+        if not args.directory:
+            parser.error("--watch requires -d/--directory")
+        if output_format == "csv":
+            parser.error("--watch supports text and json output")
+        from .watch import print_events, watch
+
+        events = watch(
+            args.directory,
+            file_patterns,
+            args.recursive,
+            encoding_name,
             use_streaming=use_streaming,
             chunk_size=chunk_size,
             approximate=approximate,
             tokens_per_word=tokens_per_word,
             characters_per_token=characters_per_token,
+            decode_errors=args.decode_errors,
+            profile=profile,
+            workers=args.jobs,
+            exclude=exclude,
+            use_ignore_files=use_ignore_files,
+            debounce=args.debounce,
         )
+        with contextlib.suppress(KeyboardInterrupt):
+            print_events(events, output_format)
+        return
+
+    # Directory mode
+    if args.directory:
+        from .cache import CountCache
+
+        cache = CountCache(args.cache_path) if args.cache else None
+        # Write each file as soon as it is counted instead of all at the end,
+        # or only add it to the statistics
+        stream = (
+            output_format in ("ndjson", "csv-stream") or args.stats
+        ) and not args.quiet
+        results = stats = None
+        if args.server and cache is None and not args.checkpoint:
+            results = _count_with_server(
+                args,
+                directory=args.directory,
+                encoding=encoding_name,
+                file_patterns=file_patterns,
+                recursive=args.recursive,
+                use_streaming=use_streaming,
+                chunk_size=chunk_size,
+                approximate=approximate,
+                tokens_per_word=tokens_per_word,
+                characters_per_token=characters_per_token,
+                decode_errors=args.decode_errors,
+                profile=args.profile,
+                max_tokens=limit,
+                stop_at_limit=limit is not None,
+                max_total_tokens=args.max_total_tokens,
+                exclude=exclude,
+                use_ignore_files=use_ignore_files,
+                archives=args.archives,
+                skip_binary=not args.include_binary,
+                max_file_size=args.max_file_size,
+                max_line_length=args.max_line_length,
+            )
+        options = {
+            "file_patterns": file_patterns,
+            "recursive": args.recursive,
+            "encoding_name": encoding_name,
+            "use_streaming": use_streaming,
+            "chunk_size": chunk_size,
+            "approximate": approximate,
+            "tokens_per_word": tokens_per_word,
+            "characters_per_token": characters_per_token,
+            "workers": args.jobs,
+            "cache": cache,
+            "use_mmap": args.mmap,
+            "decode_errors": args.decode_errors,
+            "profile": profile,
+            "max_tokens": limit,
+            "max_total_tokens": args.max_total_tokens,
+            "exclude": exclude,
+            "use_ignore_files": use_ignore_files,
+            "archives": args.archives,
+            "skip_binary": not args.include_binary,
+            "max_file_size": args.max_file_size,
+            "max_line_length": args.max_line_length,
+        }
+        checkpoint = None
+        if args.checkpoint:
+            from .checkpoint import Checkpoint
+
+            params = {
+                name: value
+                for name, value in options.items()
+                if name not in _RUN_OPTIONS
+            }
+            if shard is not None:
+                params["shard"] = list(shard)
+            try:
+                checkpoint = Checkpoint(args.checkpoint, args.directory, params)
+            except ValueError as e:
+                parser.error(str(e))
+            options["checkpoint"] = checkpoint
+            if checkpoint.resumed and not args.quiet:
+                print(
+                    f"Checkpoint: resuming with {checkpoint.resumed} files counted",
+                    file=sys.stderr,
+                )
+        if shard is not None:
+            from .shard import write_partial
+
+            partial = args.partial or f"shard-{shard[0]}-of-{shard[1]}.ndjson"
+            try:
+                summary = write_partial(partial, args.directory, shard, **options)
+            finally:
+                if cache is not None:
+                    cache.close()
+                if checkpoint is not None:
+                    checkpoint.close()
+            if args.quiet:
+                print(summary["tokens"])
+            elif output_format in ("json", "ndjson"):
+                print(_to_json({"partial": partial, **summary}, output_format))
+            else:
+                print(
+                    f"Shard {shard[0]}/{shard[1]}: {summary['files']} files, "
+                    f"{summary['tokens']} tokens written to {partial}"
+                )
+            return
+        try:
+            if stream:
+                if results is None:
+                    records = iter_token_counts(args.directory, **options)
+                elif by_encoding:
+                    records = _by_file(results, encoding_name).items()
+                else:
+                    records = results.items()
+                scan = {}
+                records = _track_scan(records, scan, args.max_total_tokens)
+                if args.stats:
+                    from .stats import TokenStats
+
+                    stats = TokenStats(args.top)
+                    for path, result in records:
+                        stats.add_result(path, result)
+                else:
+                    _write_records(
+                        records,
+                        encoding_name if by_encoding else None,
+                        args.max_tokens,
+                        scan=scan if args.max_total_tokens is not None else None,
+                        output_format=output_format.removesuffix("-stream"),
+                    )
+            elif results is None:
+                results = count_tokens_in_directory(args.directory, **options)
+        finally:
+            if cache is not None:
+                cache.close()
+            if checkpoint is not None:
+                checkpoint.close()
+        if cache is not None and not args.quiet:
+            print(f"Cache: {cache.hits} hits, {cache.misses} misses", file=sys.stderr)
+        if not stream:
+            records = _by_file(results, encoding_name) if by_encoding else results
+            total = sum(map(_largest_result_tokens, records.values()))
+            scan = {
+                "stopped": args.max_total_tokens is not None
+                and total > args.max_total_tokens
+            }
+            if by_encoding:
+                results = {
+                    name: _check_limit(counts, args.max_tokens)
+                    for name, counts in results.items()
+                }
+            else:
+                results = _check_limit(results, args.max_tokens)
+        if scan["stopped"] and not args.quiet:
+            print(
+                f"Warning: stopped after the total exceeded {args.max_total_tokens} tokens",
+                file=sys.stderr,
+            )
+        if stats is not None:
+            from .stats import format_stats
+
+            print(format_stats(stats, output_format))
+        if stream:
+            return
+    # Single file with several encodings
+    elif args.file and by_encoding:
+        results = None
+        if args.server:
+            results = _count_with_server(
+                args,
+                file=args.file,
+                encoding=encoding_name,
+                use_streaming=use_streaming,
+                chunk_size=chunk_size,
+                approximate=approximate,
+                tokens_per_word=tokens_per_word,
+                characters_per_token=characters_per_token,
+                max_tokens=args.max_tokens,
+                decode_errors=args.decode_errors,
+                profile=args.profile,
+                stop_at_limit=args.stop_at_limit,
+            )
+        if results is None:
+            results = count(
+                file=args.file,
+                encoding=encoding_name,
+                use_streaming=use_streaming,
+                chunk_size=chunk_size,
+                approximate=approximate,
+                tokens_per_word=tokens_per_word,
+                characters_per_token=characters_per_token,
+                max_tokens=args.max_tokens,
+                use_mmap=args.mmap,
+                decode_errors=args.decode_errors,
+                profile=profile,
+                stop_at_limit=args.stop_at_limit,
+            )
+        if not args.quiet and output_format == "text":
+            print(f"File: {args.file}")
     # Single file mode
     elif args.file:
         file_path = args.file
-        if use_streaming:
-            num_tokens: int = count_tokens_in_large_file(
-                file_path=file_path,
-                encoding_name=encoding_name,
+        tokens_per_word, characters_per_token = _profile_ratios(
+            profile, file_path, tokens_per_word, characters_per_token
+        )
+        at_least = False
+        counts = None
+        if args.server and not (args.cache and use_streaming):
+            counts = _count_with_server(
+                args,
+                file=file_path,
+                encoding=encoding_name,
+                use_streaming=use_streaming,
                 chunk_size=chunk_size,
                 approximate=approximate,
                 tokens_per_word=tokens_per_word,
                 characters_per_token=characters_per_token,
+                decode_errors=args.decode_errors,
+                max_tokens=limit,
+                stop_at_limit=limit is not None,
             )
-        else:
-            num_tokens = count_tokens_in_file(
+        if counts is None and (use_streaming or limit is not None):
+            from .cache import CountCache
+
+            cache = (
+                CountCache(args.cache_path)
+                if args.cache and use_streaming and approximate is None
+                else None
+            )
+            try:
+                counts = count_tokens_in_large_file(
+                    file_path=file_path,
+                    encoding_name=encoding_name,
+                    chunk_size=chunk_size,
+                    approximate=approximate,
+                    tokens_per_word=tokens_per_word,
+                    characters_per_token=characters_per_token,
+                    workers=args.jobs,
+                    use_mmap=args.mmap,
+                    decode_errors=args.decode_errors,
+                    details=approximate is None,
+                    max_tokens=limit,
+                    cache=cache,
+                )
+            finally:
+                if cache is not None:
+                    cache.close()
+            if cache is not None and not args.quiet:
+                print(
+                    f"Cache: {counts['cached_chunks']} of {counts['chunks']} "
+                    "chunks reused",
+                    file=sys.stderr,
+                )
+        elif counts is None:
+            counts = count_tokens_in_file(
                 file_path=file_path,
                 encoding_name=encoding_name,
                 approximate=approximate,
                 tokens_per_word=tokens_per_word,
                 characters_per_token=characters_per_token,
             )
+        if isinstance(counts, dict):
+            if counts.get("fallback_chunks") and not args.quiet:
+                print(
+                    f"Warning: {counts['fallback_chunks']} of {counts['chunks']} "
+                    f"chunks were not valid utf-8 (decoded with {args.decode_errors})",
+                    file=sys.stderr,
+                )
+            at_least = "tokens_at_least" in counts
+            counts = _result_tokens(counts)
+        num_tokens: int = counts
 
+        exceeded = args.max_tokens is not None and num_tokens > args.max_tokens
+        bound = "at least " if at_least else ""
         if not args.quiet and output_format == "text":
             print(f"File: {file_path}")
             print(f"Encoding: {encoding_name}")
@@ -459,24 +2666,39 @@ def main() -> None:
                 print(
                     f"Approximation method: Characters (characters per token: {characters_per_token})"
                 )
-            print(f"Number of tokens: {num_tokens}")
+            if exceeded:
+                print(
+                    f"⚠️ Token limit exceeded: {bound}{num_tokens} > {args.max_tokens}"
+                )
+            print(f"Number of tokens: {bound}{num_tokens}")
             return
         results: int = num_tokens
+        if exceeded and output_format in ("json", "ndjson") and not args.quiet:
+            results = (
+                _limit_exceeded(num_tokens, args.max_tokens)
+                if at_least
+                else _check_limit(num_tokens, args.max_tokens)
+            )
     else:
         parser.print_help()
         return
 
     # Print results according to format
-    if args.quiet:
+    if args.quiet and by_encoding:
+        # One total per encoding, in the order given
+        for counts in results.values():
+            if isinstance(counts, dict) and "max_tokens" not in counts:
+                print(sum(_result_tokens(count) for count in counts.values()))
+            else:
+                print(_result_tokens(counts))
+    elif args.quiet:
         if isinstance(results, dict):
-            total: int = sum(
-                count for count in results.values() if isinstance(count, int)
-            )
+            total: int = sum(_result_tokens(count) for count in results.values())
             print(total)
         else:
             print(results)
     else:
-        print(_format_output(results, output_format))
+        print(_format_output(results, output_format, by_encoding))
 
 
 if __name__ == "__main__":
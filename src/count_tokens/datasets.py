@@ -0,0 +1,325 @@
+"""Count tokens per record of JSONL, CSV and Parquet datasets.
+
+Only the values at the configured field paths are tokenized, not the keys,
+quotes and escapes of the serialized records. A field path names nested keys
+with ``.`` and steps into every item of a list with ``[]``, so
+``messages[].content`` takes the content of each message of a chat record.
+
+Records are read in batches and the values of a batch are tokenized with one
+batch encoder call. Uncompressed JSONL files can also be split into
+newline-aligned byte ranges that are parsed and tokenized on worker processes.
+"""
+
+import concurrent.futures
+import csv
+import functools
+import io
+import itertools
+import json
+import sys
+from array import array
+from collections.abc import Iterable, Iterator
+
+from .count import (
+    _chunk_ranges,
+    _init_worker,
+    _is_plain,
+    _open_binary,
+    _read_chunk_to_boundary,
+    count_tokens_in_strings,
+)
+
+DATASET_FORMATS = ("jsonl", "csv", "parquet")
+# Fields of common fine-tuning datasets: plain text and chat messages
+DEFAULT_FIELDS = ("text", "messages[].content")
+# Number of CSV or Parquet records tokenized in one batch
+BATCH_RECORDS = 1024
+# Size of the blocks of lines of a JSONL file parsed at a time in this process,
+# and of the byte ranges counted by one worker task
+_JSONL_BLOCK = 1024 * 1024
+_RANGE_SIZE = 4 * 1024 * 1024
+
+_SUFFIXES = {
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".csv": "csv",
+    ".parquet": "parquet",
+}
+
+
+def parse_field(field: str) -> tuple[str | None, ...]:
+    """Parse a field path into its steps: keys, and None for each ``[]``.
+
+    Raises:
+        ValueError: If the path or one of its keys is empty
+    """
+    steps: list[str | None] = []
+    for part in field.split("."):
+        key, lists = part, 0
+        while key.endswith("[]"):
+            key, lists = key[:-2], lists + 1
+        if not key and not lists:
+            raise ValueError(f"Invalid field path: {field!r}")
+        if key:
+            steps.append(key)
+        steps.extend([None] * lists)
+    return tuple(steps)
+
+
+def _values(value, steps: tuple[str | None, ...]) -> Iterator[str]:
+    """Yield the values at a parsed field path; non-string values as JSON."""
+    if not steps:
+        if isinstance(value, str):
+            yield value
+        elif value is not None:
+            yield json.dumps(value, ensure_ascii=False)
+        return
+    step, rest = steps[0], steps[1:]
+    if step is None:
+        if isinstance(value, list):
+            for item in value:
+                yield from _values(item, rest)
+    elif isinstance(value, dict) and step in value:
+        yield from _values(value[step], rest)
+
+
+def dataset_format(file_path: str) -> str:
+    """Return the format of a dataset from its suffix, ignoring compression.
+
+    Raises:
+        ValueError: If the suffix is not a known dataset format
+    """
+    name = file_path.lower()
+    for compression in (".gz", ".bz2", ".xz", ".zst"):
+        name = name.removesuffix(compression)
+    for suffix, file_format in _SUFFIXES.items():
+        if name.endswith(suffix):
+            return file_format
+    raise ValueError(
+        f"Unknown dataset format of {file_path}; "
+        f"use one of {', '.join(DATASET_FORMATS)}"
+    )
+
+
+def _count_records(
+    records: list, fields: list[tuple], encoding_name: str, num_threads: int
+) -> array:
+    """Return the number of tokens in the field values of each record."""
+    texts: list[str] = []
+    owners: list[int] = []
+    for index, record in enumerate(records):
+        for steps in fields:
+            for text in _values(record, steps):
+                texts.append(text)
+                owners.append(index)
+    counts = array("I", bytes(4 * len(records)))
+    for owner, tokens in zip(
+        owners, count_tokens_in_strings(texts, encoding_name, num_threads), strict=True
+    ):
+        counts[owner] += tokens
+    return counts
+
+
+def _parse_lines(block: bytes) -> list:
+    try:
+        return [json.loads(line) for line in block.splitlines() if line.strip()]
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON record: {e}") from None
+
+
+def _count_jsonl_range(
+    file_path: str,
+    fields: list[tuple],
+    encoding_name: str,
+    byte_range: tuple[int, int],
+) -> array:
+    """Count the records of a newline-aligned byte range of a JSONL file."""
+    start, end = byte_range
+    with open(file_path, "rb") as file:
+        file.seek(start)
+        block = file.read(end - start)
+    return _count_records(_parse_lines(block), fields, encoding_name, 1)
+
+
+def _record_batches(
+    file_path: str, file_format: str, batch_size: int, fields: list[tuple]
+) -> Iterator[list]:
+    """Yield lists of records of a dataset, about ``batch_size`` at a time."""
+    if file_format == "parquet":
+        try:
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError(
+                "Reading Parquet files requires the pyarrow package: "
+                "pip install 'count-tokens[parquet]'"
+            ) from e
+        parquet = pyarrow.parquet.ParquetFile(file_path)
+        columns = list(
+            dict.fromkeys(
+                steps[0] for steps in fields if steps[0] in parquet.schema_arrow.names
+            )
+        )
+        for batch in parquet.iter_batches(batch_size=batch_size, columns=columns):
+            yield batch.to_pylist()
+        return
+    with _open_binary(file_path) as file:
+        if file_format == "csv":
+            text = io.TextIOWrapper(file, encoding="utf-8", newline="")
+            try:
+                rows = csv.DictReader(text)
+                while batch := list(itertools.islice(rows, batch_size)):
+                    yield batch
+            finally:
+                text.detach()
+            return
+        while block := _read_chunk_to_boundary(file, _JSONL_BLOCK):
+            yield _parse_lines(block)
+
+
+def iter_record_counts(
+    file_path: str,
+    fields: Iterable[str] = DEFAULT_FIELDS,
+    encoding_name: str = "cl100k_base",
+    workers: int = 1,
+    batch_size: int = BATCH_RECORDS,
+    file_format: str | None = None,
+    num_threads: int = 8,
+) -> Iterator[int]:
+    """Yield the number of tokens in each record of a dataset, in file order.
+
+    The tokens of a record are those of all values at the field paths; paths
+    missing from a record add nothing, and values that are not strings are
+    counted as their JSON.
+
+    Args:
+        file_path: Path to a JSONL, CSV or Parquet file (JSONL and CSV may
+            be compressed, see ``count_tokens.archives``)
+        fields: Field paths, such as ``text`` or ``messages[].content``; for
+            CSV, column names
+        encoding_name: The name of the encoding to use. Default: cl100k_base
+        workers: Number of worker processes for uncompressed JSONL files
+            (1: count in this process, 0: one per CPU)
+        batch_size: Number of CSV or Parquet records tokenized in one batch
+            (JSONL files are read in blocks of whole lines)
+        file_format: ``jsonl``, ``csv`` or ``parquet`` (default: from the suffix)
+        num_threads: Number of threads of the batch encoder in this process
+
+    Yields:
+        Token count of each record
+
+    Raises:
+        ValueError: If a field path, the format or a JSON record is invalid
+    """
+    parsed = [parse_field(field) for field in fields]
+    if file_format is None:
+        file_format = dataset_format(file_path)
+    elif file_format not in DATASET_FORMATS:
+        raise ValueError(
+            f"file_format must be one of {', '.join(DATASET_FORMATS)}, "
+            f"got {file_format!r}"
+        )
+    if workers != 1 and file_format == "jsonl" and _is_plain(file_path):
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers or None,
+            initializer=_init_worker,
+            initargs=(encoding_name, None),
+        ) as executor:
+            count_range = functools.partial(
+                _count_jsonl_range, file_path, parsed, encoding_name
+            )
+            for counts in executor.map(
+                count_range, _chunk_ranges(file_path, _RANGE_SIZE)
+            ):
+                yield from counts
+        return
+    for batch in _record_batches(file_path, file_format, batch_size, parsed):
+        yield from _count_records(batch, parsed, encoding_name, num_threads)
+
+
+def count_dataset(
+    file_path: str,
+    fields: Iterable[str] = DEFAULT_FIELDS,
+    encoding_name: str = "cl100k_base",
+    workers: int = 1,
+    batch_size: int = BATCH_RECORDS,
+    file_format: str | None = None,
+) -> dict:
+    """Count the tokens of every record of a dataset.
+
+    Args:
+        file_path: Path to a JSONL, CSV or Parquet file
+        fields: Field paths of the values to count, see :func:`iter_record_counts`
+        encoding_name: The name of the encoding to use. Default: cl100k_base
+        workers: Number of worker processes for uncompressed JSONL files
+        batch_size: Number of CSV or Parquet records tokenized in one batch
+        file_format: ``jsonl``, ``csv`` or ``parquet`` (default: from the suffix)
+
+    Returns:
+        Dict with the number of ``records``, the total ``tokens`` and the
+        per-record ``counts`` as a compact ``array("I")``
+    """
+    counts = array(
+        "I",
+        iter_record_counts(
+            file_path, fields, encoding_name, workers, batch_size, file_format
+        ),
+    )
+    return {"records": len(counts), "tokens": sum(counts), "counts": counts}
+
+
+def write_record_counts(
+    counts: Iterable[int],
+    output_format: str = "ndjson",
+    file=None,
+    binary_file=None,
+) -> dict:
+    """Write per-record counts as they are produced and return the totals.
+
+    ``ndjson`` writes a ``{"record": ..., "tokens": ...}`` record per record
+    and a ``{"summary": ...}`` record at the end; ``csv`` writes a row per
+    record and a last row with an empty record number and the total. Other
+    formats write nothing per record.
+
+    Args:
+        counts: Token counts of the records, as yielded by :func:`iter_record_counts`
+        output_format: ``ndjson``, ``csv``, or any other format for totals only
+        file: Output stream (default: stdout)
+        binary_file: Binary file receiving the counts as little-endian uint32
+
+    Returns:
+        Dict with the number of ``records`` and the total ``tokens``
+    """
+    file = file or sys.stdout
+    writer = csv.writer(file, lineterminator="\n")
+    if output_format == "csv":
+        writer.writerow(["record", "tokens"])
+    records = tokens = 0
+    block = array("I")
+    for index, count in enumerate(counts):
+        records += 1
+        tokens += count
+        if output_format == "ndjson":
+            file.write(json.dumps({"record": index, "tokens": count}) + "\n")
+        elif output_format == "csv":
+            writer.writerow([index, count])
+        if binary_file is not None:
+            block.append(count)
+            if len(block) >= BATCH_RECORDS:
+                _write_block(block, binary_file)
+    if binary_file is not None:
+        _write_block(block, binary_file)
+    summary = {"records": records, "tokens": tokens}
+    if output_format == "ndjson":
+        file.write(json.dumps({"summary": summary}) + "\n")
+    elif output_format == "csv":
+        writer.writerow(["", tokens])
+    file.flush()
+    return summary
+
+
+def _write_block(block: array, binary_file) -> None:
+    """Write counts as little-endian uint32 and empty the block."""
+    if sys.byteorder == "big":
+        block.byteswap()
+    block.tofile(binary_file)
+    del block[:]
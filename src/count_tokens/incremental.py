@@ -0,0 +1,112 @@
+"""Incremental counting of large files with a cache of per-chunk token counts.
+
+Files are split into content-defined, newline-aligned chunks: whether a chunk
+ends after a line depends only on that line's content and on the size of the
+chunk so far. An edit therefore changes the chunk it falls in (and at most the
+next one, until the boundaries line up again), and an append only adds chunks
+after the old end of the file. The token count of each chunk is cached under
+the digest of its bytes, so a recount tokenizes only the chunks that changed.
+The file is still read and hashed in full, which is much cheaper than
+tokenizing it.
+
+Each chunk is tokenized on its own, so tokens never merge across a chunk
+boundary: the total can differ by a few tokens from ``count_tokens_in_file``
+on the whole text, and from plain streaming, whose chunks end elsewhere.
+"""
+
+import hashlib
+import zlib
+from collections.abc import Iterator
+
+from .cache import CountCache, cache_params
+from .count import _decode_chunk, _get_encoding, _open_binary, _utf8_tail_start
+
+
+def iter_content_chunks(file, chunk_size: int) -> Iterator[bytes]:
+    """Split a binary file into content-defined chunks that end at newlines.
+
+    A chunk ends after a line with probability proportional to the line's
+    length, decided by the line's CRC-32, so chunks average about
+    ``chunk_size`` bytes. Chunks are at least ``chunk_size // 4`` bytes and at
+    most ``4 * chunk_size`` bytes: a chunk that reaches the maximum without
+    such a line ends there, inside a line if need be (but not inside a utf-8
+    character), so a file with huge lines is still read in bounded pieces.
+
+    Args:
+        file: File opened in binary mode
+        chunk_size: Average chunk size in bytes
+
+    Yields:
+        Raw bytes of each chunk; together they are the whole file
+    """
+    min_size = chunk_size // 4
+    max_size = max(chunk_size * 4, 4)
+    # A line of n bytes ends the chunk when its CRC-32 is below n * threshold
+    threshold = (1 << 32) // max(chunk_size, 1)
+    lines: list[bytes] = []
+    size = 0
+    # Never read more than the rest of the chunk, even within a line
+    while line := file.readline(max_size - size):
+        lines.append(line)
+        size += len(line)
+        if size >= max_size and not line.endswith(b"\n"):
+            # No line ended the chunk: cut it, keeping a split character whole
+            chunk = b"".join(lines)
+            cut = _utf8_tail_start(chunk) or size
+            yield chunk[:cut]
+            lines = [chunk[cut:]] if cut < size else []
+            size -= cut
+        elif size >= max_size or (
+            size >= min_size and zlib.crc32(line) < len(line) * threshold
+        ):
+            yield b"".join(lines)
+            lines = []
+            size = 0
+    if lines:
+        yield b"".join(lines)
+
+
+def chunk_digest(chunk: bytes) -> str:
+    """Return the BLAKE2b hex digest of a chunk's bytes."""
+    return hashlib.blake2b(chunk, digest_size=20).hexdigest()
+
+
+def iter_chunk_counts(
+    file_path: str,
+    cache: CountCache,
+    encoding_name: str = "cl100k_base",
+    chunk_size: int = 1024 * 1024,
+    decode_errors: str = "latin-1",
+) -> Iterator[tuple[int, bool]]:
+    """Yield the token count of each content-defined chunk of a file.
+
+    Counts of chunks seen before (in any file) come from ``cache``; other
+    chunks are decoded like streamed chunks, tokenized and stored in the cache.
+    ``cache.chunk_hits`` and ``cache.chunk_misses`` count the reused and
+    tokenized chunks.
+
+    Args:
+        file_path: Path to the file
+        cache: Cache holding the chunk counts
+        encoding_name: Encoding to use
+        chunk_size: Average chunk size in bytes
+        decode_errors: Policy for chunks that are not valid utf-8
+
+    Yields:
+        Token count of the chunk and whether the decode error policy was needed for it
+    """
+    params = cache_params(encoding=encoding_name, decode_errors=decode_errors)
+    encoding = None
+    with _open_binary(file_path) as file:
+        for chunk in iter_content_chunks(file, chunk_size):
+            digest = chunk_digest(chunk)
+            cached = cache.get_chunk(digest, params)
+            if cached is not None:
+                yield cached
+                continue
+            if encoding is None:
+                encoding = _get_encoding(encoding_name)
+            text, fallback = _decode_chunk(chunk, decode_errors)
+            tokens = len(encoding.encode(text))
+            cache.put_chunk(digest, params, tokens, fallback)
+            yield tokens, fallback
@@ -0,0 +1,150 @@
+"""Sampling-based token estimation for very large files and corpora."""
+
+import bisect
+import math
+import os
+import random
+from collections.abc import Iterator
+from statistics import NormalDist
+
+from .count import _decode_chunk, _get_encoding
+
+# Default size of one sampled segment in bytes
+SAMPLE_SIZE = 64 * 1024
+# Default target relative half-width of the confidence interval
+TARGET_RELATIVE_ERROR = 0.01
+# Minimum number of segments tokenized before early stopping is considered
+MIN_SAMPLES = 30
+# Above this many segments, sample indices are drawn by rejection instead of a shuffle
+_SHUFFLE_LIMIT = 1_000_000
+
+
+def _align(file, position: int, size: int) -> int:
+    """Return the start of the first line at or after ``position``."""
+    if position <= 0:
+        return 0
+    if position >= size:
+        return size
+    file.seek(position - 1)
+    if file.read(1) == b"\n":
+        return position
+    file.readline()
+    return file.tell()
+
+
+def _sample_order(segments: int, rng: random.Random) -> Iterator[int]:
+    """Yield segment indices in random order, without replacement."""
+    if segments <= _SHUFFLE_LIMIT:
+        order = list(range(segments))
+        rng.shuffle(order)
+        yield from order
+        return
+    seen: set[int] = set()
+    while len(seen) < segments:
+        index = rng.randrange(segments)
+        if index not in seen:
+            seen.add(index)
+            yield index
+
+
+def estimate_tokens(
+    paths: list[str],
+    encoding_name: str = "cl100k_base",
+    sample_size: int = SAMPLE_SIZE,
+    target_relative_error: float = TARGET_RELATIVE_ERROR,
+    confidence: float = 0.95,
+    min_samples: int = MIN_SAMPLES,
+    max_samples: int | None = None,
+    seed: int | None = None,
+    decode_errors: str = "latin-1",
+) -> dict:
+    """Estimate the number of tokens in files by tokenizing a random sample.
+
+    All files are split into newline-aligned segments of about ``sample_size``
+    bytes. Segments are drawn at random across and within files, tokenized
+    exactly, and the tokens-per-byte ratio is extrapolated to the total size
+    (a ratio estimator). Sampling stops once the confidence interval is
+    within ``target_relative_error`` of the estimate, after ``max_samples``
+    segments, or when every segment was tokenized (the estimate is then
+    exact for this segmentation).
+
+    Args:
+        paths: Files to estimate
+        encoding_name: The name of the encoding to use
+        sample_size: Approximate size of one sampled segment in bytes
+        target_relative_error: Stop when the CI half-width falls below this fraction of the estimate
+        confidence: Confidence level of the interval
+        min_samples: Minimum number of segments tokenized before stopping early
+        max_samples: Maximum number of segments to tokenize (default: no limit)
+        seed: Seed for the random sample, for reproducible estimates
+        decode_errors: Policy for segments that are not valid utf-8
+
+    Returns:
+        Dict with the estimated ``tokens``, the ``ci_low``/``ci_high`` bounds,
+        ``confidence``, ``relative_error``, ``samples``, ``segments``,
+        ``sampled_bytes`` and ``total_bytes``
+    """
+    sizes = [os.path.getsize(path) for path in paths]
+    total_bytes = sum(sizes)
+    # Cumulative number of segments, to map a global segment index to a file
+    offsets: list[int] = []
+    segments = 0
+    for size in sizes:
+        offsets.append(segments)
+        segments += math.ceil(size / sample_size)
+
+    if max_samples is not None:
+        # Two samples are needed for a confidence interval
+        max_samples = max(max_samples, 2)
+    encoding = _get_encoding(encoding_name)
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    rng = random.Random(seed)
+    n = sum_t = sum_b = sum_tt = sum_bb = sum_tb = 0
+    estimate = half_width = 0.0
+
+    for index in _sample_order(segments, rng):
+        file_index = bisect.bisect_right(offsets, index) - 1
+        segment = index - offsets[file_index]
+        size = sizes[file_index]
+        with open(paths[file_index], "rb") as file:
+            start = _align(file, segment * sample_size, size)
+            end = _align(file, (segment + 1) * sample_size, size)
+            file.seek(start)
+            text, _ = _decode_chunk(file.read(end - start), decode_errors)
+        t, b = len(encoding.encode(text)), end - start
+
+        n += 1
+        sum_t += t
+        sum_b += b
+        sum_tt += t * t
+        sum_bb += b * b
+        sum_tb += t * b
+
+        ratio = sum_t / sum_b if sum_b else 0.0
+        estimate = ratio * total_bytes
+        if n > 1 and n < segments:
+            # Ratio estimator variance under sampling without replacement
+            residuals = sum_tt - 2 * ratio * sum_tb + ratio * ratio * sum_bb
+            variance = segments**2 * (1 - n / segments) / n * residuals / (n - 1)
+            half_width = z * math.sqrt(max(variance, 0.0))
+        else:
+            half_width = 0.0 if n == segments else math.inf
+
+        if n == segments or (max_samples is not None and n >= max_samples):
+            break
+        if n >= min_samples and half_width <= target_relative_error * estimate:
+            break
+
+    if n == segments:
+        estimate = float(sum_t)
+    return {
+        "tokens": round(estimate),
+        "ci_low": max(round(estimate - half_width), 0) if n else 0,
+        "ci_high": round(estimate + half_width) if n else 0,
+        "confidence": confidence,
+        "relative_error": half_width / estimate if estimate else 0.0,
+        "samples": n,
+        "segments": segments,
+        "sampled_bytes": sum_b,
+        "total_bytes": total_bytes,
+    }
@@ -0,0 +1,446 @@
+"""Counting daemon that keeps encodings loaded, and its client.
+
+The daemon answers ``POST /count`` requests over a Unix socket or localhost
+HTTP. The request body is a JSON object with the keyword arguments of
+:func:`count_tokens.count.count` (``text``, ``file`` or ``directory`` and the
+counting options) plus an optional ``format`` (text, json, ndjson or csv). The
+response is ``{"result": ..., "output": ...}``: the result of ``count`` and
+its rendering by ``_format_output``. ``GET /health`` reports the loaded
+encodings.
+
+Requests read the caller's files, so only the caller may send them. The Unix
+socket is readable by its owner alone, and the client only talks to a socket
+its user owns. Over TCP the daemon only listens on
+loopback addresses, rejects requests whose ``Host`` header names another
+host (DNS rebinding from a web page), and requires the per-user token stored
+in :func:`default_token_path` as an ``Authorization: Bearer`` header.
+"""
+
+import argparse
+import getpass
+import hmac
+import http.client
+import http.server
+import ipaddress
+import json
+import os
+import secrets
+import socket
+import socketserver
+import sys
+import tempfile
+
+from .count import _format_output, _get_encoding, count
+
+# Default TCP port when serving over localhost HTTP
+DEFAULT_PORT = 8765
+# Request options passed through to ``count``
+REQUEST_OPTIONS = (
+    "text",
+    "texts",
+    "file",
+    "directory",
+    "encoding",
+    "file_patterns",
+    "recursive",
+    "use_streaming",
+    "chunk_size",
+    "approximate",
+    "tokens_per_word",
+    "characters_per_token",
+    "max_tokens",
+    "decode_errors",
+    "profile",
+    "stop_at_limit",
+    "max_total_tokens",
+    "exclude",
+    "use_ignore_files",
+    "archives",
+    "skip_binary",
+    "max_file_size",
+    "max_line_length",
+)
+
+
+class ServerError(Exception):
+    """Error reported by the counting daemon for a request."""
+
+
+def default_address() -> str:
+    """Return the default daemon address: a per-user Unix socket, or localhost HTTP."""
+    if not hasattr(socket, "AF_UNIX"):
+        return f"127.0.0.1:{DEFAULT_PORT}"
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "count_tokens.sock")
+    # A directory of the user's own, created by the daemon with mode 0700
+    return os.path.join(
+        tempfile.gettempdir(), f"count_tokens-{os.getuid()}", "count_tokens.sock"
+    )
+
+
+def default_token_path() -> str:
+    """Return the path of the per-user token required by the daemon over TCP."""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "count_tokens.token")
+    user = os.getuid() if hasattr(os, "getuid") else getpass.getuser()
+    return os.path.join(tempfile.gettempdir(), f"count_tokens-{user}.token")
+
+
+def _load_token(token_path: str) -> str:
+    """Return the token in a file only the current user can read, creating it.
+
+    Raises:
+        OSError: If the file belongs to another user or others can read it
+    """
+    try:
+        fd = os.open(token_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        stat = os.stat(token_path)
+        if hasattr(os, "getuid") and (
+            stat.st_uid != os.getuid() or stat.st_mode & 0o077
+        ):
+            raise OSError(
+                f"Token file {token_path} must belong to you and be readable "
+                "by you alone"
+            ) from None
+        with open(token_path) as file:
+            return file.read().strip()
+    token = secrets.token_hex(32)
+    with os.fdopen(fd, "w") as file:
+        file.write(token)
+    return token
+
+
+def _is_loopback(host: str) -> bool:
+    """Return whether a host name or address is the local machine only."""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _host_name(host_header: str) -> str:
+    """Return the host of a ``Host`` header, without the port or IPv6 brackets."""
+    if host_header.startswith("["):
+        return host_header[1 : host_header.find("]")]
+    return host_header.rpartition(":")[0] if ":" in host_header else host_header
+
+
+def parse_address(address: str) -> tuple[str, int] | str:
+    """Parse ``host:port`` into a TCP address; anything else is a Unix socket path."""
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit() and "/" not in address:
+        return host, int(port)
+    return address
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    server_version = "count-tokens"
+
+    def address_string(self) -> str:
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else "local"
+
+    def log_message(self, format: str, *args) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _reply(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorized(self) -> bool:
+        """Check the ``Host`` header and token of a TCP request, replying if they fail."""
+        if self.server.token is None:
+            return True
+        host = self.headers.get("Host", "")
+        if not _is_loopback(_host_name(host)):
+            self._reply(403, {"error": f"Host {host!r} is not allowed"})
+            return False
+        authorization = self.headers.get("Authorization", "")
+        expected = f"Bearer {self.server.token}"
+        if not hmac.compare_digest(
+            authorization.encode("latin-1", "replace"), expected.encode()
+        ):
+            self._reply(401, {"error": "Missing or wrong token"})
+            return False
+        return True
+
+    def do_GET(self) -> None:
+        if not self._authorized():
+            return
+        if self.path != "/health":
+            self._reply(404, {"error": f"Unknown path {self.path}"})
+            return
+        self._reply(200, {"status": "ok", "encodings": sorted(self.server.encodings)})
+
+    def do_POST(self) -> None:
+        if not self._authorized():
+            return
+        if self.path != "/count":
+            self._reply(404, {"error": f"Unknown path {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            output_format = request.pop("format", "text")
+            unknown = set(request) - set(REQUEST_OPTIONS)
+            if unknown:
+                raise ValueError(
+                    f"Unknown request options: {', '.join(sorted(unknown))}"
+                )
+            result = count(**request)
+        except Exception as e:
+            self._reply(400, {"error": f"{type(e).__name__}: {e!s}"})
+            return
+        encoding = request.get("encoding", "cl100k_base")
+        by_encoding = not isinstance(encoding, str)
+        self.server.encodings.update(encoding if by_encoding else [encoding])
+        self._reply(
+            200,
+            {
+                "result": result,
+                "output": _format_output(result, output_format, by_encoding),
+            },
+        )
+
+
+class _CountServerMixin:
+    daemon_threads = True
+    verbose = False
+    encodings: set[str]
+    # Token required in requests, over TCP only
+    token: str | None = None
+
+
+class _TCPServer(_CountServerMixin, http.server.ThreadingHTTPServer):
+    pass
+
+
+if hasattr(socket, "AF_UNIX"):
+
+    class _UnixServer(
+        _CountServerMixin, socketserver.ThreadingMixIn, socketserver.UnixStreamServer
+    ):
+        def server_bind(self) -> None:
+            # Only the owner may send requests that read their files: create
+            # the socket with mode 0600 rather than restrict it after bind
+            umask = os.umask(0o177)
+            try:
+                super().server_bind()
+            finally:
+                os.umask(umask)
+
+
+def create_server(
+    address: str, encodings: list[str] | None = None, token_path: str | None = None
+):
+    """Create the counting daemon on a Unix socket path or ``host:port``.
+
+    The given encodings are loaded up front. The directory of a Unix socket is
+    created with mode 0700 if missing. A stale socket file left by a
+    daemon that is no longer running is replaced. A TCP daemon requires the
+    token in ``token_path`` (default: :func:`default_token_path`), which is
+    created if it does not exist.
+
+    Raises:
+        ValueError: If a TCP host is not a loopback address
+        OSError: If another daemon is already listening on the address, or
+            the token file or socket directory is not private
+    """
+    parsed = parse_address(address)
+    if isinstance(parsed, tuple):
+        if not _is_loopback(parsed[0]):
+            raise ValueError(
+                f"Refusing to listen on {parsed[0]}: the daemon reads your files, "
+                "so it only serves loopback addresses or a Unix socket"
+            )
+        token = _load_token(token_path or default_token_path())
+        server = _TCPServer(parsed, _Handler)
+        server.token = token
+    else:
+        _make_socket_directory(os.path.dirname(parsed))
+        if os.path.exists(parsed):
+            connection = _connect(parsed)
+            if connection is not None:
+                connection.close()
+                raise OSError(f"A count-tokens server is already running on {parsed}")
+            os.unlink(parsed)
+        server = _UnixServer(parsed, _Handler)
+    server.encodings = set()
+    for encoding_name in encodings or []:
+        _get_encoding(encoding_name)
+        server.encodings.add(encoding_name)
+    return server
+
+
+def _make_socket_directory(directory: str) -> None:
+    """Create the directory of a socket, private to the user, if it is missing.
+
+    Raises:
+        OSError: If an existing directory of the default address is not the
+            user's own
+    """
+    if not directory:
+        return
+    try:
+        os.mkdir(directory, 0o700)
+    except FileExistsError:
+        if directory == os.path.dirname(default_address()):
+            stat = os.lstat(directory)
+            if stat.st_uid != os.getuid() or stat.st_mode & 0o077:
+                raise OSError(
+                    f"Socket directory {directory} must belong to you and be "
+                    "accessible by you alone"
+                ) from None
+
+
+def _check_socket_owner(socket_path: str) -> None:
+    """Refuse to send requests to a socket that another user created.
+
+    Raises:
+        ServerError: If the socket exists and belongs to another user
+    """
+    try:
+        stat = os.lstat(socket_path)
+    except OSError:
+        # No socket: there is no daemon to talk to
+        return
+    if stat.st_uid != os.getuid():
+        raise ServerError(
+            f"Socket {socket_path} belongs to another user; refusing to send it "
+            "your requests"
+        )
+
+
+def serve(
+    address: str,
+    encodings: list[str] | None = None,
+    verbose: bool = False,
+    token_path: str | None = None,
+):
+    """Run the counting daemon until interrupted."""
+    server = create_server(address, encodings, token_path)
+    server.verbose = verbose
+    print(f"count-tokens server listening on {address}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if isinstance(server.server_address, str):
+            os.unlink(server.server_address)
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str) -> None:
+        super().__init__("localhost")
+        self.socket_path = socket_path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+def _connect(address: str | tuple[str, int]) -> http.client.HTTPConnection | None:
+    """Connect to the daemon, or return None if it is not running."""
+    if isinstance(address, tuple):
+        connection = http.client.HTTPConnection(*address)
+    else:
+        connection = _UnixHTTPConnection(address)
+    try:
+        connection.connect()
+    except OSError:
+        connection.close()
+        return None
+    return connection
+
+
+def request_count(address: str | None = None, token_path: str | None = None, **request):
+    """Count with the daemon, or return None if no daemon is running.
+
+    Args:
+        address: Daemon address (default: :func:`default_address`)
+        token_path: File with the token of a TCP daemon (default:
+            :func:`default_token_path`)
+        **request: Keyword arguments of ``count``; file and directory paths
+            are resolved against the daemon's working directory, so pass
+            absolute paths
+
+    Returns:
+        The result of ``count`` computed by the daemon, or None
+
+    Raises:
+        ServerError: If the daemon could not count the request, or its Unix
+            socket belongs to another user
+    """
+    parsed = parse_address(address or default_address())
+    headers = {"Content-Type": "application/json"}
+    if isinstance(parsed, tuple):
+        try:
+            with open(token_path or default_token_path()) as file:
+                headers["Authorization"] = f"Bearer {file.read().strip()}"
+        except OSError:
+            # No token: the daemon replies with an error if it is running
+            pass
+    else:
+        _check_socket_owner(parsed)
+    connection = _connect(parsed)
+    if connection is None:
+        return None
+    try:
+        connection.request("POST", "/count", body=json.dumps(request), headers=headers)
+        response = connection.getresponse()
+        body = json.loads(response.read())
+    finally:
+        connection.close()
+    if response.status != 200:
+        raise ServerError(body.get("error", f"HTTP {response.status}"))
+    return body["result"]
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Run ``count-tokens serve``."""
+    parser = argparse.ArgumentParser(
+        prog="count-tokens serve",
+        description="Serve token counts with the encodings kept loaded.",
+    )
+    parser.add_argument(
+        "--address",
+        default=default_address(),
+        help="Unix socket path, or loopback host:port to listen on with the "
+        "token in --token-file (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--token-file",
+        help="Token required over TCP, created if missing "
+        "(default: per-user file next to the socket)",
+    )
+    parser.add_argument(
+        "-e",
+        "--encoding",
+        default="cl100k_base",
+        help="Encodings to load at startup (comma-separated, default: cl100k_base)",
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="Log every request"
+    )
+    args = parser.parse_args(argv)
+    try:
+        serve(
+            args.address,
+            [e.strip() for e in args.encoding.split(",") if e.strip()],
+            args.verbose,
+            args.token_file,
+        )
+    except ValueError as e:
+        parser.error(str(e))
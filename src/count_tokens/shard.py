@@ -0,0 +1,250 @@
+"""Count a directory in shards on several machines and merge the partial results.
+
+``--shard i/n`` counts the files whose stable hash (of the path relative to
+the directory) falls into shard ``i`` of ``n``, so every machine walking the
+same shared directory picks a disjoint part of it. Each shard writes a
+partial result file: an NDJSON header with the shard and the counting
+parameters, a ``[position, file, result]`` row per file, where ``position``
+is the file's place in the walk of the whole directory, and a summary.
+``count-tokens merge`` checks that the partials cover all shards with the
+same parameters and prints the results in the order of a single-node run.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+from collections.abc import Iterable
+
+from .count import (
+    _RUN_OPTIONS,
+    _by_encoding,
+    _check_limit,
+    _format_output,
+    _result_tokens,
+    _write_records,
+    iter_token_counts,
+)
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parse ``i/n`` into the shard number ``i`` (from 1) and the shard count ``n``.
+
+    Raises:
+        ValueError: If the value is not of the form ``i/n`` with 1 <= i <= n
+    """
+    index, _, count = value.partition("/")
+    if not (index.isdigit() and count.isdigit() and 1 <= int(index) <= int(count)):
+        raise ValueError(f"Invalid shard {value!r}: use i/n with 1 <= i <= n")
+    return int(index), int(count)
+
+
+def shard_of(relative_path: str, count: int) -> int:
+    """Return the shard (from 1) of a path relative to the counted directory.
+
+    The hash is BLAKE2 of the path with ``/`` separators, not the salted
+    built-in ``hash``, so every process and machine assigns the same shard.
+    """
+    key = relative_path.replace(os.sep, "/").encode("utf-8", "surrogateescape")
+    digest = hashlib.blake2b(key, digest_size=8).digest()
+    return int.from_bytes(digest, "big") % count + 1
+
+
+def _open_partial(path: str, mode: str):
+    """Open a partial result file, gzip-compressed if its name ends with .gz."""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def write_partial(
+    partial_path: str, directory_path: str, shard: tuple[int, int], **options
+) -> dict:
+    """Count one shard of a directory and write its partial result file.
+
+    Args:
+        partial_path: Path of the partial result file (gzip-compressed if it
+            ends with ``.gz``)
+        directory_path: Path to the directory, as given to every shard
+        shard: Shard number (from 1) and number of shards
+        **options: Keyword arguments of ``iter_token_counts``
+
+    Returns:
+        The summary written last: number of ``files`` counted, total
+        ``tokens`` (a dict by encoding with several encodings), and numbers of
+        ``errors`` and ``skipped`` files
+    """
+    from .archives import MEMBER_SEPARATOR
+
+    params = {
+        name: value for name, value in options.items() if name not in _RUN_OPTIONS
+    }
+    encoding_names = options.get("encoding_name", "cl100k_base")
+    if isinstance(encoding_names, str):
+        encoding_names = None
+    totals = dict.fromkeys(encoding_names or ["tokens"], 0)
+    summary = {"files": 0, "tokens": 0, "errors": 0, "skipped": 0}
+    positions: dict[str, int] = {}
+    with _open_partial(partial_path, "w") as file:
+        header = {"shard": list(shard), "directory": directory_path, "params": params}
+        file.write(json.dumps(header) + "\n")
+        for file_path, result in iter_token_counts(
+            directory_path, shard=shard, positions=positions, **options
+        ):
+            if file_path in positions:
+                position = positions.pop(file_path)
+            else:
+                # Members of an archive take its place
+                position = positions[file_path.partition(MEMBER_SEPARATOR)[0]]
+            file.write(json.dumps([position, file_path, result]) + "\n")
+            if isinstance(result, str):
+                summary["skipped" if result.startswith("Skipped: ") else "errors"] += 1
+                continue
+            counts = result if encoding_names else {"tokens": result}
+            for name, count in counts.items():
+                totals[name] += _result_tokens(count)
+            summary["files"] += 1
+        summary["tokens"] = totals if encoding_names else totals["tokens"]
+        file.write(json.dumps({"summary": summary}) + "\n")
+    return summary
+
+
+def read_partial(partial_path: str) -> tuple[dict, list[list]]:
+    """Read a partial result file.
+
+    Returns:
+        The header and the ``[position, file, result]`` rows
+
+    Raises:
+        ValueError: If the file is not a complete partial result file
+    """
+    with _open_partial(partial_path, "r") as file:
+        try:
+            header = json.loads(file.readline())
+            rows = [json.loads(line) for line in file]
+        except json.JSONDecodeError as e:
+            raise ValueError(
+                f"{partial_path} is not a partial result file: {e}"
+            ) from None
+    if not isinstance(header, dict) or "shard" not in header:
+        raise ValueError(f"{partial_path} is not a partial result file")
+    if not rows or not isinstance(rows[-1], dict) or "summary" not in rows[-1]:
+        raise ValueError(f"{partial_path} is incomplete: its shard did not finish")
+    return header, rows[:-1]
+
+
+def merge_partials(partial_paths: Iterable[str]) -> dict:
+    """Merge the partial result files of all shards of a directory count.
+
+    Args:
+        partial_paths: Paths of the partial result files, one per shard
+
+    Returns:
+        Dict with the counting ``params`` and the per-file ``results`` in the
+        order of a single-node ``count_tokens_in_directory`` (with several
+        encodings, per-file dicts keyed by encoding)
+
+    Raises:
+        ValueError: If partials are incomplete, were counted with different
+            parameters or shard counts, or shards are missing or repeated
+    """
+    params = count = None
+    seen: set[int] = set()
+    rows: list[list] = []
+    for partial_path in partial_paths:
+        header, partial_rows = read_partial(partial_path)
+        index, shards = header["shard"]
+        if count is None:
+            params, count = header["params"], shards
+        elif shards != count or header["params"] != params:
+            raise ValueError(
+                f"{partial_path} was counted with other parameters or shard count"
+            )
+        if index in seen:
+            raise ValueError(f"Shard {index}/{count} is given more than once")
+        seen.add(index)
+        rows.extend(partial_rows)
+    if count is None:
+        raise ValueError("No partial result files given")
+    missing = sorted(set(range(1, count + 1)) - seen)
+    if missing:
+        raise ValueError(f"Missing shards of {count}: {', '.join(map(str, missing))}")
+    # Stable sort, so members of an archive keep their order
+    rows.sort(key=lambda row: row[0])
+    return {"params": params, "results": {path: result for _, path, result in rows}}
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Run ``count-tokens merge``."""
+    parser = argparse.ArgumentParser(
+        prog="count-tokens merge",
+        description="Merge the partial results of 'count-tokens -d DIR --shard i/n'.",
+    )
+    parser.add_argument(
+        "partials", nargs="+", help="Partial result files of all shards"
+    )
+    parser.add_argument(
+        "-q", "--quiet", action="store_true", help="Print only the number of tokens"
+    )
+    parser.add_argument(
+        "--format",
+        choices=["text", "json", "ndjson", "csv"],
+        default="text",
+        help="Output format (default: text)",
+    )
+    parser.add_argument(
+        "--max-tokens", type=int, help="Flag files that exceed this token limit"
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print percentiles, a histogram and the largest files instead of "
+        "per-file counts",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=100,
+        help="Number of largest files listed by --stats (default: 100)",
+    )
+    args = parser.parse_args(argv)
+    try:
+        merged = merge_partials(args.partials)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    results = merged["results"]
+    encoding_names = merged["params"].get("encoding_name", "cl100k_base")
+    if isinstance(encoding_names, str):
+        encoding_names = None
+
+    if args.stats and encoding_names:
+        parser.error("--stats supports results of a single encoding")
+    _print_merged(results, encoding_names, args)
+
+
+def _print_merged(results: dict, encoding_names: list | None, args) -> None:
+    """Print merged per-file results as a single-node directory count does."""
+    if args.quiet:
+        # One total per encoding, in the order given
+        for counts in (
+            _by_encoding(results, encoding_names) if encoding_names else {"": results}
+        ).values():
+            print(sum(_result_tokens(count) for count in counts.values()))
+    elif args.stats:
+        from .stats import TokenStats, format_stats
+
+        stats = TokenStats(args.top)
+        for file_path, result in results.items():
+            stats.add_result(file_path, result)
+        print(format_stats(stats, args.format))
+    elif args.format == "ndjson":
+        _write_records(results.items(), encoding_names, args.max_tokens)
+    elif encoding_names:
+        by_encoding = {
+            name: _check_limit(counts, args.max_tokens)
+            for name, counts in _by_encoding(results, encoding_names).items()
+        }
+        print(_format_output(by_encoding, args.format, by_encoding=True))
+    else:
+        print(_format_output(_check_limit(results, args.max_tokens), args.format))
@@ -0,0 +1,93 @@
+"""Skip binary, oversized and minified files before reading them in full.
+
+A directory scan with broad patterns such as ``*`` finds images, wheels and
+minified bundles. Sniffing looks at the size on disk and the first few KB of
+a file, so these are rejected before the full read and tokenization, with a
+``"Skipped: <reason>"`` result instead of a count or a late decoding error.
+"""
+
+import os
+from typing import BinaryIO
+
+from .count import _open_binary
+
+# Bytes read from the start of a file to classify it
+SNIFF_BYTES = 8192
+# Share of control bytes above which a file is binary
+BINARY_CONTROL_RATIO = 0.3
+
+# Bytes of text: printable ASCII, utf-8 and latin-1 bytes, and the usual
+# whitespace and terminal control characters
+_TEXT_BYTES = bytes([7, 8, 9, 10, 11, 12, 13, 27, *range(32, 127), *range(128, 256)])
+
+
+def is_binary(head: bytes) -> bool:
+    """Return whether the first bytes of a file look like binary data.
+
+    A file is binary if its head contains a NUL byte, as most binary formats
+    do (and text rarely does), or if more than ``BINARY_CONTROL_RATIO`` of
+    its bytes are control characters that do not appear in text.
+    """
+    if not head:
+        return False
+    if b"\0" in head:
+        return True
+    controls = len(head.translate(None, _TEXT_BYTES))
+    return controls > BINARY_CONTROL_RATIO * len(head)
+
+
+def _head(file_path: str | BinaryIO, size: int) -> bytes:
+    """Return the first bytes of a file, or peek at those of an open stream."""
+    if isinstance(file_path, str):
+        with _open_binary(file_path) as file:
+            return file.read(size)
+    # Buffered streams of compressed files and archive members are only
+    # peeked at, so counting still reads them from the start
+    peek = getattr(file_path, "peek", None)
+    return peek(size)[:size] if peek is not None else b""
+
+
+def sniff(
+    file_path: str | BinaryIO,
+    skip_binary: bool = True,
+    max_file_size: int | None = None,
+    max_line_length: int | None = None,
+) -> str | None:
+    """Return why a file should be skipped, or None to count it.
+
+    Args:
+        file_path: Path of a file, or an open buffered stream such as a
+            member of an archive
+        skip_binary: Skip files whose first bytes look binary
+        max_file_size: Skip files larger than this many bytes on disk
+            (compressed files by their compressed size; not checked for
+            archive members)
+        max_line_length: Skip files whose first bytes have a line longer than
+            this many bytes, as minified or generated files do
+
+    Returns:
+        A ``"Skipped: ..."`` reason, or None
+
+    Raises:
+        OSError: If the file cannot be read
+    """
+    if max_file_size is not None and isinstance(file_path, str):
+        size = os.path.getsize(file_path)
+        if size > max_file_size:
+            return f"Skipped: file larger than {max_file_size} bytes ({size} bytes)"
+    if not skip_binary and max_line_length is None:
+        return None
+    size = SNIFF_BYTES
+    if max_line_length is not None:
+        size = max(size, max_line_length + 1)
+    head = _head(file_path, size)
+    if skip_binary and is_binary(head[:SNIFF_BYTES]):
+        return "Skipped: binary file"
+    if max_line_length is not None:
+        longest = max(len(line) for line in head.split(b"\n"))
+        if longest > max_line_length:
+            return (
+                f"Skipped: line longer than {max_line_length} bytes "
+                "(minified or generated file)"
+            )
+    return None
@@ -0,0 +1,177 @@
+"""Split text into chunks of at most a number of tokens, in a single tokenization.
+
+The text is encoded once and the chunks are cut from that token stream, so
+measuring and splitting a document does not encode it twice. Each chunk comes
+with its token count and its byte and character offsets in the input.
+"""
+
+from collections.abc import Iterable, Iterator
+
+from .count import (
+    _CONTINUATION_BYTES,
+    _get_encoding,
+    _open_binary,
+    _read_chunk_to_boundary,
+)
+
+# Policies for bytes that are not valid utf-8; the others of DECODE_ERRORS
+# would make the token bytes differ from the input
+SPLIT_DECODE_ERRORS = ("strict", "replace")
+
+_CONTINUATION = frozenset(_CONTINUATION_BYTES)
+
+
+def _char_boundary(pieces: list[bytes], index: int, step: int) -> int:
+    """Move a cut between tokens in direction ``step`` until it is not inside a character.
+
+    A token can hold part of a multi-byte utf-8 character; a cut just before a
+    token that starts with a continuation byte would split that character.
+    """
+    while 0 < index < len(pieces) and pieces[index][0] in _CONTINUATION:
+        index += step
+    return index
+
+
+def _split_pieces(
+    token_blocks: Iterable[list[bytes]], max_tokens: int, overlap: int
+) -> Iterator[dict]:
+    """Cut chunks of at most ``max_tokens`` tokens from blocks of token bytes.
+
+    Only the tokens of the current block and the ones carried over from the
+    previous block are held in memory.
+
+    Raises:
+        ValueError: If a single character takes more than ``max_tokens`` tokens,
+            so no cut within the budget keeps it whole
+    """
+    pieces: list[bytes] = []
+    start_byte = start_char = index = 0
+    blocks = iter(token_blocks)
+    final = False
+    while not final:
+        block = next(blocks, None)
+        if block is None:
+            final = True
+        else:
+            pieces.extend(block)
+        # Without more input the rest of the buffer is emitted too
+        while len(pieces) > max_tokens or (final and pieces):
+            end = _char_boundary(pieces, min(max_tokens, len(pieces)), -1)
+            if end == 0:
+                end = _char_boundary(pieces, 1, 1)
+                raise ValueError(
+                    f"A character at byte {start_byte} takes {end} tokens, more "
+                    f"than max_tokens={max_tokens}; use a larger budget"
+                )
+            data = b"".join(pieces[:end])
+            text = data.decode("utf-8", "replace")
+            yield {
+                "index": index,
+                "text": text,
+                "tokens": end,
+                "start_byte": start_byte,
+                "end_byte": start_byte + len(data),
+                "start_char": start_char,
+                "end_char": start_char + len(text),
+            }
+            index += 1
+            if end == len(pieces) and final:
+                return
+            step = _char_boundary(pieces, max(end - overlap, 1), 1)
+            consumed = b"".join(pieces[:step])
+            start_byte += len(consumed)
+            start_char += len(consumed.decode("utf-8", "replace"))
+            del pieces[:step]
+
+
+def _validate(max_tokens: int, overlap: int) -> None:
+    if max_tokens < 1:
+        raise ValueError(f"max_tokens must be at least 1, got {max_tokens}")
+    if not 0 <= overlap < max_tokens:
+        raise ValueError(
+            f"overlap must be at least 0 and less than max_tokens, got {overlap}"
+        )
+
+
+def split_text(
+    text: str,
+    max_tokens: int,
+    encoding_name: str = "cl100k_base",
+    overlap: int = 0,
+) -> Iterator[dict]:
+    """Yield chunks of a text with at most ``max_tokens`` tokens each.
+
+    The text is tokenized once. Consecutive chunks share ``overlap`` tokens.
+    Chunks are cut between tokens, never inside a character.
+
+    Args:
+        text: The text to split
+        max_tokens: Maximum number of tokens per chunk
+        encoding_name: The name of the encoding to use. Default: cl100k_base
+        overlap: Number of tokens repeated at the start of the next chunk
+
+    Yields:
+        Dicts with the chunk ``index``, ``text``, number of ``tokens``, and
+        ``start_byte``/``end_byte`` (in the utf-8 encoding of the text) and
+        ``start_char``/``end_char`` offsets
+
+    Raises:
+        ValueError: If ``max_tokens`` is below 1, ``overlap`` is not below
+            ``max_tokens``, or a single character takes more than ``max_tokens``
+            tokens
+    """
+    _validate(max_tokens, overlap)
+    encoding = _get_encoding(encoding_name)
+    pieces = encoding.decode_tokens_bytes(encoding.encode(text))
+    yield from _split_pieces([pieces], max_tokens, overlap)
+
+
+def split_file(
+    file_path: str,
+    max_tokens: int,
+    encoding_name: str = "cl100k_base",
+    overlap: int = 0,
+    chunk_size: int = 1024 * 1024,
+    decode_errors: str = "replace",
+) -> Iterator[dict]:
+    """Yield chunks of a file with at most ``max_tokens`` tokens each, streaming.
+
+    The file is read and tokenized in newline-aligned blocks of about
+    ``chunk_size`` bytes, as in ``count_tokens_in_large_file``, so memory use
+    is bounded by the block size whatever the size of the file. Each token is
+    produced once; chunks span block boundaries. Unlike counting, line endings
+    are kept as they are, so for valid utf-8 files the byte offsets are
+    positions in the file (in the decompressed content for compressed files
+    and archive members).
+
+    Args:
+        file_path: Path to the file
+        max_tokens: Maximum number of tokens per chunk
+        encoding_name: The name of the encoding to use. Default: cl100k_base
+        overlap: Number of tokens repeated at the start of the next chunk
+        chunk_size: Size of the blocks read and tokenized at a time, in bytes
+        decode_errors: Error handler for bytes that are not valid utf-8
+            (``strict`` or ``replace``). Default: replace
+
+    Yields:
+        Chunk dicts as in :func:`split_text`
+
+    Raises:
+        ValueError: If ``max_tokens``, ``overlap`` or ``decode_errors`` is
+            invalid, or a single character takes more than ``max_tokens`` tokens
+    """
+    _validate(max_tokens, overlap)
+    if decode_errors not in SPLIT_DECODE_ERRORS:
+        raise ValueError(
+            f"decode_errors must be one of {', '.join(SPLIT_DECODE_ERRORS)}, "
+            f"got {decode_errors!r}"
+        )
+    encoding = _get_encoding(encoding_name)
+
+    def token_blocks() -> Iterator[list[bytes]]:
+        with _open_binary(file_path) as file:
+            while block := _read_chunk_to_boundary(file, chunk_size):
+                text = str(block, "utf-8", decode_errors)
+                yield encoding.decode_tokens_bytes(encoding.encode(text))
+
+    yield from _split_pieces(token_blocks(), max_tokens, overlap)
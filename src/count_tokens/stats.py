@@ -0,0 +1,264 @@
+"""Streaming distribution statistics of token counts in fixed memory.
+
+``TokenStats`` collects the count, total, minimum, maximum, percentiles, a
+histogram and the largest items of a stream of token counts (of files or of
+dataset records) without keeping the counts. Percentiles come from
+``QuantileSketch``, a mergeable sketch with log-spaced buckets (as in
+DDSketch) whose estimates are within a relative error of the true values.
+"""
+
+import csv
+import heapq
+import io
+import json
+import math
+from collections.abc import Iterable, Iterator
+
+from .count import _result_tokens
+
+# Percentiles reported in summaries
+PERCENTILES = (50, 90, 95, 99)
+# Number of largest items kept
+TOP_K = 100
+# Relative accuracy of the percentile estimates
+RELATIVE_ACCURACY = 0.01
+
+
+class QuantileSketch:
+    """Quantile sketch of non-negative values with relative accuracy.
+
+    Values fall into buckets whose bounds grow by a constant factor, so a
+    bucket's midpoint is within ``relative_accuracy`` of every value in it.
+    Counts up to 10**12 need fewer than 1400 buckets at 1% accuracy. Sketches
+    with the same accuracy merge by adding their buckets.
+
+    Args:
+        relative_accuracy: Relative error bound of the estimates
+    """
+
+    def __init__(self, relative_accuracy: float = RELATIVE_ACCURACY) -> None:
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(
+                f"relative_accuracy must be between 0 and 1, got {relative_accuracy}"
+            )
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.buckets: dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        """Add a value to the sketch."""
+        self.count += 1
+        if value <= 0:
+            self.zeros += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+
+    def merge(self, other: "QuantileSketch") -> None:
+        """Add the values of another sketch with the same accuracy."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Only sketches with the same accuracy can be merged")
+        self.count += other.count
+        self.zeros += other.zeros
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+
+    def quantile(self, q: float) -> float:
+        """Return an estimate of the ``q`` quantile (0 to 1), or 0 if empty."""
+        if not 0 <= q <= 1:
+            raise ValueError(f"q must be between 0 and 1, got {q}")
+        if not self.count:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if rank < seen:
+                return 2 * self._gamma**key / (self._gamma + 1)
+        return 2 * self._gamma ** max(self.buckets) / (self._gamma + 1)
+
+
+class TokenStats:
+    """Count, total, extremes, percentiles, histogram and top-K of token counts.
+
+    Memory does not depend on the number of items: percentiles use a
+    :class:`QuantileSketch`, the histogram has one bin per power of two and
+    the largest items are kept in a heap of ``top_k`` entries.
+
+    Args:
+        top_k: Number of largest items to keep
+        relative_accuracy: Relative error bound of the percentiles
+    """
+
+    def __init__(
+        self, top_k: int = TOP_K, relative_accuracy: float = RELATIVE_ACCURACY
+    ) -> None:
+        self.top_k = top_k
+        self.sketch = QuantileSketch(relative_accuracy)
+        self.count = 0
+        self.total = 0
+        self.min: int | None = None
+        self.max: int | None = None
+        self.errors = 0
+        self.skipped = 0
+        # Bin 0 holds zeros, bin k holds counts from 2**(k-1) to 2**k - 1
+        self.bins: list[int] = []
+        # Min-heap of (tokens, -position, name); ties keep the earlier item
+        self._top: list[tuple] = []
+
+    def add(self, tokens: int, name=None) -> None:
+        """Add the token count of an item, named for the top-K list."""
+        self.count += 1
+        self.total += tokens
+        self.min = tokens if self.min is None else min(self.min, tokens)
+        self.max = tokens if self.max is None else max(self.max, tokens)
+        self.sketch.add(tokens)
+        index = tokens.bit_length()
+        if index >= len(self.bins):
+            self.bins.extend([0] * (index + 1 - len(self.bins)))
+        self.bins[index] += 1
+        if self.top_k > 0:
+            entry = (tokens, -self.count, name)
+            if len(self._top) < self.top_k:
+                heapq.heappush(self._top, entry)
+            elif entry > self._top[0]:
+                heapq.heapreplace(self._top, entry)
+
+    def add_result(self, name: str, result) -> None:
+        """Add a per-file result of a directory count; errors and skips are tallied."""
+        if isinstance(result, str):
+            if result.startswith("Skipped: "):
+                self.skipped += 1
+            else:
+                self.errors += 1
+        else:
+            self.add(_result_tokens(result), name)
+
+    def track(self, counts: Iterable[int]) -> Iterator[int]:
+        """Add counts of items, named by their index, while passing them on."""
+        for index, tokens in enumerate(counts):
+            self.add(tokens, index)
+            yield tokens
+
+    def merge(self, other: "TokenStats") -> None:
+        """Add the items of other statistics, as if they came after these."""
+        # Positions of the other items continue after those of these items
+        top = [
+            (tokens, position - self.count, name)
+            for tokens, position, name in other._top
+        ]
+        self.count += other.count
+        self.total += other.total
+        self.errors += other.errors
+        self.skipped += other.skipped
+        for attribute, pick in (("min", min), ("max", max)):
+            values = [
+                value
+                for value in (getattr(self, attribute), getattr(other, attribute))
+                if value is not None
+            ]
+            setattr(self, attribute, pick(values) if values else None)
+        self.sketch.merge(other.sketch)
+        if len(other.bins) > len(self.bins):
+            self.bins.extend([0] * (len(other.bins) - len(self.bins)))
+        for index, count in enumerate(other.bins):
+            self.bins[index] += count
+        self._top = heapq.nlargest(self.top_k, self._top + top)
+        heapq.heapify(self._top)
+
+    def percentile(self, p: float) -> int:
+        """Return an estimate of the ``p``-th percentile, within min and max."""
+        if not self.count:
+            return 0
+        estimate = round(self.sketch.quantile(p / 100))
+        return max(self.min, min(self.max, estimate))
+
+    def histogram(self) -> list[dict]:
+        """Return the non-empty histogram bins with their bounds and counts."""
+        return [
+            {
+                "min": 0 if index == 0 else 1 << (index - 1),
+                "max": (1 << index) - 1,
+                "count": count,
+            }
+            for index, count in enumerate(self.bins)
+            if count
+        ]
+
+    def top(self) -> list[dict]:
+        """Return the largest items, largest first."""
+        return [
+            {"name": name, "tokens": tokens}
+            for tokens, _, name in sorted(self._top, reverse=True)
+        ]
+
+    def to_dict(self) -> dict:
+        """Return all statistics as a JSON-serializable dict."""
+        return {
+            "count": self.count,
+            "total": self.total,
+            "errors": self.errors,
+            "skipped": self.skipped,
+            "min": self.min or 0,
+            "max": self.max or 0,
+            "mean": self.total / self.count if self.count else 0.0,
+            "percentiles": {f"p{p}": self.percentile(p) for p in PERCENTILES},
+            "histogram": self.histogram(),
+            "top": self.top(),
+        }
+
+
+def format_stats(stats: TokenStats, output_format: str = "text", unit="files") -> str:
+    """Format statistics as text, JSON (``json`` or ``ndjson``) or CSV.
+
+    Args:
+        stats: The statistics to format
+        output_format: Format type (text, json, ndjson, csv)
+        unit: Name of the items counted, such as ``files`` or ``records``
+
+    Returns:
+        Formatted output string
+    """
+    summary = stats.to_dict()
+    if output_format in ("json", "ndjson"):
+        return json.dumps(summary, indent=2 if output_format == "json" else None)
+    scalars = {
+        key: value
+        for key, value in summary.items()
+        if key not in ("percentiles", "histogram", "top")
+    }
+    scalars["mean"] = round(scalars["mean"], 1)
+    scalars.update(summary["percentiles"])
+    if output_format == "csv":
+        output = io.StringIO(newline="")
+        writer = csv.writer(output, lineterminator="\n")
+        writer.writerow(["statistic", "value"])
+        writer.writerows(scalars.items())
+        return output.getvalue().rstrip("\n")
+    lines = [
+        f"{unit.capitalize()}: {summary['count']}"
+        + (
+            f" ({summary['errors']} errors, {summary['skipped']} skipped)"
+            if summary["errors"] or summary["skipped"]
+            else ""
+        ),
+        f"Total: {summary['total']} tokens",
+        f"Min / mean / max: {summary['min']} / {scalars['mean']} / {summary['max']}",
+        "Percentiles: "
+        + ", ".join(f"{key} {value}" for key, value in summary["percentiles"].items()),
+    ]
+    if summary["histogram"]:
+        largest = max(row["count"] for row in summary["histogram"])
+        lines.append("\nHistogram (tokens):")
+        for row in summary["histogram"]:
+            bar = "#" * max(1, round(40 * row["count"] / largest))
+            lines.append(f"{row['min']:>10} - {row['max']:<10} {row['count']:>8} {bar}")
+    if summary["top"]:
+        lines.append(f"\nLargest {unit}:")
+        lines.extend(f"{row['tokens']:>10}  {row['name']}" for row in summary["top"])
+    return "\n".join(lines)
@@ -0,0 +1,313 @@
+"""Single-pass directory traversal with pattern matching and ignore rules."""
+
+import fnmatch
+import os
+import pathlib
+import re
+from collections.abc import Iterable, Iterator
+
+# Directories that are never worth counting, excluded unless ignore rules are disabled
+DEFAULT_EXCLUDES = (
+    ".git/",
+    ".hg/",
+    ".svn/",
+    ".venv/",
+    "venv/",
+    "node_modules/",
+    "__pycache__/",
+    ".tox/",
+    ".mypy_cache/",
+    ".pytest_cache/",
+)
+# Name of the ignore files read in each directory
+IGNORE_FILE = ".gitignore"
+
+
+def _translate(pattern: str) -> str:
+    """Translate a gitignore-style glob to a regex over a ``/``-separated path."""
+    parts = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            parts.append("/.*")
+            i += 3
+        elif pattern[i] == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            parts.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and (end := pattern.find("]", i + 2)) != -1:
+            body = pattern[i + 1 : end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            parts.append(f"[{body}]")
+            i = end + 1
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(parts)
+
+
+class IgnoreRules:
+    """Ordered gitignore-style rules relative to one directory.
+
+    Supported syntax: ``#`` comments, ``!`` negation, a trailing ``/`` for
+    directories only, patterns with a ``/`` anchored to the rules' directory,
+    patterns without one matching a name at any depth, and ``*``, ``?``,
+    ``[...]`` and ``**`` wildcards.
+
+    Args:
+        patterns: Rule lines, in order (the last matching rule wins)
+    """
+
+    def __init__(self, patterns: Iterable[str]) -> None:
+        self.rules: list[tuple[re.Pattern, bool, bool]] = []
+        for line in patterns:
+            line = line.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate or line.startswith("\\"):
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            if "/" in line:
+                regex = _translate(line.lstrip("/"))
+            else:
+                regex = "(?:.*/)?" + _translate(line)
+            self.rules.append((re.compile(regex + r"\Z"), negate, dir_only))
+
+    @classmethod
+    def from_file(cls, path: str) -> "IgnoreRules":
+        """Read rules from an ignore file (empty rules if it cannot be read)."""
+        try:
+            with open(path, encoding="utf-8", errors="replace") as file:
+                return cls(file)
+        except OSError:
+            return cls([])
+
+    def match(self, relative_path: str, is_dir: bool) -> bool | None:
+        """Return whether a path is ignored, or None if no rule matches it.
+
+        Args:
+            relative_path: ``/``-separated path relative to the rules' directory
+            is_dir: Whether the path is a directory
+        """
+        ignored = None
+        for regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(relative_path):
+                ignored = not negate
+        return ignored
+
+
+def _ignored(
+    rules: list[tuple[str, IgnoreRules]], relative_path: str, is_dir: bool
+) -> bool:
+    """Check a path against rules from the base and its ancestors, deepest last."""
+    ignored = False
+    for prefix, ruleset in rules:
+        if prefix:
+            if not relative_path.startswith(prefix + "/"):
+                continue
+            path = relative_path[len(prefix) + 1 :]
+        else:
+            path = relative_path
+        matched = ruleset.match(path, is_dir)
+        if matched is not None:
+            ignored = matched
+    return ignored
+
+
+def _pattern_matcher(file_patterns: list[str], recursive: bool):
+    """Combine file patterns into one matcher of (name, relative path)."""
+    names = [p for p in file_patterns if "/" not in p]
+    paths = [p for p in file_patterns if "/" in p]
+    name_regex = (
+        re.compile("|".join(fnmatch.translate(p) for p in names)) if names else None
+    )
+    path_regex = None
+    if paths:
+        prefix = "(?:.*/)?" if recursive else ""
+        path_regex = re.compile(
+            "|".join(prefix + _translate(p.lstrip("/")) + r"\Z" for p in paths)
+        )
+
+    def matches(name: str, relative_path: str) -> bool:
+        return bool(
+            (name_regex and name_regex.match(name))
+            or (path_regex and path_regex.match(relative_path))
+        )
+
+    return matches
+
+
+def _directory_matcher(file_patterns: list[str], recursive: bool):
+    """Return a check of whether a directory may hold files matching the patterns.
+
+    Recursive walks enter every directory. Otherwise only directories that a
+    pattern with ``/`` can still match below are entered: ``sub`` for
+    ``sub/*.txt``, and every directory under ``docs`` for ``docs/**/*.md``.
+    """
+    if recursive:
+        return lambda relative_dir: True
+    prefixes = []
+    for pattern in file_patterns:
+        if "/" in pattern:
+            parts = pattern.lstrip("/").split("/")[:-1]
+            prefixes.append(
+                [
+                    None if part == "**" else re.compile(_translate(part) + r"\Z")
+                    for part in parts
+                ]
+            )
+
+    def may_match(relative_dir: str) -> bool:
+        parts = relative_dir.split("/")
+        for prefix in prefixes:
+            for index, part in enumerate(parts):
+                if index == len(prefix):
+                    break
+                if prefix[index] is None:
+                    return True
+                if not prefix[index].match(part):
+                    break
+            else:
+                return True
+        return False
+
+    return may_match
+
+
+def _file_id(path: str, stat: os.stat_result):
+    """Return an identity of a file: device and inode, or the resolved path."""
+    if stat.st_ino:
+        return stat.st_dev, stat.st_ino
+    return os.path.realpath(path)
+
+
+def _scan(directory: str) -> tuple[list[os.DirEntry], object] | None:
+    """Return the entries of a directory in name order and its identity."""
+    try:
+        with os.scandir(directory) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+        return entries, _file_id(directory, os.stat(directory))
+    except OSError:
+        return None
+
+
+def _entry_id(entry: os.DirEntry) -> object | None:
+    """Return the identity of a file entry, or None if it cannot be read."""
+    try:
+        return _file_id(entry.path, entry.stat())
+    except OSError:
+        return None
+
+
+def _is_dir(entry: os.DirEntry) -> bool:
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
+def _add_ignore_file(
+    rules: list[tuple[str, IgnoreRules]],
+    directory: str,
+    relative_dir: str,
+    entries: list[os.DirEntry],
+) -> list[tuple[str, IgnoreRules]]:
+    """Return the rules extended with the directory's ignore file, if it has one."""
+    if not any(entry.name == IGNORE_FILE for entry in entries):
+        return rules
+    ignore = IgnoreRules.from_file(os.path.join(directory, IGNORE_FILE))
+    return [*rules, (relative_dir, ignore)]
+
+
+def walk_files(
+    base_path: str | pathlib.Path,
+    file_patterns: list[str],
+    recursive: bool = False,
+    exclude: Iterable[str] = DEFAULT_EXCLUDES,
+    use_ignore_files: bool = True,
+    directories: list[str] | None = None,
+    follow_symlinks: bool = False,
+) -> Iterator[str]:
+    """Yield files matching any of the patterns, in a single directory traversal.
+
+    Directories are scanned with ``os.scandir`` in name order, files before
+    subdirectories, so the order is deterministic. All patterns are matched
+    in the same pass; a file reached twice (through several patterns,
+    symlinks or hard links) is yielded once, deduplicated by device and inode,
+    or by resolved path where inodes are not available. Excluded and ignored
+    directories are pruned without being entered. Files are yielded as soon
+    as they are found, so counting can start while the walk is running.
+    Symlinks to directories are not entered unless ``follow_symlinks`` is set,
+    as with ``pathlib`` globbing; symlinks to files are matched like files.
+
+    Args:
+        base_path: Directory to scan
+        file_patterns: Glob patterns; patterns without ``/`` match file names,
+            patterns with ``/`` match paths relative to ``base_path``
+        recursive: Whether to descend into subdirectories; without it, only
+            subdirectories that a pattern with ``/`` can match are entered
+        exclude: gitignore-style rules for paths to skip (default: VCS,
+            virtualenv and cache directories)
+        use_ignore_files: Whether to apply ``.gitignore`` files found in the tree
+        directories: If given, the path of every directory scanned is appended
+            to this list
+        follow_symlinks: Whether to descend into symlinks to directories
+
+    Yields:
+        Paths of matching files
+    """
+    base = str(pathlib.Path(base_path))
+    matches = _pattern_matcher(file_patterns, recursive)
+    may_match = _directory_matcher(file_patterns, recursive)
+    base_rules = [("", IgnoreRules(exclude))]
+    seen: set = set()
+    visited_dirs: set = set()
+    # Stack of (directory, path relative to base, rules that apply to it)
+    stack = [(base, "", base_rules)]
+    while stack:
+        directory, relative_dir, rules = stack.pop()
+        scanned = _scan(directory)
+        # Skip unreadable directories, symlink loops and directories reached twice
+        if scanned is None or scanned[1] in visited_dirs:
+            continue
+        entries, directory_id = scanned
+        visited_dirs.add(directory_id)
+        if directories is not None:
+            directories.append(directory)
+        if use_ignore_files:
+            rules = _add_ignore_file(rules, directory, relative_dir, entries)
+
+        subdirectories = []
+        for entry in entries:
+            relative_path = (
+                f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+            )
+            if _is_dir(entry):
+                if (
+                    (follow_symlinks or not entry.is_symlink())
+                    and may_match(relative_path)
+                    and not _ignored(rules, relative_path, True)
+                ):
+                    subdirectories.append((entry.path, relative_path, rules))
+                continue
+            if not matches(entry.name, relative_path) or _ignored(
+                rules, relative_path, False
+            ):
+                continue
+            file_id = _entry_id(entry)
+            if file_id is not None and file_id not in seen:
+                seen.add(file_id)
+                yield relative_path if base == "." else entry.path
+        stack.extend(reversed(subdirectories))
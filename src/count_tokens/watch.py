@@ -0,0 +1,320 @@
+"""Watch a directory and keep its per-file token counts and total up to date.
+
+After one full scan with ``count_tokens_in_directory``, the directory is
+watched with inotify on Linux, or polled elsewhere. Each burst of changes is
+debounced, the tree is walked again comparing file sizes and modification
+times, and only added or changed files are counted again.
+"""
+
+import ctypes
+import ctypes.util
+import functools
+import json
+import os
+import select
+import struct
+import sys
+import time
+from collections.abc import Iterable, Iterator
+
+from .count import (
+    CHARACTERS_PER_TOKEN,
+    TOKENS_PER_WORD,
+    _count_file_safe,
+    _format_output,
+    _resolve_profile,
+    _result_tokens,
+    count_tokens_in_directory,
+)
+from .walk import DEFAULT_EXCLUDES, walk_files
+
+# Seconds without further events before a burst of changes is processed
+DEBOUNCE = 0.2
+# Seconds between scans when inotify is not available
+POLL_INTERVAL = 1.0
+
+# inotify event masks (see inotify(7))
+_IN_MODIFY = 0x002
+_IN_ATTRIB = 0x004
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_DELETE_SELF = 0x400
+_IN_MOVE_SELF = 0x800
+_IN_IGNORED = 0x8000
+_IN_EVENTS = (
+    _IN_MODIFY
+    | _IN_ATTRIB
+    | _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_DELETE_SELF
+    | _IN_MOVE_SELF
+)
+# struct inotify_event without the trailing name
+_INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class _Inotify:
+    """Directory watches with Linux inotify, called through ctypes."""
+
+    def __init__(self) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        # Watch descriptor -> directory
+        self.watches: dict[int, str] = {}
+
+    def watch(self, directories: Iterable[str]) -> None:
+        """Watch directories that are not watched yet."""
+        watched = set(self.watches.values())
+        for directory in directories:
+            if directory not in watched:
+                wd = self._add_watch(self.fd, os.fsencode(directory), _IN_EVENTS)
+                if wd >= 0:
+                    self.watches[wd] = directory
+
+    def wait(self, timeout: float | None) -> bool:
+        """Wait up to ``timeout`` seconds (forever if None) for events and consume them."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _INOTIFY_EVENT.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT.size + length
+            # The kernel dropped the watch (directory deleted or unmounted)
+            if mask & _IN_IGNORED:
+                self.watches.pop(wd, None)
+        return True
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class _Poller:
+    """Fallback that reports a possible change every ``interval`` seconds."""
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+
+    def watch(self, directories: Iterable[str]) -> None:
+        pass
+
+    def wait(self, timeout: float | None) -> bool:
+        # A poll tick may have changes; changes within a tick are one burst
+        if timeout is None:
+            time.sleep(self.interval)
+            return True
+        return False
+
+    def close(self) -> None:
+        pass
+
+
+def _notifier(use_inotify: bool | None, poll_interval: float):
+    """Return inotify watches when available (or required), else a poller."""
+    if use_inotify is False:
+        return _Poller(poll_interval)
+    try:
+        return _Inotify()
+    except (OSError, AttributeError):
+        if use_inotify:
+            raise
+        return _Poller(poll_interval)
+
+
+def _snapshot(
+    directory_path: str,
+    file_patterns: list[str],
+    recursive: bool,
+    exclude: Iterable[str],
+    use_ignore_files: bool,
+    directories: list[str],
+) -> dict[str, tuple[int, int]]:
+    """Return the size and mtime of every matching file, by path."""
+    snapshot = {}
+    for file_path in walk_files(
+        directory_path, file_patterns, recursive, exclude, use_ignore_files, directories
+    ):
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            continue
+        snapshot[file_path] = (stat.st_size, stat.st_mtime_ns)
+    return snapshot
+
+
+def watch(
+    directory_path: str,
+    file_patterns: list[str] | None = None,
+    recursive: bool = False,
+    encoding_name: str = "cl100k_base",
+    use_streaming: bool = False,
+    chunk_size: int = 1024 * 1024,
+    approximate: str | None = None,
+    tokens_per_word: float = TOKENS_PER_WORD,
+    characters_per_token: float = CHARACTERS_PER_TOKEN,
+    decode_errors: str = "latin-1",
+    profile: dict | str | None = None,
+    workers: int = 1,
+    exclude: Iterable[str] = DEFAULT_EXCLUDES,
+    use_ignore_files: bool = True,
+    debounce: float = DEBOUNCE,
+    poll_interval: float = POLL_INTERVAL,
+    use_inotify: bool | None = None,
+) -> Iterator[dict]:
+    """Count tokens in a directory, then yield an event for every change.
+
+    The first event is ``{"event": "scan", "results": ..., "total": ...}``
+    with the results of ``count_tokens_in_directory``. After that, each
+    added, changed or removed file yields ``{"event": "added" | "changed",
+    "file": ..., "tokens": ..., "total": ...}`` or ``{"event": "removed",
+    "file": ..., "total": ...}``, where ``total`` is the new total. The
+    generator runs until it is closed.
+
+    Args:
+        directory_path: Path to directory to watch
+        file_patterns: List of glob patterns to match files (default: ["*.txt", "*.py", "*.md"])
+        recursive: Whether to watch subdirectories
+        encoding_name: The name of the encoding to use
+        use_streaming: Whether to use streaming for large files
+        chunk_size: Size of chunks to read in bytes (for streaming)
+        approximate: Approximate the number of tokens without tokenizing
+        tokens_per_word: The number of tokens per word for approximation
+        characters_per_token: The number of characters per token for approximation
+        decode_errors: Policy for chunks that are not valid utf-8 when streaming
+        profile: Calibration (or path of a calibration profile) for approximations
+        workers: Number of worker processes for the initial scan
+        exclude: gitignore-style rules for paths to skip
+        use_ignore_files: Whether to apply ``.gitignore`` files found in the tree
+        debounce: Seconds without events before a burst of changes is counted
+        poll_interval: Seconds between scans when polling
+        use_inotify: Use inotify (True), polling (False) or inotify when available (None)
+
+    Yields:
+        Scan and change events
+    """
+    if file_patterns is None:
+        file_patterns = ["*.txt", "*.py", "*.md"]
+    walk_options = (file_patterns, recursive, exclude, use_ignore_files)
+    profile = _resolve_profile(profile, encoding_name)
+    count_file = functools.partial(
+        _count_file_safe,
+        encoding_name=encoding_name,
+        use_streaming=use_streaming,
+        chunk_size=chunk_size,
+        approximate=approximate,
+        tokens_per_word=tokens_per_word,
+        characters_per_token=characters_per_token,
+        decode_errors=decode_errors,
+        profile=profile,
+    )
+    notifier = _notifier(use_inotify, poll_interval)
+    try:
+        # Snapshot before counting, so files changed during the scan are recounted
+        directories: list[str] = []
+        snapshot = _snapshot(directory_path, *walk_options, directories)
+        notifier.watch(directories)
+        results = count_tokens_in_directory(
+            directory_path,
+            file_patterns,
+            recursive,
+            encoding_name,
+            use_streaming=use_streaming,
+            chunk_size=chunk_size,
+            approximate=approximate,
+            tokens_per_word=tokens_per_word,
+            characters_per_token=characters_per_token,
+            workers=workers,
+            decode_errors=decode_errors,
+            profile=profile,
+            exclude=exclude,
+            use_ignore_files=use_ignore_files,
+        )
+        total = sum(_result_tokens(count) for count in results.values())
+        yield {"event": "scan", "results": dict(results), "total": total}
+
+        while True:
+            if not notifier.wait(None):
+                continue
+            while notifier.wait(debounce):
+                pass
+            directories = []
+            current = _snapshot(directory_path, *walk_options, directories)
+            notifier.watch(directories)
+            for file_path in sorted(snapshot.keys() - current.keys()):
+                total -= _result_tokens(results.pop(file_path, 0))
+                yield {"event": "removed", "file": file_path, "total": total}
+            for file_path, state in current.items():
+                if snapshot.get(file_path) == state:
+                    continue
+                event = "changed" if file_path in results else "added"
+                tokens = count_file(file_path)
+                total += _result_tokens(tokens) - _result_tokens(
+                    results.get(file_path, 0)
+                )
+                results[file_path] = tokens
+                yield {
+                    "event": event,
+                    "file": file_path,
+                    "tokens": tokens,
+                    "total": total,
+                }
+            snapshot = current
+    finally:
+        notifier.close()
+
+
+def print_events(
+    events: Iterable[dict], output_format: str = "text", file=None
+) -> None:
+    """Print watch events as NDJSON (``json`` or ``ndjson``) or as text.
+
+    In text mode a terminal shows a live view of all counts, redrawn on every
+    event; other outputs get the initial counts and then one line per change.
+
+    Args:
+        events: Events yielded by :func:`watch`
+        output_format: ``text``, ``json`` or ``ndjson``
+        file: Output stream (default: stdout)
+    """
+    file = file or sys.stdout
+    live = output_format == "text" and file.isatty()
+    results: dict = {}
+    for event in events:
+        if output_format in ("json", "ndjson"):
+            print(json.dumps(event), file=file, flush=True)
+            continue
+        if event["event"] == "scan":
+            results = dict(event["results"])
+        elif event["event"] == "removed":
+            results.pop(event["file"], None)
+        else:
+            results[event["file"]] = event["tokens"]
+        if live:
+            # Clear the screen and redraw from the top left
+            print("\x1b[H\x1b[2J" + _format_output(results), file=file, flush=True)
+        elif event["event"] == "scan":
+            print(_format_output(results), file=file, flush=True)
+        else:
+            tokens = (
+                "" if event["event"] == "removed" else f" {event['tokens']} tokens,"
+            )
+            print(
+                f"{event['event']}: {event['file']}:{tokens} total {event['total']}",
+                file=file,
+                flush=True,
+            )
@@ -0,0 +1,187 @@
+import asyncio
+import concurrent.futures
+import gzip
+import zipfile
+
+import pytest
+
+from count_tokens.aio import acount, acount_directory, acount_file
+from count_tokens.count import (
+    count,
+    count_tokens_in_directory,
+    count_tokens_in_file,
+    count_tokens_in_large_file,
+)
+
+
+@pytest.fixture
+def large_file(tmp_path):
+    """Create a file of many newline-aligned chunks."""
+    path = tmp_path / "large.txt"
+    path.write_text("".join(f"line {i}: zażółć gęślą jaźń\n" for i in range(5000)))
+    return path
+
+
+class CountingExecutor(concurrent.futures.ThreadPoolExecutor):
+    """Thread pool that counts submitted calls."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.submitted = 0
+
+    def submit(self, *args, **kwargs):
+        self.submitted += 1
+        return super().submit(*args, **kwargs)
+
+
+class TestAcountFile:
+    def test_matches_sync_count(self, large_file):
+        """Test that the async count equals count_tokens_in_file."""
+        result = asyncio.run(acount_file(str(large_file)))
+
+        assert result == count_tokens_in_file(str(large_file))
+
+    def test_streaming_matches_sync_count(self, large_file):
+        """Test that chunked async counting equals count_tokens_in_large_file."""
+        result = asyncio.run(
+            acount_file(str(large_file), use_streaming=True, chunk_size=4096)
+        )
+
+        assert result == count_tokens_in_large_file(str(large_file), chunk_size=4096)
+
+    def test_compressed_file(self, tmp_path):
+        """Test that compressed files are read as by count_tokens_in_file."""
+        path = tmp_path / "notes.txt.gz"
+        path.write_bytes(gzip.compress("zażółć gęślą jaźń\n".encode()))
+
+        result = asyncio.run(acount_file(str(path), decode_errors="strict"))
+
+        assert result == count_tokens_in_file(str(path), decode_errors="strict")
+
+    def test_approximation(self, large_file):
+        """Test that approximations run on the executor too."""
+        result = asyncio.run(acount_file(str(large_file), approximate="w"))
+
+        assert result == count_tokens_in_file(str(large_file), approximate="w")
+
+    def test_event_loop_keeps_running(self, large_file):
+        """Test that other coroutines run while a file is being counted."""
+
+        async def main():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0)
+
+            task = asyncio.create_task(ticker())
+            await acount_file(str(large_file), use_streaming=True, chunk_size=1024)
+            task.cancel()
+            return ticks
+
+        assert asyncio.run(main()) > 1
+
+    def test_cancellation_stops_at_chunk_boundary(self, large_file):
+        """Test that a cancelled count does not submit further chunks."""
+        executor = CountingExecutor(max_workers=1)
+
+        async def main():
+            task = asyncio.create_task(
+                acount_file(
+                    str(large_file),
+                    use_streaming=True,
+                    chunk_size=256,
+                    executor=executor,
+                )
+            )
+
+            async def started():
+                while executor.submitted < 3:
+                    if task.done():
+                        task.result()
+                    await asyncio.sleep(0)
+
+            await asyncio.wait_for(started(), timeout=10)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            return executor.submitted
+
+        submitted = asyncio.run(main())
+        executor.shutdown()
+
+        assert submitted < large_file.stat().st_size // 256
+
+
+class TestAcountDirectory:
+    def test_matches_sync_count_in_order(self, tmp_path):
+        """Test that the async directory count matches the sync one, in order."""
+        for i in range(20):
+            (tmp_path / f"file_{i:02d}.txt").write_text(f"file number {i}\n" * i)
+        (tmp_path / "bad.txt").write_bytes(b"\xff\xfe invalid utf-8")
+
+        result = asyncio.run(acount_directory(str(tmp_path), ["*.txt"], concurrency=3))
+
+        expected = count_tokens_in_directory(str(tmp_path), ["*.txt"])
+        assert result == expected
+        assert list(result) == list(expected)
+        assert result[str(tmp_path / "bad.txt")].startswith("Error:")
+
+    def test_matches_sync_options(self, tmp_path):
+        """Test that binary, compressed and archived files give the sync results."""
+        (tmp_path / "a.txt").write_text("plain text\n")
+        (tmp_path / "image.txt").write_bytes(b"\x89PNG\x00\x00binary")
+        (tmp_path / "notes.txt.gz").write_bytes(gzip.compress(b"compressed text\n"))
+        with zipfile.ZipFile(tmp_path / "bundle.zip", "w") as archive:
+            archive.writestr("inner.txt", "archived text\n")
+        (tmp_path / ".git").mkdir()
+        (tmp_path / ".git" / "HEAD.txt").write_text("excluded\n")
+        options = {
+            "file_patterns": ["*.txt"],
+            "recursive": True,
+            "encoding_name": ["cl100k_base", "p50k_base"],
+            "archives": True,
+            "max_tokens": 2,
+        }
+
+        result = asyncio.run(acount_directory(str(tmp_path), **options))
+
+        expected = count_tokens_in_directory(str(tmp_path), **options)
+        assert result == expected
+        assert set(result["cl100k_base"]) == set(expected["cl100k_base"])
+        assert str(tmp_path / ".git" / "HEAD.txt") not in result["cl100k_base"]
+
+
+class TestAcount:
+    def test_text(self):
+        """Test that text mode gives the sync count."""
+        assert asyncio.run(acount(text="Count these tokens")) == count(
+            text="Count these tokens"
+        )
+
+    def test_max_tokens(self, large_file):
+        """Test that results over max_tokens are flagged as in count."""
+        result = asyncio.run(acount(file=str(large_file), max_tokens=10))
+
+        assert result["limit_exceeded"] is True
+        assert result["max_tokens"] == 10
+
+    def test_file_options(self, tmp_path):
+        """Test that file mode forwards decode_errors and encodings as count does."""
+        path = tmp_path / "mixed.txt"
+        path.write_bytes(b"caf\xe9 au lait\n")
+        options = {
+            "file": str(path),
+            "encoding": ["cl100k_base", "p50k_base"],
+            "use_streaming": True,
+            "decode_errors": "replace",
+        }
+
+        assert asyncio.run(acount(**options)) == count(**options)
+
+    def test_requires_input(self):
+        """Test that one of text, file or directory is required."""
+        with pytest.raises(ValueError, match="Either text, file, or directory"):
+            asyncio.run(acount())
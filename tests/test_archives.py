@@ -0,0 +1,152 @@
+import bz2
+import gzip
+import lzma
+import tarfile
+import zipfile
+
+import pytest
+
+from count_tokens.archives import is_archive, is_packed, iter_members, open_packed
+from count_tokens.count import (
+    count_tokens_in_directory,
+    count_tokens_in_file,
+    count_tokens_in_large_file,
+    count_tokens_in_string,
+)
+
+TEXTS = {
+    "notes.txt": "Some notes about the project.\n" * 50,
+    "docs/guide.md": "# Guide\n\nRead this first, zażółć gęślą jaźń.\n" * 40,
+    "image.png": "not text",
+}
+
+
+@pytest.fixture
+def packed(tmp_path):
+    """Create compressed copies of a file and tar and zip archives of all texts."""
+    data = TEXTS["notes.txt"].encode()
+    (tmp_path / "plain.txt").write_bytes(data)
+    (tmp_path / "notes.txt.gz").write_bytes(gzip.compress(data))
+    (tmp_path / "notes.txt.bz2").write_bytes(bz2.compress(data))
+    (tmp_path / "notes.txt.xz").write_bytes(lzma.compress(data))
+    source = tmp_path / "source"
+    for name, text in TEXTS.items():
+        (source / name).parent.mkdir(parents=True, exist_ok=True)
+        (source / name).write_text(text)
+    with tarfile.open(tmp_path / "bundle.tar.gz", "w:gz") as tar:
+        for name in TEXTS:
+            tar.add(source / name, arcname=name)
+    with zipfile.ZipFile(tmp_path / "bundle.zip", "w") as archive:
+        for name in TEXTS:
+            archive.write(source / name, arcname=name)
+    return tmp_path
+
+
+class TestOpenPacked:
+    @pytest.mark.parametrize("suffix", [".gz", ".bz2", ".xz"])
+    def test_compressed_files_count_like_plain(self, packed, suffix):
+        """Test that compressed files are counted like their content."""
+        path = str(packed / f"notes.txt{suffix}")
+        expected = count_tokens_in_string(TEXTS["notes.txt"])
+
+        assert count_tokens_in_file(path) == expected
+        assert count_tokens_in_large_file(path, chunk_size=64, workers=4) == expected
+
+    def test_zstandard(self, tmp_path):
+        """Test that .zst files are read with the optional zstandard package."""
+        zstandard = pytest.importorskip("zstandard")
+        path = tmp_path / "notes.txt.zst"
+        path.write_bytes(zstandard.compress(TEXTS["notes.txt"].encode()))
+
+        assert count_tokens_in_file(str(path)) == count_tokens_in_string(
+            TEXTS["notes.txt"]
+        )
+
+    @pytest.mark.parametrize("archive", ["bundle.tar.gz", "bundle.zip"])
+    def test_member_path(self, packed, archive):
+        """Test that an archive::member path reads the member."""
+        path = f"{packed / archive}::docs/guide.md"
+
+        with open_packed(path) as stream:
+            assert stream.read().decode() == TEXTS["docs/guide.md"]
+        with pytest.raises(FileNotFoundError), open_packed(f"{packed / archive}::x"):
+            pass
+
+    def test_archive_is_not_a_file(self, packed):
+        """Test that an archive cannot be opened as a single file."""
+        assert is_archive("bundle.tar.gz") and is_archive("a.TGZ")
+        assert not is_archive("notes.txt.gz")
+        with pytest.raises(ValueError), open_packed(str(packed / "bundle.zip")):
+            pass
+
+    def test_separator_needs_an_archive(self, packed):
+        """Test that ``::`` only names a member after an existing archive."""
+        odd = packed / "notes::draft.txt"
+        odd.write_text("A file with a separator in its name.\n")
+
+        assert is_packed(f"{packed / 'bundle.zip'}::notes.txt")
+        assert not is_packed(f"{packed / 'missing.zip'}::notes.txt")
+        assert not is_packed(str(odd))
+        assert count_tokens_in_file(str(odd)) == count_tokens_in_string(odd.read_text())
+
+
+class TestArchivesInDirectory:
+    def test_members_match_patterns(self, packed):
+        """Test that matching members are read in archive order, in a single pass."""
+        members = [
+            path
+            for path, _ in iter_members(
+                str(packed / "bundle.tar.gz"), ["*.txt", "*.md"]
+            )
+        ]
+
+        assert members == [
+            f"{packed / 'bundle.tar.gz'}::notes.txt",
+            f"{packed / 'bundle.tar.gz'}::docs/guide.md",
+        ]
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_directory_counts_compressed_files_and_members(self, packed, workers):
+        """Test that --archives counts compressed files and archive members."""
+        results = count_tokens_in_directory(
+            str(packed), ["*.txt", "*.md"], archives=True, workers=workers
+        )
+        notes = count_tokens_in_string(TEXTS["notes.txt"])
+        guide = count_tokens_in_string(TEXTS["docs/guide.md"])
+
+        expected = {
+            f"{packed / 'bundle.tar.gz'}::notes.txt": notes,
+            f"{packed / 'bundle.tar.gz'}::docs/guide.md": guide,
+            f"{packed / 'bundle.zip'}::notes.txt": notes,
+            f"{packed / 'bundle.zip'}::docs/guide.md": guide,
+            str(packed / "notes.txt.bz2"): notes,
+            str(packed / "notes.txt.gz"): notes,
+            str(packed / "notes.txt.xz"): notes,
+            str(packed / "plain.txt"): notes,
+        }
+        assert results == expected
+        assert list(results) == list(expected)
+
+    def test_without_archives_only_plain_files(self, packed):
+        """Test that compressed files and archives are only read with archives."""
+        results = count_tokens_in_directory(str(packed), ["*.txt"])
+
+        assert list(results) == [str(packed / "plain.txt")]
+
+    @pytest.mark.parametrize("include_binary", [False, True])
+    def test_archive_without_archives_is_skipped(self, packed, include_binary):
+        """Test that an archive matched without archives is skipped, not an error."""
+        results = count_tokens_in_directory(
+            str(packed), ["*"], skip_binary=not include_binary
+        )
+
+        assert results[str(packed / "bundle.zip")].startswith("Skipped: archive")
+        assert results[str(packed / "bundle.tar.gz")].startswith("Skipped: archive")
+
+    def test_unreadable_archive_is_an_error(self, packed):
+        """Test that a corrupt archive gives an error result, not an exception."""
+        (packed / "broken.tar.gz").write_bytes(b"not gzip data")
+
+        results = count_tokens_in_directory(str(packed), ["*.txt"], archives=True)
+
+        assert results[str(packed / "broken.tar.gz")].startswith("Error:")
@@ -0,0 +1,165 @@
+import os
+from unittest.mock import patch
+
+import pytest
+
+from count_tokens.cache import CountCache, cache_params, default_cache_dir
+from count_tokens.count import _count_file_safe, count_tokens_in_directory
+
+PARAMS = cache_params(encoding="cl100k_base", approximate=None)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """Provide a cache backed by a temporary database."""
+    with CountCache(str(tmp_path / "cache" / "counts.sqlite3")) as cache:
+        yield cache
+
+
+@pytest.fixture
+def text_file(tmp_path):
+    """Provide a small text file."""
+    path = tmp_path / "doc.txt"
+    path.write_text("Some text to count.\n")
+    return path
+
+
+class TestCountCache:
+    def test_miss_then_hit(self, cache, text_file):
+        """Test that a stored count is returned on the next lookup."""
+        assert cache.get(str(text_file), PARAMS) is None
+        cache.put(str(text_file), PARAMS, 5)
+
+        assert cache.get(str(text_file), PARAMS) == 5
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_touched_file_with_same_content_hits_by_hash(self, cache, text_file):
+        """Test that a changed mtime falls back to the content hash."""
+        cache.get(str(text_file), PARAMS)
+        cache.put(str(text_file), PARAMS, 5)
+        stat = text_file.stat()
+        os.utime(text_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        assert cache.get(str(text_file), PARAMS) == 5
+
+    def test_touched_file_is_left_to_the_counter(self, cache, text_file):
+        """Test that without hash_changed a touched file is compared elsewhere."""
+        cache.put(str(text_file), PARAMS, 5, digest="stored")
+        stat = text_file.stat()
+        os.utime(text_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        with patch("count_tokens.cache.file_digest") as digest:
+            assert cache.get(str(text_file), PARAMS, hash_changed=False) is None
+            assert cache.stored_digest(str(text_file), PARAMS) == "stored"
+            assert cache.reuse(str(text_file), PARAMS) == 5
+
+        digest.assert_not_called()
+        assert (cache.hits, cache.misses) == (1, 0)
+        assert cache.get(str(text_file), PARAMS) == 5
+
+    def test_unknown_path_is_not_hashed(self, cache, text_file):
+        """Test that a miss on a new path does not read the file."""
+        with patch("count_tokens.cache.file_digest") as digest:
+            assert cache.get(str(text_file), PARAMS) is None
+            cache.put(str(text_file), PARAMS, 5, digest="known")
+
+        digest.assert_not_called()
+        stat = text_file.stat()
+        os.utime(text_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        with patch("count_tokens.cache.file_digest", return_value="known"):
+            assert cache.get(str(text_file), PARAMS) == 5
+
+    def test_changed_content_misses(self, cache, text_file):
+        """Test that edited files are counted again."""
+        cache.get(str(text_file), PARAMS)
+        cache.put(str(text_file), PARAMS, 5)
+        text_file.write_text("Different and longer content to count.\n")
+
+        assert cache.get(str(text_file), PARAMS) is None
+
+    def test_params_are_separated(self, cache, text_file):
+        """Test that counts for other encodings or approximations are not reused."""
+        cache.put(str(text_file), PARAMS, 5)
+
+        other = cache_params(encoding="cl100k_base", approximate="w")
+        assert cache.get(str(text_file), other) is None
+
+    def test_evict_keeps_most_recently_used(self, tmp_path):
+        """Test that eviction removes the least recently used entries."""
+        files = []
+        for i in range(3):
+            path = tmp_path / f"f{i}.txt"
+            path.write_text(f"file {i}\n")
+            files.append(str(path))
+
+        with CountCache(str(tmp_path / "c.sqlite3"), max_entries=2) as cache:
+            for i, path in enumerate(files):
+                cache.put(path, PARAMS, i)
+
+        with CountCache(str(tmp_path / "c.sqlite3")) as cache:
+            assert cache.get(files[0], PARAMS) is None
+            assert cache.get(files[2], PARAMS) == 2
+
+    def test_default_cache_dir_uses_xdg(self, monkeypatch, tmp_path):
+        """Test that XDG_CACHE_HOME is honoured."""
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+
+        assert default_cache_dir() == tmp_path / "count_tokens"
+
+
+class TestDirectoryWithCache:
+    def test_second_run_is_served_from_cache(self, cache, tmp_path):
+        """Test that a rescan of an unchanged directory only hits the cache."""
+        (tmp_path / "a.txt").write_text("alpha beta\n")
+        (tmp_path / "b.txt").write_text("gamma delta epsilon\n")
+
+        first = count_tokens_in_directory(str(tmp_path), ["*.txt"], cache=cache)
+        second = count_tokens_in_directory(str(tmp_path), ["*.txt"], cache=cache)
+
+        assert second == first
+        assert (cache.hits, cache.misses) == (2, 2)
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_touched_files_hit_with_digest_from_workers(self, cache, tmp_path, workers):
+        """Test that digests taken where files are counted serve touched files."""
+        for name in ("a.txt", "b.txt"):
+            (tmp_path / name).write_text(f"{name} has some words\n")
+        first = count_tokens_in_directory(str(tmp_path), cache=cache, workers=workers)
+        for path in tmp_path.glob("*.txt"):
+            stat = path.stat()
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        second = count_tokens_in_directory(str(tmp_path), cache=cache, workers=workers)
+
+        assert second == first
+        assert (cache.hits, cache.misses) == (2, 2)
+
+    def test_touched_files_are_compared_where_counted(self, cache, tmp_path):
+        """Test that only touched files whose content changed are counted again."""
+        for name in ("a.txt", "b.txt"):
+            (tmp_path / name).write_text(f"{name} has some words\n")
+        count_tokens_in_directory(str(tmp_path), cache=cache)
+        for path in tmp_path.glob("*.txt"):
+            stat = path.stat()
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        (tmp_path / "b.txt").write_text("b.txt has other words now\n")
+
+        with patch(
+            "count_tokens.count._count_file_safe", wraps=_count_file_safe
+        ) as count_file:
+            second = count_tokens_in_directory(str(tmp_path), cache=cache)
+
+        assert [call.args[0] for call in count_file.call_args_list] == [
+            str(tmp_path / "b.txt")
+        ]
+        assert second == count_tokens_in_directory(str(tmp_path))
+        assert (cache.hits, cache.misses) == (1, 3)
+
+    def test_errors_are_not_cached(self, cache, tmp_path):
+        """Test that failed files are retried on the next run."""
+        (tmp_path / "bad.txt").write_bytes(b"\xff\xfe\x00invalid")
+
+        count_tokens_in_directory(str(tmp_path), ["*.txt"], cache=cache)
+        count_tokens_in_directory(str(tmp_path), ["*.txt"], cache=cache)
+
+        assert cache.hits == 0
@@ -0,0 +1,113 @@
+import json
+
+import pytest
+
+from count_tokens.calibration import (
+    calibrate,
+    format_calibration,
+    load_profile,
+    save_profile,
+)
+from count_tokens.count import count, count_tokens_in_directory, count_tokens_in_file
+
+
+@pytest.fixture
+def project(tmp_path):
+    """Create a directory with prose and code files of different token densities."""
+    prose = "The quick brown fox jumps over the lazy dog.\n" * 50
+    code = "def f(x):\n    return {'a': [x, x + 1]}\n" * 50
+    for i in range(3):
+        (tmp_path / f"doc{i}.txt").write_text(prose * (i + 1))
+        (tmp_path / f"mod{i}.py").write_text(code * (i + 1))
+    return tmp_path
+
+
+class TestCalibrate:
+    def test_fits_ratios_per_extension(self, project):
+        """Test that the fitted ratios reproduce the exact totals per extension."""
+        calibration = calibrate(str(project), ["*.txt", "*.py"])
+
+        for extension, pattern in [(".txt", "*.txt"), (".py", "*.py")]:
+            fit = calibration["extensions"][extension]
+            exact = count_tokens_in_directory(str(project), [pattern])
+            assert fit["files"] == 3
+            assert fit["tokens"] == sum(exact.values())
+            assert fit["word_error"] < 0.01
+            assert fit["char_error"] < 0.01
+        assert calibration["default"]["files"] == 6
+
+    def test_sample_files_limits_tokenized_files(self, project):
+        """Test that at most sample_files files per extension are tokenized."""
+        calibration = calibrate(str(project), ["*.txt", "*.py"], sample_files=1, seed=0)
+
+        assert calibration["extensions"][".txt"]["files"] == 1
+        assert calibration["extensions"][".py"]["files"] == 1
+
+    def test_format_reports_error_per_extension(self, project):
+        """Test that the report has a row per extension and one for all files."""
+        report = format_calibration(calibrate(str(project), ["*.txt", "*.py"]))
+
+        lines = report.splitlines()
+        assert lines[0].split()[:3] == ["Extension", "Files", "Tokens/word"]
+        assert [line.split()[0] for line in lines[1:]] == [".py", ".txt", "all"]
+
+
+class TestProfile:
+    def test_save_keeps_other_encodings(self, project, tmp_path):
+        """Test that saving a calibration merges it into an existing profile."""
+        path = str(tmp_path / "profile.json")
+        calibration = calibrate(str(project), ["*.txt"])
+
+        save_profile(calibration, path, "cl100k_base")
+        save_profile(calibration, path, "o200k_base")
+
+        profile = json.loads((tmp_path / "profile.json").read_text())
+        assert sorted(profile["encodings"]) == ["cl100k_base", "o200k_base"]
+        assert load_profile(path, "o200k_base") == calibration
+
+    def test_load_missing_encoding_raises(self, project, tmp_path):
+        """Test that loading an encoding that was not calibrated raises ValueError."""
+        path = str(tmp_path / "profile.json")
+        save_profile(calibrate(str(project), ["*.txt"]), path, "cl100k_base")
+
+        with pytest.raises(ValueError, match="no calibration for encoding"):
+            load_profile(path, "p50k_base")
+
+    def test_directory_applies_ratios_per_extension(self, project, tmp_path):
+        """Test that approximate directory counts with a profile are near exact."""
+        path = str(tmp_path / "profile.json")
+        save_profile(calibrate(str(project), ["*.txt", "*.py"]), path, "cl100k_base")
+
+        exact = count_tokens_in_directory(str(project), ["*.txt", "*.py"])
+        for approximate in ("w", "c"):
+            approx = count_tokens_in_directory(
+                str(project), ["*.txt", "*.py"], approximate=approximate, profile=path
+            )
+            for file_path, tokens in exact.items():
+                assert abs(approx[file_path] - tokens) <= 0.01 * tokens + 1
+
+    def test_count_file_uses_extension_ratio(self, project):
+        """Test that count applies the ratio fitted for the file's extension."""
+        calibration = calibrate(str(project), ["*.txt", "*.py"])
+        file_path = str(project / "mod0.py")
+
+        result = count(file=file_path, approximate="w", profile=calibration)
+
+        assert result == count_tokens_in_file(
+            file_path,
+            approximate="w",
+            tokens_per_word=calibration["extensions"][".py"]["tokens_per_word"],
+        )
+
+    def test_unknown_extension_uses_default_ratio(self, project):
+        """Test that files with an uncalibrated extension use the overall ratio."""
+        calibration = calibrate(str(project), ["*.txt", "*.py"])
+        (project / "notes.md").write_text("Some notes about the project.\n")
+
+        result = count_tokens_in_directory(
+            str(project), ["*.md"], approximate="c", profile=calibration
+        )
+
+        assert result[str(project / "notes.md")] == int(
+            30 / calibration["default"]["characters_per_token"]
+        )
@@ -0,0 +1,78 @@
+import json
+import sys
+
+import pytest
+
+from count_tokens.checkpoint import Checkpoint
+from count_tokens.count import count_tokens_in_directory, iter_token_counts, main
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    root = tmp_path / "corpus"
+    root.mkdir()
+    for index in range(12):
+        (root / f"doc{index:02}.txt").write_text(f"Document {index}. " * (index + 1))
+    return root
+
+
+class TestCheckpoint:
+    def test_resume_skips_recorded_files(self, corpus, tmp_path):
+        """Test that a resumed scan reuses recorded results and matches a full scan."""
+        expected = count_tokens_in_directory(str(corpus))
+        log = tmp_path / "scan.ckpt"
+        # A scan killed after five files, in the middle of writing a row
+        checkpoint = Checkpoint(str(log), str(corpus), {}, interval=0)
+        for index, _ in enumerate(
+            iter_token_counts(str(corpus), checkpoint=checkpoint), start=1
+        ):
+            if index == 5:
+                break
+        checkpoint.close()
+        with open(log, "a") as file:
+            file.write('["cut off')
+        # Results of recorded files come from the log, not from the files
+        for index in range(5):
+            (corpus / f"doc{index:02}.txt").write_text("changed " * 100)
+
+        with Checkpoint(str(log), str(corpus), {}) as resumed:
+            results = count_tokens_in_directory(str(corpus), checkpoint=resumed)
+
+        assert resumed.resumed == 5
+        assert results == expected
+        assert list(results) == list(expected)
+        lines = log.read_text().splitlines()
+        assert len(lines) == 1 + len(expected)
+        assert all(json.loads(line) for line in lines)
+
+    def test_other_parameters_are_rejected(self, corpus, tmp_path):
+        """Test that a log of a scan with other options cannot be resumed."""
+        log = str(tmp_path / "scan.ckpt")
+        Checkpoint(log, str(corpus), {"encoding_name": "cl100k_base"}).close()
+
+        with pytest.raises(ValueError, match="other options"):
+            Checkpoint(log, str(corpus), {"encoding_name": "o200k_base"})
+        (tmp_path / "notes.txt").write_text("not a log\n")
+        with pytest.raises(ValueError, match="not a checkpoint"):
+            Checkpoint(str(tmp_path / "notes.txt"), str(corpus), {})
+
+    def test_cli_output_is_identical(self, corpus, tmp_path, monkeypatch, capsys):
+        """Test that a run resumed with --checkpoint prints the same output."""
+        argv = [
+            "count-tokens",
+            "-d",
+            str(corpus),
+            "--format",
+            "json",
+            "--checkpoint",
+            str(tmp_path / "scan.ckpt"),
+        ]
+        monkeypatch.setattr(sys, "argv", argv)
+        main()
+        first = capsys.readouterr()
+
+        main()
+        second = capsys.readouterr()
+
+        assert second.out == first.out
+        assert "resuming with 12 files" in second.err
@@ -1,19 +1,32 @@
+import csv
+import io
+import itertools
 import json
-from pathlib import Path
+import sys
 from unittest.mock import MagicMock, patch
 
 import pytest
 
 from count_tokens.count import (
+    _SKIPPED_OVER_TOTAL,
     CHARACTERS_PER_TOKEN,
     TOKENS_PER_WORD,
+    _chunk_ranges,
     _format_output,
+    _mapped_chunk_ranges,
+    _mapped_file,
+    _plan_batches,
+    _utf8_tail_start,
     count,
     count_tokens_in_directory,
     count_tokens_in_file,
     count_tokens_in_large_file,
     count_tokens_in_string,
+    count_tokens_in_strings,
+    iter_token_counts,
+    main,
 )
+from count_tokens.walk import DEFAULT_EXCLUDES
 
 
 @pytest.fixture
@@ -60,6 +73,32 @@ class TestCountTokensInString:
         assert token_count > 0
 
 
+class TestCountTokensInStrings:
+    def test_counts_match_single_string_counts(self):
+        """Test that batch counts match counting each string separately."""
+        texts = ["First prompt.", "", "A second, slightly longer chat message!"]
+
+        counts = count_tokens_in_strings(texts)
+
+        assert counts == [count_tokens_in_string(t) for t in texts]
+
+    def test_empty_list(self):
+        """Test that an empty list returns an empty list."""
+        assert count_tokens_in_strings([]) == []
+
+    def test_num_threads_passed_to_batch_encoder(self):
+        """Test that num_threads is forwarded to the batch encoder."""
+        with patch("count_tokens.count._get_encoding") as mock_get:
+            mock_get.return_value.encode_batch.return_value = [[1, 2], [3]]
+
+            counts = count_tokens_in_strings(["a b", "c"], num_threads=2)
+
+        assert counts == [2, 1]
+        mock_get.return_value.encode_batch.assert_called_once_with(
+            ["a b", "c"], num_threads=2
+        )
+
+
 class TestCountTokensInFile:
     @patch("pathlib.Path.read_text")
     def test_count_tokens_in_file_default_encoding(
@@ -135,11 +174,11 @@ class TestCountTokensInLargeFile:
         # Mock file with two chunks ending with newlines
         mock_file = MagicMock()
         mock_file.__enter__.return_value.read.side_effect = [
-            "This is chunk one\n",
-            "This is chunk two\n",
-            "",
+            b"This is chunk one\n",
+            b"This is chunk two\n",
+            b"",
         ]
-        mock_file.__enter__.return_value.readline.return_value = ""
+        mock_file.__enter__.return_value.readline.return_value = b""
         mock_open_func.return_value = mock_file
 
         token_count = count_tokens_in_large_file("large_file.txt")
@@ -154,8 +193,8 @@ class TestCountTokensInLargeFile:
     def test_count_tokens_large_file_with_custom_chunk_size(self, mock_open_func):
         """Test counting tokens with custom chunk size."""
         mock_file = MagicMock()
-        mock_file.__enter__.return_value.read.side_effect = ["Small chunk\n", ""]
-        mock_file.__enter__.return_value.readline.return_value = ""
+        mock_file.__enter__.return_value.read.side_effect = [b"Small chunk\n", b""]
+        mock_file.__enter__.return_value.readline.return_value = b""
         mock_open_func.return_value = mock_file
 
         token_count = count_tokens_in_large_file("large_file.txt", chunk_size=100)
@@ -170,11 +209,11 @@ class TestCountTokensInLargeFile:
         mock_file = MagicMock()
         # Simulate a chunk that doesn't end with newline
         mock_file.__enter__.return_value.read.side_effect = [
-            "This is a partial li",  # chunk doesn't end with newline
-            "",
+            b"This is a partial li",  # chunk doesn't end with newline
+            b"",
         ]
         # readline should be called to complete to the newline
-        mock_file.__enter__.return_value.readline.return_value = "ne of text\n"
+        mock_file.__enter__.return_value.readline.return_value = b"ne of text\n"
         mock_open_func.return_value = mock_file
 
         token_count = count_tokens_in_large_file("large_file.txt")
@@ -185,129 +224,559 @@ class TestCountTokensInLargeFile:
         mock_file.__enter__.return_value.readline.assert_called()
 
     @patch("count_tokens.count.count_tokens_in_file")
-    def test_count_tokens_large_file_with_approximation(self, mock_count_file):
-        """Test large file counting with approximation enabled."""
-        mock_count_file.return_value = 42
+    def test_count_tokens_large_file_with_approximation(
+        self, mock_count_file, tmp_path
+    ):
+        """Test that approximations stream the file instead of reading it whole."""
+        path = tmp_path / "words.txt"
+        path.write_text("one two three\nfour five six\n")
 
-        # When approximation is used, should delegate to count_tokens_in_file
-        result = count_tokens_in_large_file("large_file.txt", approximate="w")
+        result = count_tokens_in_large_file(str(path), approximate="w", chunk_size=4)
 
-        assert result == 42
-        mock_count_file.assert_called_once_with(
-            "large_file.txt", "cl100k_base", "w", TOKENS_PER_WORD, CHARACTERS_PER_TOKEN
-        )
+        assert result == int(6 * TOKENS_PER_WORD)
+        mock_count_file.assert_not_called()
 
     @patch("count_tokens.count.open")
     def test_count_tokens_large_file_unicode_error_fallback(self, mock_open_func):
-        """Test fallback to latin-1 encoding when utf-8 fails."""
-        # First attempt with utf-8 fails, second with latin-1 succeeds
-        mock_utf8_file = MagicMock()
-        mock_utf8_file.__enter__.return_value.read.side_effect = UnicodeDecodeError(
-            "utf-8", b"", 0, 1, "mock error"
+        """Test that invalid utf-8 chunks fall back to latin-1 without reopening."""
+        mock_file = MagicMock()
+        mock_file.__enter__.return_value.read.side_effect = [
+            "Latin encoded text\n".encode("latin-1"),
+            "Café\n".encode("latin-1"),
+            b"",
+        ]
+        mock_file.__enter__.return_value.readline.return_value = b""
+        mock_open_func.return_value = mock_file
+
+        result = count_tokens_in_large_file("binary_file.bin", details=True)
+
+        assert result == {
+            "tokens": count_tokens_in_string("Latin encoded text\n")
+            + count_tokens_in_string("Café\n"),
+            "chunks": 2,
+            "fallback_chunks": 1,
+        }
+        # The file is read once, in binary
+        mock_open_func.assert_called_once_with("binary_file.bin", "rb")
+
+
+class TestStreamingApproximation:
+    TEXTS = (
+        "plain ascii words\nand more words\n",
+        "no trailing newline and a verylongwordthatspansmanyblocks",
+        "  leading and trailing   whitespace \t\n\n",
+        "zażółć gęślą jaźń — 日本語のテキスト 😀 emoji\n",
+        "unicode\u00a0no-break\u2003em\u3000ideographic\u2028separators\x1cfs",
+        "windows\r\nline\r\nendings\rold mac\r",
+        "",
+    )
+
+    @pytest.mark.parametrize("text", TEXTS)
+    @pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 1024])
+    @pytest.mark.parametrize("approximate", ["w", "c"])
+    def test_matches_whole_file_approximation(
+        self, tmp_path, text, chunk_size, approximate
+    ):
+        """Test that streamed counts match the whole-file approximation."""
+        path = tmp_path / "text.txt"
+        path.write_bytes(text.encode("utf-8"))
+
+        streamed = count_tokens_in_large_file(
+            str(path),
+            chunk_size=chunk_size,
+            approximate=approximate,
+            tokens_per_word=1.0,
+            characters_per_token=1.0,
         )
 
-        mock_latin_file = MagicMock()
-        mock_latin_file.__enter__.return_value.read.side_effect = [
-            "Latin encoded text\n",
-            "",
+        assert streamed == count_tokens_in_file(
+            str(path),
+            approximate=approximate,
+            tokens_per_word=1.0,
+            characters_per_token=1.0,
+        )
+
+    def test_utf8_tail_start(self):
+        """Test detection of an incomplete utf-8 sequence at the end of a block."""
+        encoded = "aż😀".encode()
+
+        assert _utf8_tail_start(encoded) == len(encoded)
+        assert _utf8_tail_start(encoded[:-1]) == 3
+        assert _utf8_tail_start(encoded[:2]) == 1
+
+
+class TestDecodeErrors:
+    @pytest.fixture
+    def mixed_file(self, tmp_path):
+        """Create a file whose second of three chunks is not valid utf-8."""
+        path = tmp_path / "mixed.txt"
+        path.write_bytes(b"first line\n" + b"caf\xe9\n" + "gęś\n".encode())
+        return path
+
+    @pytest.mark.parametrize("use_mmap", [False, True])
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_latin1_fallback_is_per_chunk(self, mixed_file, use_mmap, workers):
+        """Test that only the invalid chunk is decoded as latin-1, in one pass."""
+        result = count_tokens_in_large_file(
+            str(mixed_file),
+            chunk_size=1,
+            workers=workers,
+            use_mmap=use_mmap,
+            details=True,
+        )
+
+        expected = sum(
+            count_tokens_in_string(line) for line in ["first line\n", "café\n", "gęś\n"]
+        )
+        assert result == {"tokens": expected, "chunks": 3, "fallback_chunks": 1}
+
+    def test_strict_raises(self, mixed_file):
+        """Test that the strict policy raises on invalid utf-8."""
+        with pytest.raises(UnicodeDecodeError):
+            count_tokens_in_large_file(str(mixed_file), decode_errors="strict")
+
+    @pytest.mark.parametrize("policy", ["replace", "surrogateescape"])
+    def test_codec_error_handlers(self, mixed_file, policy):
+        """Test that codec error handlers are applied to the invalid chunk."""
+        result = count_tokens_in_large_file(
+            str(mixed_file), chunk_size=1, decode_errors=policy, details=True
+        )
+
+        assert result["fallback_chunks"] == 1
+        assert result["tokens"] > 0
+
+    def test_unknown_policy(self, mixed_file):
+        """Test that an unknown policy is rejected."""
+        with pytest.raises(ValueError, match="decode_errors must be one of"):
+            count_tokens_in_large_file(str(mixed_file), decode_errors="ignore")
+
+
+class TestCountTokensInLargeFileParallel:
+    @pytest.fixture
+    def large_file(self, tmp_path):
+        """Create a multi-chunk file with multibyte characters and CRLF lines."""
+        lines = [
+            f"line {i}: zażółć gęślą jaźń {'x' * (i % 37)}\r\n" for i in range(3000)
         ]
-        mock_latin_file.__enter__.return_value.readline.return_value = ""
+        path = tmp_path / "large.txt"
+        path.write_bytes("".join(lines).encode("utf-8") + b"no newline at end")
+        return path
+
+    @pytest.mark.parametrize("chunk_size", [1, 1000, 4096, 10**9])
+    def test_parallel_matches_sequential(self, large_file, chunk_size):
+        """Test that parallel counting sums to exactly the sequential total."""
+        sequential = count_tokens_in_large_file(str(large_file), chunk_size=chunk_size)
+        parallel = count_tokens_in_large_file(
+            str(large_file), chunk_size=chunk_size, workers=4
+        )
 
-        mock_open_func.side_effect = [mock_utf8_file, mock_latin_file]
+        assert parallel == sequential
 
-        token_count = count_tokens_in_large_file("binary_file.bin")
+    @pytest.mark.parametrize("chunk_size", [1, 1000, 10**9])
+    @pytest.mark.parametrize("workers", [1, 3])
+    def test_mmap_matches_buffered(self, large_file, chunk_size, workers):
+        """Test that the memory-mapped reader gives the buffered reader's total."""
+        buffered = count_tokens_in_large_file(str(large_file), chunk_size=chunk_size)
+        mapped = count_tokens_in_large_file(
+            str(large_file), chunk_size=chunk_size, workers=workers, use_mmap=True
+        )
 
-        assert isinstance(token_count, int)
-        assert token_count > 0
-        # Check that we tried with both encodings
-        mock_open_func.assert_called_with("binary_file.bin", encoding="latin-1")
+        assert mapped == buffered
+
+    def test_mmap_ranges_match_planned_ranges(self, large_file):
+        """Test that the mapped reader splits at the same newline boundaries."""
+        with _mapped_file(str(large_file)) as view:
+            mapped = list(_mapped_chunk_ranges(view, 1000))
+
+        assert mapped == _chunk_ranges(str(large_file), 1000)
+
+    def test_mmap_empty_file(self, tmp_path):
+        """Test that an empty file is counted without mapping it."""
+        path = tmp_path / "empty.txt"
+        path.touch()
+
+        assert count_tokens_in_large_file(str(path), use_mmap=True) == 0
+
+    def test_mmap_latin1_fallback(self, tmp_path):
+        """Test that the mapped reader falls back to latin-1 once, from the start."""
+        path = tmp_path / "latin.txt"
+        path.write_bytes(b"plain line\n" * 50 + "café\n".encode("latin-1"))
+
+        result = count_tokens_in_large_file(str(path), chunk_size=64, use_mmap=True)
+
+        assert result == count_tokens_in_string("plain line\n" * 50 + "café\n")
+
+    def test_chunk_ranges_cover_file_at_newlines(self, large_file):
+        """Test that chunk ranges are contiguous and end at newlines."""
+        data = large_file.read_bytes()
+
+        ranges = _chunk_ranges(str(large_file), 1000)
+
+        assert ranges[0][0] == 0
+        assert ranges[-1][1] == len(data)
+        for (_, end), (start, _) in itertools.pairwise(ranges):
+            assert end == start
+            assert data[end - 1 : end] == b"\n"
+
+    def test_parallel_latin1_fallback(self, tmp_path):
+        """Test that invalid utf-8 falls back to latin-1 in parallel mode."""
+        path = tmp_path / "latin.txt"
+        path.write_bytes("café\n".encode("latin-1") * 500)
+
+        result = count_tokens_in_large_file(str(path), chunk_size=64, workers=2)
+
+        assert result == count_tokens_in_string("café\n" * 500)
+
+
+class TestStopAtLimit:
+    @pytest.fixture
+    def long_file(self, tmp_path):
+        """Create a file of many short chunks."""
+        path = tmp_path / "long.txt"
+        path.write_text("".join(f"line number {i} of the file\n" for i in range(2000)))
+        return path
+
+    @pytest.mark.parametrize("workers", [1, 3])
+    @pytest.mark.parametrize("use_mmap", [False, True])
+    def test_stops_once_limit_is_exceeded(self, long_file, workers, use_mmap):
+        """Test that counting stops at the first chunk over the limit."""
+        full = count_tokens_in_large_file(str(long_file), chunk_size=1000, details=True)
+
+        result = count_tokens_in_large_file(
+            str(long_file),
+            chunk_size=1000,
+            workers=workers,
+            use_mmap=use_mmap,
+            details=True,
+            max_tokens=500,
+        )
+
+        assert result["limit_exceeded"] is True
+        assert result["max_tokens"] == 500
+        assert 500 < result["tokens_at_least"] < full["tokens"]
+        assert result["chunks"] < full["chunks"]
+        assert "tokens" not in result
+
+    def test_under_limit_returns_exact_count(self, long_file):
+        """Test that a file under the limit gives the full count."""
+        full = count_tokens_in_large_file(str(long_file))
+
+        assert count_tokens_in_large_file(str(long_file), max_tokens=full) == full
+
+    def test_approximation_over_limit(self, long_file):
+        """Test that approximations report the limit check result as well."""
+        tokens = count_tokens_in_large_file(str(long_file), approximate="w")
+
+        result = count_tokens_in_large_file(
+            str(long_file), approximate="w", max_tokens=10
+        )
+
+        assert result == {
+            "limit_exceeded": True,
+            "tokens_at_least": tokens,
+            "max_tokens": 10,
+        }
+
+    def test_count_file_with_stop_at_limit(self, long_file):
+        """Test that count streams the file when stop_at_limit is set."""
+        result = count(
+            file=str(long_file), max_tokens=100, stop_at_limit=True, chunk_size=1000
+        )
+
+        assert result["limit_exceeded"] is True
+        assert result["tokens_at_least"] > 100
+
+    def test_count_directory_flags_each_file(self, tmp_path):
+        """Test that stop_at_limit checks each file of a directory separately."""
+        (tmp_path / "big.txt").write_text("many words here\n" * 1000)
+        (tmp_path / "small.txt").write_text("few words\n")
+
+        result = count(
+            directory=str(tmp_path),
+            file_patterns=["*.txt"],
+            max_tokens=50,
+            stop_at_limit=True,
+            chunk_size=100,
+        )
+
+        assert result[str(tmp_path / "big.txt")]["limit_exceeded"] is True
+        assert isinstance(result[str(tmp_path / "small.txt")], int)
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_directory_stops_at_total_limit(self, tmp_path, workers):
+        """Test that the scan stops once the total exceeds max_total_tokens."""
+        for i in range(6):
+            (tmp_path / f"file_{i}.txt").write_text("some words in a file\n" * 20)
+        full = count_tokens_in_directory(str(tmp_path), ["*.txt"])
+        per_file = next(iter(full.values()))
+
+        result = count_tokens_in_directory(
+            str(tmp_path),
+            ["*.txt"],
+            max_total_tokens=2 * per_file,
+            workers=workers,
+        )
+
+        counted = [v for v in result.values() if isinstance(v, int)]
+        assert list(result) == list(full)[: len(result)]
+        assert sum(counted) > 2 * per_file
+        if workers == 1:
+            # The walk stops at the file over the limit
+            assert list(result.values()) == [per_file] * 3
+        else:
+            # Files found for the workers are reported, the rest of the tree not
+            assert set(result.values()) <= {per_file, _SKIPPED_OVER_TOTAL}
+
+    def test_cli_reports_stopped_scan(self, tmp_path, monkeypatch, capsys):
+        """Test that the NDJSON summary and a warning tell that the scan stopped."""
+        for i in range(6):
+            (tmp_path / f"file_{i}.txt").write_text("some words in a file\n" * 20)
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            [
+                "count-tokens",
+                "-d",
+                str(tmp_path),
+                "-p",
+                "*.txt",
+                "--format",
+                "ndjson",
+                "--max-total-tokens",
+                "1",
+            ],
+        )
+
+        main()
+
+        captured = capsys.readouterr()
+        records = [json.loads(line) for line in captured.out.splitlines()]
+        assert len(records) == 2
+        assert records[-1]["summary"]["scan_stopped"] is True
+        assert "Warning: stopped after the total exceeded 1 tokens" in captured.err
 
 
 class TestCountTokensInDirectory:
-    @patch("pathlib.Path.glob")
+    @pytest.fixture
+    def tree(self, tmp_path):
+        """Create a small tree with files of the default patterns."""
+        (tmp_path / "file1.txt").write_text("one")
+        (tmp_path / "file2.py").write_text("two")
+        (tmp_path / "notes.md").write_text("three")
+        (tmp_path / "image.png").write_bytes(b"\x89PNG")
+        (tmp_path / "sub").mkdir()
+        (tmp_path / "sub" / "nested.txt").write_text("four")
+        return tmp_path
+
     @patch("count_tokens.count.count_tokens_in_file")
-    def test_count_tokens_in_directory_default(self, mock_count_file, mock_glob):
+    def test_count_tokens_in_directory_default(self, mock_count_file, tree):
         """Test counting tokens in a directory with default settings."""
-        # Mock the glob pattern to return two files
-        mock_path1 = MagicMock(spec=Path)
-        mock_path1.__str__.return_value = "/test/file1.txt"
-        mock_path2 = MagicMock(spec=Path)
-        mock_path2.__str__.return_value = "/test/file2.py"
-
-        # For each pattern in file_patterns, return the corresponding mock paths
-        mock_glob.side_effect = [[mock_path1], [mock_path2], []]
+        mock_count_file.side_effect = [100, 200, 300]
 
-        # Mock token counts for the files
-        mock_count_file.side_effect = [100, 200]
+        result = count_tokens_in_directory(str(tree))
 
-        result = count_tokens_in_directory("/test")
-
-        assert isinstance(result, dict)
-        assert result["/test/file1.txt"] == 100
-        assert result["/test/file2.py"] == 200
+        assert result == {
+            str(tree / "file1.txt"): 100,
+            str(tree / "file2.py"): 200,
+            str(tree / "notes.md"): 300,
+        }
 
-    @pytest.mark.skip(reason="Skipping test for streaming directory counting")
-    @patch("pathlib.Path.glob")
     @patch("count_tokens.count.count_tokens_in_large_file")
-    def test_count_tokens_in_directory_with_streaming(
-        self, mock_count_large, mock_glob
-    ):
+    def test_count_tokens_in_directory_with_streaming(self, mock_count_large, tree):
         """Test counting tokens in a directory with streaming enabled."""
-        mock_path = MagicMock(spec=Path)
-        mock_path.__str__.return_value = "/test/large_file.txt"
-        mock_glob.return_value = [mock_path]
         mock_count_large.return_value = 5000
 
-        result = count_tokens_in_directory("/test", use_streaming=True)
+        result = count_tokens_in_directory(str(tree), ["*.txt"], use_streaming=True)
 
-        assert result["/test/large_file.txt"] == 5000
+        assert result == {str(tree / "file1.txt"): 5000}
         mock_count_large.assert_called_once()
 
-    @patch("pathlib.Path.glob")
     @patch("count_tokens.count.count_tokens_in_file")
-    def test_count_tokens_in_directory_with_error(self, mock_count_file, mock_glob):
+    def test_count_tokens_in_directory_with_error(self, mock_count_file, tree):
         """Test handling of errors when counting tokens in directory."""
-        mock_path = MagicMock(spec=Path)
-        mock_path.__str__.return_value = "/test/error_file.txt"
-        mock_glob.return_value = [mock_path]
         mock_count_file.side_effect = Exception("Test error")
 
-        result = count_tokens_in_directory("/test")
+        result = count_tokens_in_directory(str(tree), ["*.txt"])
 
-        assert "/test/error_file.txt" in result
-        assert result["/test/error_file.txt"].startswith("Error:")
+        assert result[str(tree / "file1.txt")].startswith("Error:")
 
-    @pytest.mark.skip(reason="Skipping test for recursive directory counting")
-    @patch("pathlib.Path.glob")
-    def test_count_tokens_in_directory_recursive(self, mock_glob):
-        """Test counting tokens in directory with recursive option."""
-        mock_path = MagicMock(spec=Path)
-        mock_path.__str__.return_value = "/test/file1.txt"
-        mock_glob.return_value = [mock_path]
+    def test_count_tokens_in_directory_recursive(self, tree):
+        """Test that subdirectories are only searched with recursive."""
+        flat = count_tokens_in_directory(str(tree), ["*.txt"])
+        deep = count_tokens_in_directory(str(tree), ["*.txt"], recursive=True)
 
-        count_tokens_in_directory("/test", recursive=True)
+        assert list(flat) == [str(tree / "file1.txt")]
+        assert list(deep) == [str(tree / "file1.txt"), str(tree / "sub" / "nested.txt")]
 
-        # When recursive=True, it should use ** pattern for depth
-        mock_glob.assert_called_once_with("**/*.txt")
+    def test_file_matching_several_patterns_is_counted_once(self, tree):
+        """Test that a file matched by two patterns appears once."""
+        with patch(
+            "count_tokens.count.count_tokens_in_file", return_value=1
+        ) as mock_count_file:
+            result = count_tokens_in_directory(str(tree), ["*.txt", "file1.*"])
 
-    @patch("pathlib.Path.glob")
-    @patch("count_tokens.count.count_tokens_in_file")
-    def test_count_tokens_in_directory_default_patterns(
-        self, mock_count_file, mock_glob
-    ):
-        """Test that default file patterns (*.txt, *.py, *.md) are used when None."""
-        mock_glob.return_value = []
-        mock_count_file.return_value = 100
+        assert list(result) == [str(tree / "file1.txt")]
+        mock_count_file.assert_called_once()
 
-        # Call without file_patterns (uses default None -> ["*.txt", "*.py", "*.md"])
-        count_tokens_in_directory("/test")
+    def test_gitignore_and_exclude(self, tree):
+        """Test that ignored files and excluded directories are skipped."""
+        (tree / ".gitignore").write_text("notes.md\n")
+        (tree / "node_modules").mkdir()
+        (tree / "node_modules" / "dep.txt").write_text("dependency")
+
+        result = count_tokens_in_directory(
+            str(tree), recursive=True, exclude=[*DEFAULT_EXCLUDES, "sub/"]
+        )
+        everything = count_tokens_in_directory(
+            str(tree), recursive=True, exclude=[], use_ignore_files=False
+        )
+
+        assert list(result) == [str(tree / "file1.txt"), str(tree / "file2.py")]
+        assert str(tree / "node_modules" / "dep.txt") in everything
+        assert str(tree / "notes.md") in everything
+
+
+class TestCountTokensInDirectoryParallel:
+    @pytest.fixture
+    def tree(self, tmp_path):
+        """Create a directory with files of very different sizes."""
+        (tmp_path / "huge.txt").write_text("many words here\n" * 5000)
+        for i in range(12):
+            (tmp_path / f"small_{i:02d}.txt").write_text(f"file number {i}\n" * i)
+        (tmp_path / "script.py").write_text("print('hello')\n")
+        return tmp_path
+
+    def test_parallel_matches_sequential(self, tree):
+        """Test that a process pool returns the same dict in the same order."""
+        sequential = count_tokens_in_directory(str(tree), ["*.txt", "*.py"])
+        parallel = count_tokens_in_directory(str(tree), ["*.txt", "*.py"], workers=3)
+
+        assert parallel == sequential
+        assert list(parallel) == list(sequential)
+
+    def test_parallel_with_approximation(self, tree):
+        """Test that approximation modes work in worker processes."""
+        sequential = count_tokens_in_directory(str(tree), approximate="w")
+        parallel = count_tokens_in_directory(str(tree), approximate="w", workers=0)
+
+        assert parallel == sequential
+
+    def test_plan_batches_schedules_largest_first(self, tree):
+        """Test that the largest file is scheduled alone in the first batch."""
+        files = sorted(str(p) for p in tree.iterdir())
+
+        batches = _plan_batches(files, workers=4)
+
+        assert batches[0] == [str(tree / "huge.txt")]
+        assert sorted(f for batch in batches for f in batch) == files
+
+
+class TestIterTokenCounts:
+    @pytest.fixture
+    def tree(self, tmp_path):
+        """Create a directory with a few text files."""
+        for i in range(6):
+            (tmp_path / f"file_{i}.txt").write_text(f"file number {i}\n" * (i + 1))
+        return tmp_path
+
+    def test_results_are_yielded_as_files_are_counted(self, tree):
+        """Test that the first result comes before the other files are counted."""
+        with patch(
+            "count_tokens.count.count_tokens_in_file", return_value=7
+        ) as mock_count_file:
+            counts = iter_token_counts(str(tree))
+            first = next(counts)
+            counts.close()
+
+        assert first == (str(tree / "file_0.txt"), 7)
+        mock_count_file.assert_called_once()
+
+    @pytest.mark.parametrize("workers", [1, 3])
+    def test_matches_directory_counts(self, tree, workers):
+        """Test that the yielded results are those of count_tokens_in_directory."""
+        expected = count_tokens_in_directory(str(tree))
+
+        assert dict(iter_token_counts(str(tree), workers=workers)) == expected
+
+    def test_cli_ndjson_streams_records_and_summary(self, tree, monkeypatch, capsys):
+        """Test that --format ndjson prints a record per file, then a summary."""
+        monkeypatch.setattr(
+            sys, "argv", ["count-tokens", "-d", str(tree), "--format", "ndjson"]
+        )
+
+        main()
+
+        records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        expected = count_tokens_in_directory(str(tree))
+        assert records[:-1] == [{"file": f, "tokens": n} for f, n in expected.items()]
+        assert records[-1] == {
+            "summary": {
+                "files": len(expected),
+                "tokens": sum(expected.values()),
+                "errors": 0,
+                "skipped": 0,
+            }
+        }
+
+    def test_cli_csv_is_in_found_order(self, tree, monkeypatch, capsys):
+        """Test that CSV rows follow the walk and are the same with -j."""
+        outputs = []
+        for jobs in ("1", "3"):
+            monkeypatch.setattr(
+                sys,
+                "argv",
+                ["count-tokens", "-d", str(tree), "--format", "csv", "-j", jobs],
+            )
+            main()
+            outputs.append(capsys.readouterr().out)
+
+        rows = list(csv.reader(io.StringIO(outputs[0])))
+        expected = count_tokens_in_directory(str(tree))
+        assert rows == [["file", "tokens"], *([f, str(n)] for f, n in expected.items())]
+        assert outputs[1] == outputs[0]
+
+    def test_cli_streamed_csv_ends_with_total_row(self, tree, monkeypatch, capsys):
+        """Test that csv-stream writes rows as they are counted, then a total row."""
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            ["count-tokens", "-d", str(tree), "--format", "csv-stream", "-j", "2"],
+        )
+
+        main()
+
+        rows = list(csv.reader(io.StringIO(capsys.readouterr().out)))
+        expected = count_tokens_in_directory(str(tree))
+        assert rows[0] == ["file", "tokens"]
+        assert sorted(rows[1:-1]) == sorted([f, str(n)] for f, n in expected.items())
+        assert rows[-1] == ["", str(sum(expected.values()))]
+
+    def test_cli_csv_stream_requires_directory(self, tree, monkeypatch):
+        """Test that csv-stream is refused outside directory mode."""
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            ["count-tokens", str(tree / "file1.txt"), "--format", "csv-stream"],
+        )
+
+        with pytest.raises(SystemExit):
+            main()
+
+    def test_parallel_walk_is_bounded(self, tree, monkeypatch):
+        """Test that the pool takes only a few batches of files ahead of results."""
+        for i in range(6, 60):
+            (tree / f"file_{i}.txt").write_text(f"file number {i}\n")
+        found = []
+
+        with (
+            patch("count_tokens.count._WINDOW_FILES", 2),
+            patch("count_tokens.count._IN_FLIGHT_PER_WORKER", 1),
+        ):
+            counts = iter_token_counts(str(tree), workers=2, found=found)
+            next(counts)
+            counts.close()
 
-        # Verify glob was called with all three default patterns
-        glob_calls = [call[0][0] for call in mock_glob.call_args_list]
-        assert "*.txt" in glob_calls
-        assert "*.py" in glob_calls
-        assert "*.md" in glob_calls
-        assert len(glob_calls) == 3
+        assert len(found) <= 8
 
 
 class TestCountFunction:
@@ -361,6 +830,25 @@ class TestCountFunction:
         call_kwargs = mock_count_dir.call_args[1]
         assert call_kwargs["file_patterns"] == ["*.txt", "*.py", "*.md"]
 
+    def test_count_texts_mode(self):
+        """Test the count function with a list of texts."""
+        texts = ["Count these tokens", "and these"]
+
+        result = count(texts=texts)
+
+        assert result == [count_tokens_in_string(t) for t in texts]
+
+    def test_count_texts_with_max_tokens(self):
+        """Test that only texts over max_tokens are flagged."""
+        short, long = "Hi", "This is a considerably longer text"
+        limit = count_tokens_in_string(short)
+
+        result = count(texts=[short, long], max_tokens=limit)
+
+        assert result[0] == limit
+        assert result[1]["limit_exceeded"] is True
+        assert result[1]["tokens"] == count_tokens_in_string(long)
+
     def test_count_no_input_provided(self):
         """Test the count function with no input provided."""
         with pytest.raises(
@@ -402,7 +890,112 @@ class TestCountFunction:
         assert result["/test/file2.txt"]["limit_exceeded"] is True
 
 
+class TestMultipleEncodings:
+    ENCODINGS = ("cl100k_base", "o200k_base")
+
+    @pytest.fixture
+    def project(self, tmp_path):
+        """Create a directory with a few files, one larger than a chunk."""
+        for i in range(3):
+            (tmp_path / f"file_{i}.txt").write_text(f"file number {i} żółw\n" * (i + 1))
+        (tmp_path / "large.txt").write_text("a longer line of text, ok?\n" * 4000)
+        return tmp_path
+
+    def test_file(self, project):
+        """Test that a file read once gives the count of each encoding."""
+        path = str(project / "large.txt")
+
+        result = count_tokens_in_file(path, list(self.ENCODINGS))
+
+        assert result == {
+            name: count_tokens_in_file(path, name) for name in self.ENCODINGS
+        }
+
+    @pytest.mark.parametrize("use_mmap", [False, True])
+    def test_large_file(self, project, use_mmap):
+        """Test that every chunk goes to each encoder, with the streaming totals."""
+        path = str(project / "large.txt")
+
+        result = count_tokens_in_large_file(
+            path, list(self.ENCODINGS), chunk_size=70000, use_mmap=use_mmap
+        )
+
+        assert result == {
+            name: count_tokens_in_large_file(path, name, chunk_size=70000)
+            for name in self.ENCODINGS
+        }
+
+    def test_large_file_limit(self, project):
+        """Test that counting stops once every encoding is over max_tokens."""
+        path = str(project / "large.txt")
+
+        result = count_tokens_in_large_file(
+            path, list(self.ENCODINGS), chunk_size=1000, max_tokens=100
+        )
+
+        for name in self.ENCODINGS:
+            assert result[name]["limit_exceeded"] is True
+            assert 100 < result[name]["tokens_at_least"] < 1000
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_directory(self, project, workers):
+        """Test that directory results are keyed by encoding, then by file."""
+        result = count_tokens_in_directory(
+            str(project), ["*.txt"], encoding_name=list(self.ENCODINGS), workers=workers
+        )
+
+        assert result == {
+            name: count_tokens_in_directory(str(project), ["*.txt"], encoding_name=name)
+            for name in self.ENCODINGS
+        }
+
+    def test_count_limits_per_encoding(self, project):
+        """Test that count flags files over max_tokens for each encoding."""
+        result = count(
+            directory=str(project), encoding=list(self.ENCODINGS), max_tokens=100
+        )
+        text = count(text="Count these tokens", encoding=list(self.ENCODINGS))
+
+        for name in self.ENCODINGS:
+            assert result[name][str(project / "large.txt")]["limit_exceeded"] is True
+            assert isinstance(result[name][str(project / "file_0.txt")], int)
+            assert text[name] == count_tokens_in_string("Count these tokens", name)
+
+
 class TestFormatOutput:
+    def test_format_output_text_limit_exceeded(self):
+        """Test that files over the limit are flagged and counted in the total."""
+        results = {
+            "a.txt": 10,
+            "b.txt": {"limit_exceeded": True, "tokens_at_least": 90, "max_tokens": 50},
+            "c.txt": "Skipped: total token limit exceeded",
+        }
+
+        result = _format_output(results)
+
+        assert "b.txt: at least 90 tokens ⚠️ Token limit exceeded (> 50)" in result
+        assert "Total: 100 tokens across 2 files" in result
+
+    def test_format_output_by_encoding(self):
+        """Test that results of several encodings get a column or section each."""
+        results = {
+            "cl100k_base": {"a.txt": 10, "b.txt": "Error: unreadable"},
+            "o200k_base": {"a.txt": 9, "b.txt": "Error: unreadable"},
+        }
+
+        csv_output = _format_output(results, "csv", by_encoding=True)
+        text_output = _format_output(results, by_encoding=True)
+        file_output = _format_output({"cl100k_base": 10, "o200k_base": 9}, "csv", True)
+
+        assert csv_output.splitlines() == [
+            "file,cl100k_base,o200k_base",
+            "a.txt,10,9",
+            "b.txt,Error: unreadable,Error: unreadable",
+        ]
+        assert text_output.startswith("Encoding: cl100k_base\na.txt: 10 tokens")
+        assert "Encoding: o200k_base\na.txt: 9 tokens" in text_output
+        assert file_output == "cl100k_base,o200k_base\n10,9"
+
     def test_format_output_text_int(self):
         """Test formatting integer output as text."""
         result = _format_output(42)
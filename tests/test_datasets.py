@@ -0,0 +1,154 @@
+import array
+import gzip
+import json
+import sys
+
+import pytest
+
+from count_tokens import datasets
+from count_tokens.count import count_tokens_in_string, main
+from count_tokens.datasets import count_dataset, iter_record_counts, parse_field
+
+RECORDS = [
+    {"text": "A plain text record, zażółć gęślą jaźń."},
+    {
+        "messages": [
+            {"role": "user", "content": "What is the capital of France?"},
+            {"role": "assistant", "content": "Paris."},
+        ]
+    },
+    {"text": None, "meta": {"id": 3}},
+    {"text": ["a", "list"], "messages": [{"role": "system"}]},
+] * 25
+
+
+def expected_count(record):
+    texts = []
+    if isinstance(record.get("text"), str):
+        texts.append(record["text"])
+    elif record.get("text") is not None:
+        texts.append(json.dumps(record["text"]))
+    texts += [m["content"] for m in record.get("messages", []) if "content" in m]
+    return sum(count_tokens_in_string(text) for text in texts)
+
+
+@pytest.fixture
+def jsonl(tmp_path):
+    path = tmp_path / "train.jsonl"
+    path.write_text("".join(json.dumps(record) + "\n" for record in RECORDS))
+    return path
+
+
+class TestParseField:
+    @pytest.mark.parametrize(
+        ("field", "steps"),
+        [
+            ("text", ("text",)),
+            ("messages[].content", ("messages", None, "content")),
+            ("a.b[][]", ("a", "b", None, None)),
+            ("[].text", (None, "text")),
+        ],
+    )
+    def test_steps(self, field, steps):
+        """Test that field paths are parsed into keys and list steps."""
+        assert parse_field(field) == steps
+
+    @pytest.mark.parametrize("field", ["", "a..b", "a."])
+    def test_invalid(self, field):
+        """Test that empty keys are rejected."""
+        with pytest.raises(ValueError):
+            parse_field(field)
+
+
+class TestIterRecordCounts:
+    def test_jsonl_counts_only_field_values(self, jsonl):
+        """Test that only the values at the field paths are tokenized."""
+        counts = list(iter_record_counts(str(jsonl)))
+
+        assert counts == [expected_count(record) for record in RECORDS]
+
+    def test_workers_match_sequential(self, jsonl, monkeypatch):
+        """Test that byte ranges counted on worker processes keep record order."""
+        monkeypatch.setattr(datasets, "_RANGE_SIZE", 512)
+
+        counts = list(iter_record_counts(str(jsonl), workers=2))
+
+        assert counts == list(iter_record_counts(str(jsonl)))
+
+    def test_compressed_jsonl(self, jsonl, tmp_path):
+        """Test that a gzipped dataset gives the same counts."""
+        path = tmp_path / "train.jsonl.gz"
+        path.write_bytes(gzip.compress(jsonl.read_bytes()))
+
+        assert count_dataset(str(path)) == count_dataset(str(jsonl))
+
+    def test_csv_columns(self, tmp_path):
+        """Test that CSV fields are column names, with quoted newlines."""
+        path = tmp_path / "data.csv"
+        path.write_text('id,text\n1,"first line\nsecond line"\n2,short\n')
+
+        result = count_dataset(str(path), ["text"], batch_size=1)
+
+        assert list(result["counts"]) == [
+            count_tokens_in_string("first line\nsecond line"),
+            count_tokens_in_string("short"),
+        ]
+        assert result["records"] == 2
+
+    def test_parquet(self, tmp_path):
+        """Test that Parquet datasets are read column by column."""
+        pyarrow = pytest.importorskip("pyarrow")
+        parquet = pytest.importorskip("pyarrow.parquet")
+
+        path = tmp_path / "data.parquet"
+        parquet.write_table(
+            pyarrow.Table.from_pylist([{"text": "hello world", "n": 1}]), path
+        )
+
+        assert list(iter_record_counts(str(path))) == [
+            count_tokens_in_string("hello world")
+        ]
+
+    def test_invalid_json(self, tmp_path):
+        """Test that a malformed record raises ValueError."""
+        path = tmp_path / "bad.jsonl"
+        path.write_text('{"text": "ok"}\n{"text": \n')
+
+        with pytest.raises(ValueError, match="Invalid JSON"):
+            list(iter_record_counts(str(path)))
+
+
+class TestDatasetCli:
+    def test_ndjson_and_binary_counts(self, jsonl, tmp_path, monkeypatch, capsys):
+        """Test that --fields prints per-record NDJSON and writes a uint32 array."""
+        binary = tmp_path / "counts.bin"
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            [
+                "count-tokens",
+                str(jsonl),
+                "--fields",
+                "text,messages[].content",
+                "--format",
+                "ndjson",
+                "--record-counts",
+                str(binary),
+            ],
+        )
+
+        main()
+
+        lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        expected = [expected_count(record) for record in RECORDS]
+        assert lines[:-1] == [
+            {"record": i, "tokens": n} for i, n in enumerate(expected)
+        ]
+        assert lines[-1] == {
+            "summary": {"records": len(RECORDS), "tokens": sum(expected)}
+        }
+        counts = array.array("I")
+        counts.frombytes(binary.read_bytes())
+        if sys.byteorder == "big":
+            counts.byteswap()
+        assert counts.tolist() == expected
@@ -0,0 +1,146 @@
+import io
+
+import pytest
+
+from count_tokens.cache import CountCache
+from count_tokens.count import (
+    count,
+    count_tokens_in_large_file,
+    count_tokens_in_string,
+)
+from count_tokens.incremental import chunk_digest, iter_content_chunks
+
+LINES = [f"line {i}: the quick brown fox {i * 7919 % 1000}\n" for i in range(4000)]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """Provide a cache backed by a temporary database."""
+    with CountCache(str(tmp_path / "counts.sqlite3")) as cache:
+        yield cache
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    """Create a file of a few thousand distinct lines."""
+    path = tmp_path / "corpus.txt"
+    path.write_text("".join(LINES))
+    return path
+
+
+def digests(data: bytes, chunk_size: int = 4096) -> list[str]:
+    return [
+        chunk_digest(chunk)
+        for chunk in iter_content_chunks(io.BytesIO(data), chunk_size)
+    ]
+
+
+class TestContentChunks:
+    def test_chunks_are_newline_aligned_and_bounded(self):
+        """Test that chunks end at newlines, cover the file and respect the sizes."""
+        data = "".join(LINES).encode()
+        chunks = list(iter_content_chunks(io.BytesIO(data), 4096))
+
+        assert b"".join(chunks) == data
+        assert all(chunk.endswith(b"\n") for chunk in chunks)
+        assert all(len(chunk) >= 1024 for chunk in chunks[:-1])
+        assert all(len(chunk) < 4 * 4096 + 100 for chunk in chunks)
+        assert 10 < len(chunks) < 100
+
+    def test_long_lines_are_read_in_bounded_pieces(self):
+        """Test that a line longer than the maximum is cut at a character boundary."""
+        data = ("zażółć " * 3000 + "\n").encode() * 2
+
+        class Reader(io.BytesIO):
+            largest = 0
+
+            def readline(self, size=-1):
+                assert size > 0
+                line = super().readline(size)
+                Reader.largest = max(Reader.largest, len(line))
+                return line
+
+        chunks = list(iter_content_chunks(Reader(data), 1024))
+
+        assert b"".join(chunks) == data
+        assert Reader.largest <= 4 * 1024
+        assert all(len(chunk) <= 4 * 1024 for chunk in chunks)
+        for chunk in chunks:
+            chunk.decode()
+
+    def test_edit_changes_only_nearby_chunks(self):
+        """Test that boundaries resynchronise after an edit in the middle."""
+        edited = LINES.copy()
+        edited[2000] = "an edited line that is quite a bit longer than before\n"
+
+        before = digests("".join(LINES).encode())
+        after = digests("".join(edited).encode())
+
+        assert len(set(after) - set(before)) <= 2
+
+    def test_append_keeps_earlier_chunks(self):
+        """Test that appending lines keeps all but the last chunk."""
+        before = digests("".join(LINES).encode())
+        after = digests("".join(LINES + ["appended\n"] * 10).encode())
+
+        assert after[: len(before) - 1] == before[:-1]
+
+
+class TestIncrementalCount:
+    def test_second_run_reuses_every_chunk(self, cache, corpus):
+        """Test that an unchanged file is counted from the cache alone."""
+        first = count_tokens_in_large_file(
+            str(corpus), chunk_size=4096, cache=cache, details=True
+        )
+        second = count_tokens_in_large_file(
+            str(corpus), chunk_size=4096, cache=cache, details=True
+        )
+
+        assert first["cached_chunks"] == 0
+        assert second["cached_chunks"] == second["chunks"] == first["chunks"]
+        assert second["tokens"] == first["tokens"]
+
+    def test_edit_and_append_tokenize_only_changed_chunks(
+        self, cache, corpus, tmp_path
+    ):
+        """Test that a recount after changes matches a fresh incremental count."""
+        count_tokens_in_large_file(str(corpus), chunk_size=4096, cache=cache)
+        edited = LINES.copy()
+        edited[1000] = "edited\n"
+        corpus.write_text("".join([*edited, "appended line\n"]))
+        misses = cache.chunk_misses
+
+        result = count_tokens_in_large_file(
+            str(corpus), chunk_size=4096, cache=cache, details=True
+        )
+
+        assert cache.chunk_misses - misses <= 4
+        with CountCache(str(tmp_path / "fresh.sqlite3")) as fresh:
+            assert result["tokens"] == count_tokens_in_large_file(
+                str(corpus), chunk_size=4096, cache=fresh
+            )
+
+    def test_total_is_the_sum_of_chunk_counts(self, cache, corpus):
+        """Test that chunks are tokenized on their own, without merging tokens."""
+        with open(corpus, "rb") as file:
+            chunks = list(iter_content_chunks(file, 4096))
+
+        total = count_tokens_in_large_file(str(corpus), chunk_size=4096, cache=cache)
+
+        assert total == sum(count_tokens_in_string(chunk.decode()) for chunk in chunks)
+
+    def test_cache_persists_and_respects_limits(self, corpus, tmp_path):
+        """Test that chunk counts survive a reopen and max_tokens stops early."""
+        path = str(tmp_path / "counts.sqlite3")
+        with CountCache(path) as cache:
+            total = count(file=str(corpus), use_streaming=True, cache=cache)
+        with CountCache(path) as cache:
+            assert count(file=str(corpus), use_streaming=True, cache=cache) == total
+            assert cache.chunk_misses == 0
+
+            result = count_tokens_in_large_file(
+                str(corpus), chunk_size=4096, cache=cache, max_tokens=100
+            )
+
+        assert result["limit_exceeded"] is True
+        assert 100 < result["tokens_at_least"] < total
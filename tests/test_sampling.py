@@ -0,0 +1,96 @@
+import os
+import random
+
+import pytest
+
+from count_tokens.count import count, count_tokens_in_file, count_tokens_in_large_file
+from count_tokens.sampling import estimate_tokens
+
+WORDS = ["token", "counting", "zażółć", "def", "return", "x = 1", "日本語", "{}", "42"]
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    """Create a few files of fixed-width lines with varied content."""
+    rng = random.Random(0)
+    for name, lines in [("a.txt", 3000), ("b.txt", 1000), ("c.md", 2000)]:
+        with open(tmp_path / name, "w", encoding="utf-8") as file:
+            for _ in range(lines):
+                line = " ".join(rng.choice(WORDS) for _ in range(8))
+                file.write(
+                    line.encode()[:60].decode("utf-8", "ignore").ljust(63) + "\n"
+                )
+    return tmp_path
+
+
+class TestEstimateTokens:
+    def test_exact_when_every_segment_is_sampled(self, corpus):
+        """Test that sampling all segments gives the exact streaming count."""
+        path = str(corpus / "a.txt")
+
+        estimate = estimate_tokens(
+            [path], sample_size=64 * 100, target_relative_error=0
+        )
+
+        assert estimate["samples"] == estimate["segments"]
+        assert estimate["tokens"] == count_tokens_in_large_file(path, chunk_size=6400)
+        assert estimate["ci_low"] == estimate["ci_high"] == estimate["tokens"]
+
+    def test_stops_early_near_exact_count(self, corpus):
+        """Test that sampling stops at the target error close to the exact count."""
+        paths = [str(corpus / name) for name in ["a.txt", "b.txt", "c.md"]]
+        exact = sum(count_tokens_in_large_file(p) for p in paths)
+
+        estimate = estimate_tokens(
+            paths, sample_size=512, target_relative_error=0.05, confidence=0.99, seed=1
+        )
+
+        assert estimate["samples"] < estimate["segments"]
+        assert estimate["relative_error"] <= 0.05
+        assert estimate["ci_low"] <= estimate["tokens"] <= estimate["ci_high"]
+        assert abs(estimate["tokens"] - exact) <= 0.05 * exact
+        assert estimate["total_bytes"] == sum(os.path.getsize(p) for p in paths)
+
+    def test_seed_makes_estimate_reproducible(self, corpus):
+        """Test that the same seed gives the same estimate."""
+        path = [str(corpus / "a.txt")]
+
+        first = estimate_tokens(path, sample_size=512, max_samples=10, seed=7)
+        second = estimate_tokens(path, sample_size=512, max_samples=10, seed=7)
+
+        assert first == second
+        assert first["samples"] == 10
+
+    def test_empty_input(self, tmp_path):
+        """Test that empty files give an empty estimate."""
+        (tmp_path / "empty.txt").touch()
+
+        estimate = estimate_tokens([str(tmp_path / "empty.txt")])
+
+        assert estimate["tokens"] == estimate["samples"] == 0
+
+
+class TestSamplingMode:
+    def test_count_tokens_in_file_returns_int(self, corpus):
+        """Test that approximate="s" gives an integer estimate for one file."""
+        result = count_tokens_in_file(str(corpus / "b.txt"), approximate="s")
+
+        assert isinstance(result, int)
+        assert result > 0
+
+    def test_count_directory_samples_across_files(self, corpus):
+        """Test that directory mode gives a single estimate over all files."""
+        result = count(
+            directory=str(corpus), file_patterns=["*.txt"], approximate="s", seed=3
+        )
+
+        sizes = sum(len((corpus / n).read_bytes()) for n in ["a.txt", "b.txt"])
+        assert result["total_bytes"] == sizes
+        assert result["ci_low"] <= result["tokens"] <= result["ci_high"]
+
+    def test_count_estimate_over_max_tokens(self, corpus):
+        """Test that max_tokens is checked against the estimate."""
+        result = count(file=str(corpus / "b.txt"), approximate="s", max_tokens=1)
+
+        assert result["limit_exceeded"] is True
+        assert result["max_tokens"] == 1
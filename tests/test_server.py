@@ -0,0 +1,242 @@
+import http.client
+import json
+import os
+import socket
+import stat
+import sys
+import tempfile
+import threading
+
+import pytest
+
+from count_tokens.count import count, main
+from count_tokens.server import (
+    ServerError,
+    create_server,
+    default_address,
+    default_token_path,
+    parse_address,
+    request_count,
+)
+
+
+@pytest.fixture(params=["unix", "tcp"])
+def server(request, tmp_path, monkeypatch):
+    """Run a daemon in a background thread and return its address."""
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    if request.param == "unix":
+        address = str(tmp_path / "count_tokens.sock")
+    else:
+        address = "127.0.0.1:0"
+    daemon = create_server(address, ["cl100k_base"])
+    if request.param == "tcp":
+        address = f"127.0.0.1:{daemon.server_address[1]}"
+    thread = threading.Thread(
+        target=daemon.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+    )
+    thread.start()
+    yield address
+    daemon.shutdown()
+    daemon.server_close()
+
+
+@pytest.fixture
+def project(tmp_path):
+    """Create a directory with a few text files."""
+    directory = tmp_path / "project"
+    directory.mkdir()
+    for i in range(3):
+        (directory / f"file_{i}.txt").write_text(f"file number {i}\n" * (i + 1))
+    return directory
+
+
+class TestParseAddress:
+    @pytest.mark.parametrize(
+        ("address", "expected"),
+        [
+            ("127.0.0.1:8765", ("127.0.0.1", 8765)),
+            ("localhost:9000", ("localhost", 9000)),
+            ("/run/user/1000/count_tokens.sock", "/run/user/1000/count_tokens.sock"),
+            ("count_tokens.sock", "count_tokens.sock"),
+        ],
+    )
+    def test_parse_address(self, address, expected):
+        """Test that host:port is TCP and anything else a socket path."""
+        assert parse_address(address) == expected
+
+
+class TestServer:
+    def test_text_file_and_directory(self, server, project):
+        """Test that the daemon gives the same results as count."""
+        file_path = str(project / "file_2.txt")
+
+        assert request_count(server, text="Count these tokens") == count(
+            text="Count these tokens"
+        )
+        assert request_count(server, file=file_path, approximate="w") == count(
+            file=file_path, approximate="w"
+        )
+        assert request_count(server, directory=str(project)) == count(
+            directory=str(project)
+        )
+
+    def test_error_is_reported(self, server, tmp_path):
+        """Test that a failed count raises ServerError on the client."""
+        with pytest.raises(ServerError, match="FileNotFoundError"):
+            request_count(server, file=str(tmp_path / "missing.txt"))
+
+    def test_unknown_option_is_rejected(self, server):
+        """Test that options count does not take are rejected."""
+        with pytest.raises(ServerError, match="Unknown request options: bogus"):
+            request_count(server, text="x", bogus=1)
+
+    def test_formatted_output_and_health(self, server, project):
+        """Test the raw HTTP responses with the formatted output."""
+        host, port = parse_address(server) if ":" in server else (None, None)
+        if host is None:
+            pytest.skip("raw HTTP checked over TCP")
+        with open(default_token_path()) as file:
+            headers = {"Authorization": f"Bearer {file.read()}"}
+        connection = http.client.HTTPConnection(host, port)
+        body = json.dumps({"directory": str(project), "format": "csv"})
+        connection.request("POST", "/count", body=body, headers=headers)
+        response = json.loads(connection.getresponse().read())
+        connection.request("GET", "/health", headers=headers)
+        health = json.loads(connection.getresponse().read())
+        connection.close()
+
+        assert response["output"].splitlines()[0] == "file,tokens"
+        assert health == {"status": "ok", "encodings": ["cl100k_base"]}
+
+    @pytest.mark.parametrize(
+        ("token", "host", "status"),
+        [
+            (None, None, 401),
+            ("wrong", None, 401),
+            ("valid", "attacker.example:8765", 403),
+            ("valid", None, 200),
+        ],
+    )
+    def test_tcp_requires_token_and_local_host(self, server, token, host, status):
+        """Test that TCP requests without the token or for another Host fail."""
+        if ":" not in server:
+            pytest.skip("TCP only")
+        if token == "valid":
+            with open(default_token_path()) as file:
+                token = file.read()
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        if host:
+            headers["Host"] = host
+        connection = http.client.HTTPConnection(*parse_address(server))
+        connection.request("POST", "/count", body='{"text": "x"}', headers=headers)
+        response = connection.getresponse()
+        connection.close()
+
+        assert response.status == status
+
+    @pytest.mark.parametrize("address", ["0.0.0.0:8765", "example.com:8765"])
+    def test_non_loopback_tcp_is_refused(self, address, tmp_path):
+        """Test that the daemon does not listen on addresses others can reach."""
+        with pytest.raises(ValueError, match="loopback"):
+            create_server(address, token_path=str(tmp_path / "token"))
+
+    @pytest.mark.skipif(not hasattr(os, "getuid"), reason="POSIX permissions")
+    def test_shared_token_file_is_refused(self, tmp_path):
+        """Test that a token file others can read is not used."""
+        token_path = tmp_path / "token"
+        token_path.write_text("known")
+        token_path.chmod(0o644)
+
+        with pytest.raises(OSError, match="readable"):
+            create_server("127.0.0.1:0", token_path=str(token_path))
+
+    @pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="no Unix sockets")
+    def test_default_socket_is_private(self, tmp_path, monkeypatch):
+        """Test that the fallback socket is created, 0600, in a 0700 directory."""
+        monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+        monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+        address = default_address()
+
+        daemon = create_server(address)
+        daemon.server_close()
+
+        assert os.path.dirname(address) != str(tmp_path)
+        assert stat.S_IMODE(os.stat(os.path.dirname(address)).st_mode) == 0o700
+        assert stat.S_IMODE(os.stat(address).st_mode) == 0o600
+
+    @pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="no Unix sockets")
+    def test_shared_socket_directory_is_refused(self, tmp_path, monkeypatch):
+        """Test that the daemon does not use a fallback directory others can enter."""
+        monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+        monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+        address = default_address()
+        os.mkdir(os.path.dirname(address), 0o777)
+        os.chmod(os.path.dirname(address), 0o777)
+
+        with pytest.raises(OSError, match="must belong to you"):
+            create_server(address)
+
+    def test_address_in_use(self, server):
+        """Test that a second daemon on the same socket is refused."""
+        if ":" in server:
+            pytest.skip("socket files only")
+        with pytest.raises(OSError, match="already running"):
+            create_server(server)
+
+
+class TestClient:
+    def test_no_server_returns_none(self, tmp_path):
+        """Test that the client reports a missing daemon with None."""
+        assert request_count(str(tmp_path / "none.sock"), text="x") is None
+
+    def test_foreign_socket_is_refused(self, server, monkeypatch):
+        """Test that the client does not send requests to another user's socket."""
+        if not server.startswith("/"):
+            pytest.skip("TCP daemons are checked with the token")
+        monkeypatch.setattr(os, "getuid", lambda: os.lstat(server).st_uid + 1)
+
+        with pytest.raises(ServerError, match="another user"):
+            request_count(server, text="x")
+
+    @pytest.mark.parametrize("running", [True, False])
+    def test_cli_output_matches_in_process(
+        self, server, project, monkeypatch, capsys, running
+    ):
+        """Test that --server prints the in-process output, with or without a daemon."""
+        monkeypatch.chdir(project.parent)
+        argv = ["count-tokens", "-d", "project", "-p", "*.txt"]
+
+        monkeypatch.setattr(sys, "argv", argv)
+        main()
+        expected = capsys.readouterr().out
+
+        address = server if running else str(project / "none.sock")
+        monkeypatch.setattr(
+            sys, "argv", [*argv, "--server", "--server-address", address]
+        )
+        main()
+
+        assert capsys.readouterr().out == expected
+
+    def test_cli_reports_server_errors(self, server, project, monkeypatch, capsys):
+        """Test that --server reports a rejected request on one line, not a traceback."""
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            [
+                "count-tokens",
+                str(project / "file_0.txt"),
+                "-e",
+                "nosuch_enc",
+                "--server",
+                "--server-address",
+                server,
+            ],
+        )
+
+        with pytest.raises(SystemExit) as exit_info:
+            main()
+
+        message = str(exit_info.value.code)
+        assert message.startswith("Error: ")
+        assert "\n" not in message
@@ -0,0 +1,127 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from count_tokens.count import count_tokens_in_directory, main
+from count_tokens.shard import merge_partials, parse_shard, shard_of, write_partial
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    root = tmp_path / "corpus"
+    for index in range(30):
+        path = root / f"part{index % 4}" / f"doc{index}.txt"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f"Document {index}. " + "Some words here. " * index)
+    (root / "image.png").write_bytes(b"\x89PNG\r\n\x1a\n\x00\x00")
+    return root
+
+
+class TestShardOf:
+    @pytest.mark.parametrize(("value", "shard"), [("1/1", (1, 1)), ("3/8", (3, 8))])
+    def test_parse(self, value, shard):
+        """Test that i/n is parsed into the shard number and count."""
+        assert parse_shard(value) == shard
+
+    @pytest.mark.parametrize("value", ["0/2", "3/2", "1", "a/b", "-1/2"])
+    def test_parse_invalid(self, value):
+        """Test that shards outside 1..n are rejected."""
+        with pytest.raises(ValueError):
+            parse_shard(value)
+
+    def test_stable_and_spread(self):
+        """Test that the shard of a path is fixed and paths spread over shards."""
+        paths = [f"dir/file{index}.txt" for index in range(400)]
+        shards = [shard_of(path, 4) for path in paths]
+
+        assert shards == [shard_of(path, 4) for path in paths]
+        assert set(shards) == {1, 2, 3, 4}
+        assert shard_of("dir/file0.txt", 4) == shard_of("dir/file0.txt", 4)
+
+
+class TestMerge:
+    def test_shard_processes_merge_to_single_run(self, corpus, tmp_path):
+        """Test that shards counted by separate processes merge to a single run."""
+        processes = [
+            subprocess.Popen(
+                [
+                    sys.executable,
+                    "-m",
+                    "count_tokens.count",
+                    "-d",
+                    str(corpus),
+                    "-r",
+                    "-p",
+                    "*",
+                    "--shard",
+                    f"{index}/3",
+                    "--partial",
+                    str(tmp_path / f"part{index}.ndjson.gz"),
+                    "-q",
+                ],
+                stdout=subprocess.PIPE,
+            )
+            for index in (1, 2, 3)
+        ]
+        totals = [int(process.communicate()[0]) for process in processes]
+        assert all(process.returncode == 0 for process in processes)
+
+        merged = merge_partials(
+            str(tmp_path / f"part{index}.ndjson.gz") for index in (3, 1, 2)
+        )
+        expected = count_tokens_in_directory(str(corpus), ["*"], recursive=True)
+
+        assert merged["results"] == expected
+        assert list(merged["results"]) == list(expected)
+        assert sum(totals) == sum(
+            count for count in expected.values() if isinstance(count, int)
+        )
+
+    def test_merge_cli_matches_directory_output(
+        self, corpus, tmp_path, monkeypatch, capsys
+    ):
+        """Test that count-tokens merge prints the output of a single-node run."""
+        partials = [str(tmp_path / f"shard{index}.ndjson") for index in (1, 2)]
+        for index, partial in enumerate(partials, start=1):
+            write_partial(partial, str(corpus), (index, 2), recursive=True)
+        monkeypatch.setattr(sys, "argv", ["count-tokens", "-d", str(corpus), "-r"])
+        main()
+        single = capsys.readouterr().out
+
+        monkeypatch.setattr(sys, "argv", ["count-tokens", "merge", *partials])
+        main()
+
+        assert capsys.readouterr().out == single
+
+    def test_missing_and_incomplete_shards(self, corpus, tmp_path):
+        """Test that missing, repeated, mismatched or unfinished shards are errors."""
+        first, second = str(tmp_path / "1.ndjson"), str(tmp_path / "2.ndjson")
+        write_partial(first, str(corpus), (1, 2))
+        write_partial(second, str(corpus), (2, 2), recursive=True)
+
+        with pytest.raises(ValueError, match="Missing shards of 2: 2"):
+            merge_partials([first])
+        with pytest.raises(ValueError, match="more than once"):
+            merge_partials([first, first])
+        with pytest.raises(ValueError, match="other parameters"):
+            merge_partials([first, second])
+
+        lines = (tmp_path / "2.ndjson").read_text().splitlines()
+        (tmp_path / "2.ndjson").write_text("\n".join(lines[:-1]) + "\n")
+        with pytest.raises(ValueError, match="incomplete"):
+            merge_partials([first, second])
+
+    def test_partial_rows(self, corpus, tmp_path):
+        """Test that a partial holds the shard header, positioned rows and a summary."""
+        partial = tmp_path / "only.ndjson"
+
+        summary = write_partial(str(partial), str(corpus), (1, 1), file_patterns=["*"])
+
+        lines = [json.loads(line) for line in partial.read_text().splitlines()]
+        assert lines[0]["shard"] == [1, 1]
+        assert lines[0]["params"] == {"file_patterns": ["*"]}
+        assert [row[1] for row in lines[1:-1]] == [str(corpus / "image.png")]
+        assert lines[-1] == {"summary": summary}
+        assert summary["skipped"] == 1
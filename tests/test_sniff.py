@@ -0,0 +1,95 @@
+import gzip
+import io
+import json
+import sys
+
+import pytest
+
+from count_tokens.count import count_tokens_in_directory, main
+from count_tokens.sniff import is_binary, sniff
+
+PNG = b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR" + bytes(range(256)) * 8
+
+
+class TestIsBinary:
+    @pytest.mark.parametrize(
+        ("head", "binary"),
+        [
+            (PNG, True),
+            (b"PK\x03\x04\x14\x00\x00\x00\x08\x00", True),
+            (bytes(range(1, 32)) * 10, True),
+            (b"def main():\n\treturn 0\n", False),
+            ("zażółć gęślą jaźń\r\n".encode(), False),
+            ("latin-1 café\f\x1b[0m".encode("latin-1"), False),
+            (b"", False),
+        ],
+    )
+    def test_heads(self, head, binary):
+        """Test that NUL bytes and control characters mark a file as binary."""
+        assert is_binary(head) is binary
+
+
+class TestSniff:
+    def test_limits(self, tmp_path):
+        """Test the reasons given for binary, oversized and minified files."""
+        (tmp_path / "image.png").write_bytes(PNG)
+        (tmp_path / "bundle.min.js").write_text("var a=1;" * 1000)
+        (tmp_path / "notes.txt").write_text("short line\n" * 100)
+
+        assert sniff(str(tmp_path / "image.png")) == "Skipped: binary file"
+        assert sniff(str(tmp_path / "notes.txt"), max_file_size=100).startswith(
+            "Skipped: file larger than 100 bytes"
+        )
+        assert sniff(str(tmp_path / "bundle.min.js"), max_line_length=1000).startswith(
+            "Skipped: line longer than 1000 bytes"
+        )
+        assert sniff(str(tmp_path / "notes.txt"), max_line_length=1000) is None
+        assert sniff(str(tmp_path / "image.png"), skip_binary=False) is None
+
+    def test_stream_is_peeked(self):
+        """Test that sniffing an open stream does not consume it."""
+        stream = io.BufferedReader(io.BytesIO(b"text\n" * 10))
+
+        assert sniff(stream, max_line_length=80) is None
+        assert stream.read() == b"text\n" * 10
+
+    def test_compressed_file_is_sniffed_decompressed(self, tmp_path):
+        """Test that compressed files are classified by their content."""
+        path = tmp_path / "notes.txt.gz"
+        path.write_bytes(gzip.compress(b"plain text\n" * 100))
+
+        assert sniff(str(path)) is None
+
+
+class TestSkipInDirectory:
+    @pytest.fixture
+    def mixed(self, tmp_path):
+        (tmp_path / "image.png").write_bytes(PNG)
+        (tmp_path / "app.min.js").write_text("var a=1;" * 1000)
+        (tmp_path / "notes.txt").write_text("Some notes.\n" * 10)
+        return tmp_path
+
+    def test_skipped_files_have_reasons(self, mixed):
+        """Test that rejected files are reported as skipped, not counted."""
+        results = count_tokens_in_directory(
+            str(mixed), ["*"], max_line_length=1000, workers=2
+        )
+
+        assert results[str(mixed / "image.png")] == "Skipped: binary file"
+        assert results[str(mixed / "app.min.js")].startswith("Skipped: line longer")
+        assert isinstance(results[str(mixed / "notes.txt")], int)
+
+    def test_cli_ndjson_skipped_records(self, mixed, monkeypatch, capsys):
+        """Test that NDJSON output gives the skip reason and counts skipped files."""
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            ["count-tokens", "-d", str(mixed), "-p", "*", "--format", "ndjson"],
+        )
+
+        main()
+
+        records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        assert {"file": str(mixed / "image.png"), "skipped": "binary file"} in records
+        assert records[-1]["summary"]["skipped"] == 1
+        assert records[-1]["summary"]["files"] == 2
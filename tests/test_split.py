@@ -0,0 +1,97 @@
+import itertools
+import json
+import sys
+
+import pytest
+
+from count_tokens.count import count_tokens_in_string, main
+from count_tokens.split import split_file, split_text
+
+TEXT = "".join(
+    f"Paragraph {i}: zażółć gęślą jaźń, 世界 and some plain words.\n"
+    for i in range(300)
+)
+
+
+class TestSplitText:
+    @pytest.mark.parametrize("overlap", [0, 7])
+    def test_chunks_cover_text_within_budget(self, overlap):
+        """Test that chunks respect the budget and their offsets match the text."""
+        chunks = list(split_text(TEXT, 50, overlap=overlap))
+        data = TEXT.encode()
+
+        assert all(chunk["tokens"] <= 50 for chunk in chunks)
+        assert [chunk["index"] for chunk in chunks] == list(range(len(chunks)))
+        for chunk in chunks:
+            assert TEXT[chunk["start_char"] : chunk["end_char"]] == chunk["text"]
+            assert (
+                data[chunk["start_byte"] : chunk["end_byte"]] == chunk["text"].encode()
+            )
+        assert chunks[0]["start_char"] == 0
+        assert chunks[-1]["end_char"] == len(TEXT)
+
+    def test_single_tokenization_counts(self):
+        """Test that chunk counts add up to the count of the whole text."""
+        chunks = list(split_text(TEXT, 64))
+
+        assert sum(chunk["tokens"] for chunk in chunks) == count_tokens_in_string(TEXT)
+        assert "".join(chunk["text"] for chunk in chunks) == TEXT
+        assert all(
+            chunk["end_char"] == following["start_char"]
+            for chunk, following in itertools.pairwise(chunks)
+        )
+
+    def test_overlap_repeats_tokens(self):
+        """Test that consecutive chunks share the overlap."""
+        chunks = list(split_text(TEXT, 40, overlap=10))
+
+        for chunk, following in itertools.pairwise(chunks):
+            assert following["start_char"] < chunk["end_char"]
+
+    @pytest.mark.parametrize(("max_tokens", "overlap"), [(0, 0), (10, 10), (10, -1)])
+    def test_invalid_budget(self, max_tokens, overlap):
+        """Test that the budget and overlap are validated."""
+        with pytest.raises(ValueError):
+            next(split_text(TEXT, max_tokens, overlap=overlap))
+
+    def test_character_over_budget(self):
+        """Test that a character of more tokens than the budget is an error."""
+        # The parrot emoji is several tokens in cl100k_base
+        with pytest.raises(ValueError, match="more than max_tokens=1"):
+            list(split_text("\U0001f99c", 1))
+        chunks = list(split_text("\U0001f99c" * 3, 4))
+        assert "".join(chunk["text"] for chunk in chunks) == "\U0001f99c" * 3
+        assert all(chunk["tokens"] <= 4 for chunk in chunks)
+
+
+class TestSplitFile:
+    def test_streaming_matches_offsets_in_file(self, tmp_path):
+        """Test that chunks of a file streamed in small blocks match the file bytes."""
+        path = tmp_path / "doc.txt"
+        path.write_bytes(TEXT.replace("\n", "\r\n").encode())
+        data = path.read_bytes()
+
+        chunks = list(split_file(str(path), 50, overlap=5, chunk_size=256))
+
+        assert all(chunk["tokens"] <= 50 for chunk in chunks)
+        assert chunks[-1]["end_byte"] == len(data)
+        for chunk in chunks:
+            assert (
+                data[chunk["start_byte"] : chunk["end_byte"]].decode() == chunk["text"]
+            )
+
+    def test_cli_prints_jsonl(self, tmp_path, monkeypatch, capsys):
+        """Test that --split prints one JSON chunk per line."""
+        path = tmp_path / "doc.txt"
+        path.write_text(TEXT)
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            ["count-tokens", str(path), "--split", "100", "--overlap", "10"],
+        )
+
+        main()
+
+        lines = capsys.readouterr().out.splitlines()
+        chunks = [json.loads(line) for line in lines]
+        assert chunks == list(split_file(str(path), 100, overlap=10))
@@ -0,0 +1,91 @@
+import subprocess
+import sys
+
+import pytest
+
+CLI = "import sys; from count_tokens.count import main; sys.argv[0] = 'count-tokens'; main()"
+REPORT = "print(','.join(sys.modules), file=sys.stderr)"
+# Modules that used to be loaded at startup, needed only by some features
+HEAVY_MODULES = (
+    "tiktoken",
+    "sqlite3",
+    "hashlib",
+    "concurrent.futures",
+    "logging",
+    "zipfile",
+    "tarfile",
+    "bz2",
+    "lzma",
+)
+
+
+def loaded_modules(code: str, *args: str) -> set[str]:
+    """Run code in a fresh interpreter and return the modules it imported."""
+    script = f"import sys\ntry:\n    {code}\nfinally:\n    {REPORT}"
+    result = subprocess.run(
+        [sys.executable, "-c", script, *args],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    return set(result.stderr.strip().splitlines()[-1].split(","))
+
+
+def imported_modules(code: str, *args: str) -> set[str]:
+    """Return the modules imported by code, beyond those of a bare interpreter."""
+    return loaded_modules(code, *args) - loaded_modules("pass")
+
+
+def loads_tiktoken(code: str, *args: str) -> bool:
+    """Run code in a fresh interpreter and return whether it imported tiktoken."""
+    return "tiktoken" in loaded_modules(code, *args)
+
+
+class TestLazyTiktokenImport:
+    def test_import_does_not_load_tiktoken(self):
+        """Test that importing the package does not import tiktoken."""
+        assert not loads_tiktoken("import count_tokens")
+
+    def test_help_does_not_load_tiktoken(self):
+        """Test that --help does not import tiktoken."""
+        assert not loads_tiktoken(CLI, "--help")
+
+    @pytest.mark.parametrize("approx", ["w", "c"])
+    def test_approximation_does_not_load_tiktoken(self, docs_dir, approx):
+        """Test that approximation-only runs never import tiktoken."""
+        assert not loads_tiktoken(CLI, str(docs_dir / "doc.txt"), "--approx", approx)
+
+    def test_exact_count_loads_tiktoken(self, docs_dir):
+        """Test that exact counting still imports tiktoken."""
+        assert loads_tiktoken(CLI, str(docs_dir / "doc.txt"), "-q")
+
+
+class TestLazyImports:
+    @pytest.mark.parametrize(
+        "args",
+        [("--help",), ("{doc}", "--approx", "w")],
+        ids=["help", "approx"],
+    )
+    def test_cli_does_not_load_heavy_modules(self, docs_dir, args):
+        """Test that the CLI imports cache, pool and archive modules only when used."""
+        args = [arg.format(doc=docs_dir / "doc.txt") for arg in args]
+
+        assert imported_modules(CLI, *args).isdisjoint(HEAVY_MODULES)
+
+    def test_import_does_not_load_heavy_modules(self):
+        """Test that importing the package loads none of the optional modules."""
+        assert imported_modules("import count_tokens").isdisjoint(HEAVY_MODULES)
+
+    def test_cache_loads_sqlite(self, docs_dir, tmp_path):
+        """Test that --cache still imports sqlite3."""
+        modules = loaded_modules(
+            CLI,
+            "-d",
+            str(docs_dir),
+            "-q",
+            "--cache",
+            "--cache-path",
+            str(tmp_path / "c.db"),
+        )
+
+        assert "sqlite3" in modules
@@ -0,0 +1,129 @@
+import json
+import random
+import sys
+
+import pytest
+
+from count_tokens.count import count_tokens_in_directory, main
+from count_tokens.stats import QuantileSketch, TokenStats, format_stats
+
+
+class TestQuantileSketch:
+    def test_relative_accuracy(self):
+        """Test that quantile estimates are within the relative accuracy."""
+        rng = random.Random(0)
+        values = sorted(int(rng.lognormvariate(7, 2)) + 1 for _ in range(20000))
+        sketch = QuantileSketch(0.01)
+        for value in values:
+            sketch.add(value)
+
+        for q in (0.0, 0.5, 0.9, 0.95, 0.99, 1.0):
+            exact = values[int(q * (len(values) - 1))]
+            assert sketch.quantile(q) == pytest.approx(exact, rel=0.01)
+        assert len(sketch.buckets) < 1400
+
+    def test_merge_matches_single_sketch(self):
+        """Test that merged sketches give the estimates of one sketch of all values."""
+        whole, first, second = QuantileSketch(), QuantileSketch(), QuantileSketch()
+        for value in range(1000):
+            whole.add(value)
+            (first if value % 3 else second).add(value)
+
+        first.merge(second)
+
+        assert first.quantile(0.5) == whole.quantile(0.5)
+        assert first.quantile(0.99) == whole.quantile(0.99)
+        with pytest.raises(ValueError):
+            first.merge(QuantileSketch(0.05))
+
+
+class TestTokenStats:
+    def test_summary(self):
+        """Test count, extremes, histogram bins and top-K of a stream of counts."""
+        stats = TokenStats(top_k=3)
+        for index, tokens in enumerate([0, 1, 5, 5, 300, 7, 5]):
+            stats.add(tokens, f"file{index}")
+
+        summary = stats.to_dict()
+
+        assert summary["count"] == 7
+        assert summary["total"] == 323
+        assert (summary["min"], summary["max"]) == (0, 300)
+        assert summary["percentiles"]["p50"] == pytest.approx(5, rel=0.01)
+        assert summary["histogram"] == [
+            {"min": 0, "max": 0, "count": 1},
+            {"min": 1, "max": 1, "count": 1},
+            {"min": 4, "max": 7, "count": 4},
+            {"min": 256, "max": 511, "count": 1},
+        ]
+        # Ties keep the earliest item
+        assert summary["top"] == [
+            {"name": "file4", "tokens": 300},
+            {"name": "file5", "tokens": 7},
+            {"name": "file2", "tokens": 5},
+        ]
+
+    def test_merge(self):
+        """Test that merged statistics equal statistics of all items."""
+        whole, first, second = TokenStats(5), TokenStats(5), TokenStats(5)
+        for index in range(50):
+            tokens = (index * 37) % 101
+            whole.add(tokens, index)
+            (first if index < 20 else second).add(tokens, index)
+
+        first.merge(second)
+
+        assert first.to_dict() == whole.to_dict()
+
+    def test_results_with_errors(self):
+        """Test that errors and skipped files are tallied but not counted."""
+        stats = TokenStats()
+        stats.add_result("a.txt", 10)
+        stats.add_result("b.txt", {"tokens": 20, "exceeds_limit": True})
+        stats.add_result("c.txt", "Error: unreadable")
+        stats.add_result("d.png", "Skipped: binary file")
+
+        assert (stats.count, stats.total, stats.errors, stats.skipped) == (2, 30, 1, 1)
+        assert format_stats(stats).startswith("Files: 2 (1 errors, 1 skipped)")
+
+
+class TestStatsCli:
+    def test_directory_stats(self, tmp_path, monkeypatch, capsys):
+        """Test that --stats prints statistics of the per-file counts."""
+        for index in range(5):
+            (tmp_path / f"file{index}.txt").write_text("word " * (10 * index + 1))
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            ["count-tokens", "-d", str(tmp_path), "--stats", "--format", "json"],
+        )
+
+        main()
+
+        summary = json.loads(capsys.readouterr().out)
+        results = count_tokens_in_directory(str(tmp_path))
+        assert summary["count"] == 5
+        assert summary["total"] == sum(results.values())
+        assert summary["top"][0] == {
+            "name": str(tmp_path / "file4.txt"),
+            "tokens": results[str(tmp_path / "file4.txt")],
+        }
+
+    def test_dataset_stats(self, tmp_path, monkeypatch, capsys):
+        """Test that --stats with --fields summarizes the per-record counts."""
+        path = tmp_path / "data.jsonl"
+        path.write_text(
+            "".join(json.dumps({"text": "x " * n}) + "\n" for n in range(9))
+        )
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            ["count-tokens", str(path), "--fields", "text", "--stats", "--top", "2"],
+        )
+
+        main()
+
+        output = capsys.readouterr().out
+        assert output.startswith("Records: 9\n")
+        assert "Largest records:" in output
+        assert output.rstrip().splitlines()[-2].split()[1] == "8"
@@ -0,0 +1,142 @@
+import os
+
+import pytest
+
+from count_tokens.walk import IgnoreRules, walk_files
+
+
+@pytest.fixture
+def tree(tmp_path):
+    """Create a nested tree of text and code files."""
+    for path in [
+        "a.txt",
+        "b.py",
+        "docs/guide.md",
+        "docs/api/index.md",
+        "src/main.py",
+        "src/build/out.py",
+        ".git/config.txt",
+        "node_modules/pkg/readme.md",
+    ]:
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(path)
+    return tmp_path
+
+
+def relative(paths, base):
+    return [os.path.relpath(path, base) for path in paths]
+
+
+class TestWalkFiles:
+    def test_matches_all_patterns_in_one_pass(self, tree):
+        """Test that files are yielded once, files before subdirectories."""
+        files = walk_files(tree, ["*.md", "*.py"], recursive=True)
+
+        assert relative(files, tree) == [
+            "b.py",
+            "docs/guide.md",
+            "docs/api/index.md",
+            "src/main.py",
+            "src/build/out.py",
+        ]
+
+    def test_is_lazy(self, tree):
+        """Test that the walk yields files before the traversal has finished."""
+        files = walk_files(tree, ["*"], recursive=True)
+
+        assert os.path.basename(next(files)) == "a.txt"
+
+    def test_non_recursive(self, tree):
+        """Test that subdirectories are not entered without recursive."""
+        assert relative(walk_files(tree, ["*.txt", "*.py"]), tree) == ["a.txt", "b.py"]
+
+    def test_path_patterns(self, tree):
+        """Test that patterns with a slash match paths relative to the base."""
+        files = walk_files(tree, ["src/*.py"], recursive=True)
+
+        assert relative(files, tree) == ["src/main.py"]
+
+    def test_path_patterns_without_recursive(self, tree):
+        """Test that a slash pattern enters only the directories it can match."""
+        directories = []
+        files = walk_files(tree, ["docs/*.md", "src/*.py"], directories=directories)
+
+        assert relative(files, tree) == ["docs/guide.md", "src/main.py"]
+        assert relative(directories, tree) == [".", "docs", "src"]
+        files = walk_files(tree, ["docs/**/*.md"])
+        assert relative(files, tree) == ["docs/guide.md", "docs/api/index.md"]
+
+    def test_directory_symlinks_are_opt_in(self, tree):
+        """Test that symlinks to directories are entered only when asked to."""
+        os.symlink(tree / "docs", tree / "linked")
+        (tree / "docs" / "guide.md").unlink()
+
+        assert relative(walk_files(tree, ["*.md"], recursive=True), tree) == [
+            "docs/api/index.md"
+        ]
+        files = walk_files(tree, ["linked/*/*.md"], follow_symlinks=True)
+        assert relative(files, tree) == ["linked/api/index.md"]
+
+    def test_gitignore_prunes_directories(self, tree):
+        """Test that .gitignore rules apply to their directory and below."""
+        (tree / ".gitignore").write_text("build/\n")
+        (tree / "docs" / ".gitignore").write_text("*.md\n!guide.md\n")
+
+        files = walk_files(tree, ["*.md", "*.py"], recursive=True)
+
+        assert relative(files, tree) == ["b.py", "docs/guide.md", "src/main.py"]
+
+    def test_no_ignore(self, tree):
+        """Test that disabling ignore rules walks every directory."""
+        (tree / ".gitignore").write_text("*.py\n")
+
+        assert set(relative(walk_files(tree, ["*"], True, [], False), tree)) >= {
+            ".git/config.txt",
+            "b.py",
+            "node_modules/pkg/readme.md",
+        }
+
+    def test_symlinks_and_hard_links_are_deduplicated(self, tree):
+        """Test that links to an already found file or directory are skipped."""
+        os.symlink(tree / "a.txt", tree / "z_link.txt")
+        os.link(tree / "a.txt", tree / "z_hard.txt")
+        os.symlink(tree, tree / "docs" / "loop")
+
+        files = relative(walk_files(tree, ["*.txt"], recursive=True), tree)
+
+        assert files == ["a.txt"]
+
+    def test_relative_base(self, tree, monkeypatch):
+        """Test that a walk of the current directory yields relative paths."""
+        monkeypatch.chdir(tree)
+
+        assert list(walk_files(".", ["*.txt"])) == ["a.txt"]
+
+
+class TestIgnoreRules:
+    @pytest.mark.parametrize(
+        ("pattern", "path", "is_dir", "expected"),
+        [
+            ("*.log", "logs/app.log", False, True),
+            ("/build", "build", True, True),
+            ("/build", "src/build", True, None),
+            ("build/", "build", False, None),
+            ("docs/*.md", "docs/a.md", False, True),
+            ("docs/*.md", "docs/api/a.md", False, None),
+            ("docs/**/*.md", "docs/api/a.md", False, True),
+            ("**/tmp", "a/b/tmp", True, True),
+            ("data/**", "data/x/y.csv", False, True),
+            ("file[0-9].txt", "file7.txt", False, True),
+            ("# comment", "# comment", False, None),
+        ],
+    )
+    def test_match(self, pattern, path, is_dir, expected):
+        """Test gitignore-style matching of single rules."""
+        assert IgnoreRules([pattern]).match(path, is_dir) is expected
+
+    def test_last_matching_rule_wins(self):
+        """Test that a later negation re-includes a path."""
+        rules = IgnoreRules(["*.md", "!README.md"])
+
+        assert rules.match("README.md", False) is False
+        assert rules.match("CHANGES.md", False) is True
@@ -0,0 +1,128 @@
+import io
+import json
+import sys
+
+import pytest
+
+from count_tokens import watch as watch_module
+from count_tokens.count import count_tokens_in_directory, count_tokens_in_file
+from count_tokens.watch import print_events, watch
+
+EVENTS = [
+    {"event": "scan", "results": {"a.txt": 3, "b.txt": 4}, "total": 7},
+    {"event": "changed", "file": "a.txt", "tokens": 5, "total": 9},
+    {"event": "removed", "file": "b.txt", "total": 5},
+]
+
+
+@pytest.fixture(
+    params=[
+        pytest.param(
+            True,
+            marks=pytest.mark.skipif(
+                not sys.platform.startswith("linux"), reason="inotify is Linux only"
+            ),
+            id="inotify",
+        ),
+        pytest.param(False, id="polling"),
+    ]
+)
+def use_inotify(request):
+    return request.param
+
+
+@pytest.fixture
+def project(tmp_path):
+    """Create a directory with a few text files."""
+    for i in range(3):
+        (tmp_path / f"file_{i}.txt").write_text(f"file number {i}\n" * (i + 1))
+    return tmp_path
+
+
+class TestWatch:
+    def test_changes_recount_only_changed_files(
+        self, project, use_inotify, monkeypatch
+    ):
+        """Test that added, changed and removed files update the results and total."""
+        counted = []
+        count_file = watch_module._count_file_safe
+
+        def counting(file_path, **kwargs):
+            counted.append(file_path)
+            return count_file(file_path, **kwargs)
+
+        monkeypatch.setattr(watch_module, "_count_file_safe", counting)
+        events = watch(
+            str(project),
+            ["*.txt"],
+            debounce=0.05,
+            poll_interval=0.05,
+            use_inotify=use_inotify,
+        )
+
+        scan = next(events)
+        assert scan["results"] == count_tokens_in_directory(str(project), ["*.txt"])
+        total = scan["total"]
+
+        changed = project / "file_1.txt"
+        changed.write_text("a much longer replacement text for this file\n" * 5)
+        event = next(events)
+        tokens = count_tokens_in_file(str(changed))
+        assert event["event"] == "changed"
+        assert event["file"] == str(changed)
+        assert event["tokens"] == tokens
+        assert event["total"] == total - scan["results"][str(changed)] + tokens
+        assert counted == [str(changed)]
+
+        (project / "new.txt").write_text("brand new file\n")
+        (project / "ignored.bin").write_text("not matched\n")
+        event = next(events)
+        assert (event["event"], event["file"]) == ("added", str(project / "new.txt"))
+
+        (project / "file_0.txt").unlink()
+        event = next(events)
+        assert (event["event"], event["file"]) == (
+            "removed",
+            str(project / "file_0.txt"),
+        )
+        events.close()
+
+        assert event["total"] == sum(
+            count_tokens_in_directory(str(project), ["*.txt"]).values()
+        )
+
+    def test_inotify_required_but_unavailable(self, monkeypatch, tmp_path):
+        """Test that use_inotify=True fails when inotify cannot be used."""
+
+        def unavailable():
+            raise OSError("inotify is not available")
+
+        monkeypatch.setattr(watch_module, "_Inotify", unavailable)
+
+        with pytest.raises(OSError, match="not available"):
+            next(watch(str(tmp_path), use_inotify=True))
+        assert next(watch(str(tmp_path)))["event"] == "scan"
+
+
+class TestPrintEvents:
+    def test_ndjson(self):
+        """Test that json output is one event per line."""
+        output = io.StringIO()
+        print_events(EVENTS, "json", output)
+
+        lines = output.getvalue().splitlines()
+        assert [json.loads(line) for line in lines] == EVENTS
+
+    def test_text_lines(self):
+        """Test that text output lists the scan, then one line per change."""
+        output = io.StringIO()
+        print_events(EVENTS, "text", output)
+
+        assert output.getvalue().splitlines() == [
+            "a.txt: 3 tokens",
+            "b.txt: 4 tokens",
+            "",
+            "Total: 7 tokens across 2 files",
+            "changed: a.txt: 5 tokens, total 9",
+            "removed: b.txt: total 5",
+        ]